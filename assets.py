@@ -0,0 +1,421 @@
+"""
+班级点名器 - 静态资源管线
+
+启动时一次性处理 static/ 下的全部文件：CSS/JS 压缩（去掉注释和缩进），
+按内容计算哈希生成带指纹的文件名（如 css/app.3f2a9c1b7e.css），
+并预先生成 gzip（安装了 brotli 时还有 br）压缩版本，全部保存在内存中。
+带指纹的资源内容永远不变，可以用 immutable 长期缓存；首页模板也只渲染一次，
+之后的请求只需根据 Accept-Encoding 选择预先压缩好的字节返回，或者直接返回 304。
+
+处理结果可以预先保存为资源包（python assets.py，打包时自动生成）：启动时只需计算源文件的内容哈希，
+与资源包记录的一致就直接使用包中压缩好的字节，不必再压缩空白和 gzip；打包的程序可以只带资源包而不带 static/。
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import zipfile
+from collections import namedtuple
+
+try:
+    import brotli   # 可选依赖：pip install brotli
+except ImportError:
+    brotli = None
+
+ASSET_PREFIX = '/assets/'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+PAGE_CACHE_CONTROL = 'no-cache'     # 页面引用的资源名随内容变化，页面本身每次都要重新验证
+
+ENCODING_BR = 'br'
+ENCODING_GZIP = 'gzip'
+ENCODING_IDENTITY = 'identity'
+
+MIN_COMPRESS_SIZE = 256     # 字节，更小的文件压缩后节省的流量不值得
+_COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+BUNDLE_FILE = 'assets.bundle'       # 默认的资源包文件名
+BUNDLE_FORMAT = 1
+_BUNDLE_MANIFEST = 'manifest.json'
+
+# name: 原始文件名（相对 static/）；url: 访问路径；digest: 内容哈希（兼作 ETag）
+# bodies: 编码 -> 字节，至少包含 identity
+Asset = namedtuple('Asset', ['name', 'url', 'mimetype', 'digest', 'bodies'])
+
+
+# ---------------------------------------------------------------------------
+# 压缩（保守实现：只去掉注释和多余空白，不改写标识符）
+# ---------------------------------------------------------------------------
+
+_CSS_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+
+def minify_css(source):
+    """去掉 CSS 的注释和多余空白（字符串内的内容保持不变）"""
+    parts = _CSS_STRING.split(_CSS_COMMENT.sub('', source))
+    for i in range(0, len(parts), 2):
+        text = re.sub(r'\s+', ' ', parts[i])
+        text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+        # 只去掉冒号后的空格：冒号前的空格在选择器中有意义（div :hover）
+        text = re.sub(r':\s+', ':', text)
+        parts[i] = text.replace(';}', '}')
+    return ''.join(parts).strip() + '\n'
+
+
+# 这些字符或关键字之后的 / 是正则表达式的开始，而不是除号
+_REGEX_AFTER_CHARS = set('(,=:[!&|?{};+-*%<>~^\n')
+_REGEX_AFTER_WORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void',
+                      'yield', 'await', 'delete', 'throw', 'new')
+# 两侧的空格可以去掉的标点（不含 + - / .，避免 a - -b、正则和数字成员访问出错）
+_JS_TIGHT = set('{}()[];,:=<>!&|?*%')
+
+
+def _regex_allowed(out):
+    text = ''.join(out[-12:]).rstrip(' ')
+    if not text:
+        return True
+    if text[-1] in _REGEX_AFTER_CHARS:
+        return True
+    match = re.search(r'[A-Za-z_$]+$', text)
+    return bool(match) and match.group() in _REGEX_AFTER_WORDS
+
+
+def minify_js(source):
+    """
+    去掉 JavaScript 的注释、缩进和多余空白。
+
+    保留换行（不依赖分号也能正确解析）；字符串、模板字符串和正则表达式原样保留。
+    """
+    out = []
+    # 模板字符串可以嵌套（`${ `...` }`）：栈中记录每层 ${} 内的花括号深度
+    template_stack = []
+    in_template = False
+    i, n = 0, len(source)
+
+    def last():
+        return out[-1] if out else '\n'
+
+    while i < n:
+        ch = source[i]
+
+        if in_template:
+            if ch == '\\':
+                out.append(source[i:i + 2])
+                i += 2
+            elif ch == '`':
+                out.append(ch)
+                in_template = False
+                i += 1
+            elif source.startswith('${', i):
+                out.append('${')
+                template_stack.append(0)
+                in_template = False
+                i += 2
+            else:
+                out.append(ch)
+                i += 1
+            continue
+
+        if ch in '"\'':
+            j = i + 1
+            while j < n and source[j] != ch and source[j] != '\n':
+                j += 2 if source[j] == '\\' else 1
+            out.append(source[i:j + 1])
+            i = j + 1
+        elif ch == '`':
+            out.append(ch)
+            in_template = True
+            i += 1
+        elif source.startswith('//', i):
+            while i < n and source[i] != '\n':
+                i += 1
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            if last() not in ' \n':
+                out.append(' ')
+        elif ch == '/' and _regex_allowed(out):
+            j, in_class = i + 1, False
+            while j < n and source[j] != '\n':
+                c = source[j]
+                if c == '\\':
+                    j += 2
+                    continue
+                if c == '[':
+                    in_class = True
+                elif c == ']':
+                    in_class = False
+                elif c == '/' and not in_class:
+                    break
+                j += 1
+            out.append(source[i:j + 1])
+            i = j + 1
+        elif ch in ' \t\r\n':
+            newline = False
+            while i < n and source[i] in ' \t\r\n':
+                newline = newline or source[i] == '\n'
+                i += 1
+            while out and out[-1] == ' ':
+                out.pop()
+            if newline:
+                if out and last() != '\n':
+                    out.append('\n')
+            elif last() not in _JS_TIGHT and last() != '\n' and not (i < n and source[i] in _JS_TIGHT):
+                out.append(' ')
+        else:
+            if ch in _JS_TIGHT and last() == ' ':
+                out.pop()
+            if template_stack:
+                if ch == '{':
+                    template_stack[-1] += 1
+                elif ch == '}':
+                    if template_stack[-1] == 0:
+                        template_stack.pop()
+                        in_template = True
+                    else:
+                        template_stack[-1] -= 1
+            out.append(ch)
+            i += 1
+
+    return ''.join(out).strip() + '\n'
+
+
+_MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+# ---------------------------------------------------------------------------
+# 资源构建与协商
+# ---------------------------------------------------------------------------
+
+def _compressible(mimetype):
+    return mimetype.startswith(_COMPRESSIBLE_TYPES)
+
+
+def build_asset(name, data, mimetype, url):
+    """
+    生成资源的各个编码版本（压缩后没有变小的编码不保留）。
+
+    Args:
+        name (str): 资源名
+        data (bytes): 原始内容（已压缩空白）
+        mimetype (str): MIME 类型
+        url (str): 访问路径，为 None 时使用带指纹的 /assets/ 路径
+    """
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    if url is None:
+        stem, ext = os.path.splitext(name)
+        url = f"{ASSET_PREFIX}{stem}.{digest}{ext}"
+    bodies = {ENCODING_IDENTITY: data}
+    if _compressible(mimetype) and len(data) >= MIN_COMPRESS_SIZE:
+        candidates = {ENCODING_GZIP: gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates[ENCODING_BR] = brotli.compress(data, quality=11)
+        for encoding, body in candidates.items():
+            if len(body) < len(data):
+                bodies[encoding] = body
+    return Asset(name, url, mimetype, digest, bodies)
+
+
+def select_encoding(asset, accept_encodings):
+    """
+    按客户端的 Accept-Encoding 选择编码，优先 br，其次 gzip。
+
+    Args:
+        accept_encodings: werkzeug 的 request.accept_encodings
+
+    Returns:
+        tuple: (编码, 字节)
+    """
+    for encoding in (ENCODING_BR, ENCODING_GZIP):
+        if encoding in asset.bodies and accept_encodings[encoding] > 0:
+            return encoding, asset.bodies[encoding]
+    return ENCODING_IDENTITY, asset.bodies[ENCODING_IDENTITY]
+
+
+def _bundle_entry(name):
+    """资源包中的条目（固定时间戳，相同的资源生成相同的资源包）"""
+    info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_STORED     # 内容已经压缩过，或本身是 mp3 这类压缩格式
+    return info
+
+
+class AssetPipeline:
+    """
+    静态资源和预渲染页面的内存仓库。
+
+    Args:
+        static_dir (str): 静态文件目录
+        minify (bool): 是否压缩 CSS/JS 的空白和注释
+    """
+
+    def __init__(self, static_dir, minify=True):
+        self.static_dir = static_dir
+        self.minify = minify
+        self._by_name = {}      # 原始文件名 -> Asset
+        self._by_url = {}       # 带指纹的访问路径（去掉 /assets/ 前缀）-> Asset
+        self._pages = {}        # 页面名 -> Asset
+        self._sources = {}      # 原始文件名 -> 源文件内容的 SHA-256（保存资源包时使用）
+        self.prebuilt = 0       # 直接使用资源包中结果的资源数
+
+    def build(self, bundle=None):
+        """
+        扫描静态目录并处理所有文件，返回资源数量。
+
+        Args:
+            bundle (str): 资源包路径（见 save_bundle）。源文件内容哈希与资源包一致的资源直接使用包中的结果，
+                只处理新增或修改过的文件；静态目录不存在时使用资源包中的全部资源
+        """
+        prebuilt = self._load_bundle(bundle) if bundle else {}
+        if not os.path.isdir(self.static_dir):
+            if prebuilt:
+                logging.info(f"使用资源包中的全部 {len(prebuilt)} 个资源: {bundle}")
+            else:
+                logging.warning(f"静态文件夹不存在: {self.static_dir}")
+            for name, (source, asset) in prebuilt.items():
+                self._register(name, asset, source)
+            self.prebuilt = len(prebuilt)
+            return len(self._by_name)
+        for root, _dirs, files in os.walk(self.static_dir):
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+                source = hashlib.sha256(data).hexdigest()
+                entry = prebuilt.get(name)
+                if entry is not None and entry[0] == source:
+                    self._register(name, entry[1], source)
+                    self.prebuilt += 1
+                else:
+                    self._process(name, data, source)
+        if prebuilt:
+            logging.info(f"使用资源包中的 {self.prebuilt} 个资源，重新处理 {len(self._by_name) - self.prebuilt} 个")
+        return len(self._by_name)
+
+    def add_file(self, name, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        return self._process(name, data, hashlib.sha256(data).hexdigest())
+
+    def _process(self, name, data, source):
+        ext = os.path.splitext(name)[1].lower()
+        minifier = _MINIFIERS.get(ext) if self.minify else None
+        if minifier is not None:
+            data = minifier(data.decode('utf-8')).encode('utf-8')
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        return self._register(name, build_asset(name, data, mimetype, None), source)
+
+    def _register(self, name, asset, source):
+        self._by_name[name] = asset
+        self._by_url[asset.url[len(ASSET_PREFIX):]] = asset
+        self._sources[name] = source
+        return asset
+
+    def _load_bundle(self, path):
+        """
+        读取资源包。
+
+        Returns:
+            dict: 原始文件名 -> (源文件哈希, Asset)；资源包不存在或与当前设置不符时为空
+        """
+        try:
+            with zipfile.ZipFile(path) as bundle:
+                manifest = json.loads(bundle.read(_BUNDLE_MANIFEST))
+                if manifest.get('format') != BUNDLE_FORMAT or manifest.get('minify') != self.minify:
+                    logging.info(f"资源包格式或压缩设置不同，不使用: {path}")
+                    return {}
+                entries = {}
+                for item in manifest['assets']:
+                    name = item['name']
+                    bodies = {encoding: bundle.read(f"{encoding}/{name}") for encoding in item['encodings']}
+                    asset = Asset(name, item['url'], item['mimetype'], item['digest'], bodies)
+                    entries[name] = (item['source'], asset)
+                return entries
+        except FileNotFoundError:
+            return {}
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+            logging.warning(f"资源包无法读取，重新处理静态资源: {path} ({e})")
+            return {}
+
+    def save_bundle(self, path):
+        """把处理好的资源（各编码版本和源文件哈希）保存为资源包（zip 格式，条目不再压缩）"""
+        manifest = {'format': BUNDLE_FORMAT, 'minify': self.minify, 'assets': []}
+        temp_path = f"{path}.tmp"
+        with zipfile.ZipFile(temp_path, 'w') as bundle:
+            for name, asset in sorted(self._by_name.items()):
+                for encoding, body in asset.bodies.items():
+                    bundle.writestr(_bundle_entry(f"{encoding}/{name}"), body)
+                manifest['assets'].append({
+                    'name': name,
+                    'url': asset.url,
+                    'mimetype': asset.mimetype,
+                    'digest': asset.digest,
+                    'source': self._sources[name],
+                    'encodings': list(asset.bodies),
+                })
+            bundle.writestr(_bundle_entry(_BUNDLE_MANIFEST),
+                            json.dumps(manifest, ensure_ascii=False, indent=1))
+        os.replace(temp_path, path)
+        return len(manifest['assets'])
+
+    def add_page(self, name, html, url='/'):
+        """保存预渲染的页面（不带指纹，按内容哈希作为 ETag）"""
+        page = build_asset(name, html.encode('utf-8'), 'text/html', url)
+        self._pages[name] = page
+        return page
+
+    def page(self, name):
+        return self._pages.get(name)
+
+    def url(self, name):
+        """资源的访问路径；未知的资源退回 Flask 的 /static/ 路径"""
+        asset = self._by_name.get(name)
+        if asset is None:
+            logging.warning(f"未找到静态资源: {name}")
+            return f"/static/{name}"
+        return asset.url
+
+    def get(self, fingerprinted):
+        return self._by_url.get(fingerprinted)
+
+    def stats(self):
+        assets = list(self._by_name.values()) + list(self._pages.values())
+        return {
+            'assets': len(self._by_name),
+            'pages': len(self._pages),
+            'prebuilt': self.prebuilt,
+            'brotli': brotli is not None,
+            'bytes': {
+                encoding: sum(len(a.bodies.get(encoding, a.bodies[ENCODING_IDENTITY])) for a in assets)
+                for encoding in (ENCODING_IDENTITY, ENCODING_GZIP, ENCODING_BR)
+            },
+        }
+
+
+def build_bundle(static_dir, output, minify=True):
+    """处理 static_dir 下的全部文件并保存为资源包，返回资源数量"""
+    pipeline = AssetPipeline(static_dir, minify=minify)
+    pipeline.build()
+    return pipeline.save_bundle(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='预先处理静态资源并生成资源包')
+    parser.add_argument('--static', default='static', help='静态文件目录（默认 static）')
+    parser.add_argument('--output', default=BUNDLE_FILE, help=f'资源包路径（默认 {BUNDLE_FILE}）')
+    parser.add_argument('--no-minify', action='store_true', help='不压缩 CSS/JS（需与 ROLLCALL_MINIFY_ASSETS=0 配合使用）')
+    args = parser.parse_args(argv)
+    count = build_bundle(args.static, args.output, minify=not args.no_minify)
+    print(f"已生成资源包: {args.output}（{count} 个资源）")
+
+
+if __name__ == '__main__':
+    main()
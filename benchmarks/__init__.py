@@ -0,0 +1,9 @@
+"""
+班级点名器 - 基准测试与压测
+
+- python -m benchmarks.microbench: 名单加载/保存、随机点名、添加学生校验的微基准
+- python -m benchmarks.loadtest: 在本机启动服务器并发压测 HTTP 接口
+- python -m benchmarks.compare: 对比两次运行保存的 JSON 结果
+
+全部在本机运行，不访问网络；数据写在临时目录中，不会影响真实名单。
+"""
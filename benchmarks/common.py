@@ -0,0 +1,116 @@
+"""基准测试的公共工具：统计、运行环境信息和结果文件"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(sorted_values, fraction):
+    """已排序样本的分位数（线性插值），fraction 取 0~1"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples):
+    """
+    汇总耗时样本（秒）。
+
+    Returns:
+        dict: count/min/mean/p50/p95/p99/max，时间单位为毫秒
+    """
+    values = sorted(samples)
+    if not values:
+        return {'count': 0}
+    ms = lambda seconds: round(seconds * 1000, 4)
+    return {
+        'count': len(values),
+        'min_ms': ms(values[0]),
+        'mean_ms': ms(sum(values) / len(values)),
+        'p50_ms': ms(percentile(values, 0.50)),
+        'p95_ms': ms(percentile(values, 0.95)),
+        'p99_ms': ms(percentile(values, 0.99)),
+        'max_ms': ms(values[-1]),
+    }
+
+
+def parse_sizes(text):
+    """解析 100,1k,10k,1m 形式的名单规模列表"""
+    sizes = []
+    for part in text.split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        multiplier = 1
+        if part[-1] in 'km':
+            multiplier = 1000 if part[-1] == 'k' else 1000000
+            part = part[:-1]
+        sizes.append(int(float(part) * multiplier))
+    return sizes
+
+
+def make_names(count, prefix='学生'):
+    """生成 count 个互不相同的名字（长度与真实姓名相近）"""
+    return [f"{prefix}{i:07d}" for i in range(count)]
+
+
+def _git_revision():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(RESULTS_DIR), capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def environment_info():
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git_revision': _git_revision(),
+    }
+
+
+def write_results(kind, args, results, output=None):
+    """
+    把结果和运行环境一起保存为 JSON，默认写到 benchmarks/results/<kind>-<时间>.json。
+
+    Returns:
+        str: 结果文件路径
+    """
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    document = {
+        'kind': kind,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment_info(),
+        'args': args,
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def quiet_logging(log_dir):
+    """压测时只记录警告和错误，日志写到临时目录，避免控制台输出影响结果"""
+    import logging
+    from logconfig import load_log_config, setup_logging
+    config = load_log_config()
+    config['file'] = os.path.join(log_dir, 'bench_log.txt')
+    setup_logging(config, level=logging.WARNING)
+    # Werkzeug 开发服务器的访问日志自带 INFO 级别
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
@@ -0,0 +1,73 @@
+"""
+对比两次基准测试的结果文件，列出每个指标的 p50 变化。
+
+用法:
+    python -m benchmarks.compare 旧结果.json 新结果.json [--threshold 10]
+"""
+
+import argparse
+import json
+import sys
+
+
+def _flatten(document):
+    """把结果文件展开为 {指标键: p50 毫秒}"""
+    flat = {}
+    if document['kind'] == 'microbench':
+        for entry in document['results']:
+            for name, summary in entry['metrics'].items():
+                flat[f"{entry['backend']}/{entry['size']}/{name}"] = summary.get('p50_ms')
+    elif document['kind'] == 'startup':
+        for target, result in document['results'].items():
+            flat[f"{target}/首个响应"] = result['first_response'].get('p50_ms')
+            for name, summary in result['phases'].items():
+                flat[f"{target}/{name}"] = summary.get('p50_ms')
+    else:
+        for endpoint, summary in document['results']['endpoints'].items():
+            flat[f"{endpoint} p50"] = summary.get('p50_ms')
+            flat[f"{endpoint} p99"] = summary.get('p99_ms')
+    return flat
+
+
+def compare(old, new, threshold):
+    """
+    Returns:
+        int: 变慢超过 threshold 百分比的指标数量
+    """
+    if old['kind'] != new['kind']:
+        raise ValueError(f"结果类型不同: {old['kind']} / {new['kind']}")
+    old_flat, new_flat = _flatten(old), _flatten(new)
+    regressions = 0
+    width = max((len(key) for key in new_flat), default=10)
+    for key in sorted(set(old_flat) & set(new_flat)):
+        before, after = old_flat[key], new_flat[key]
+        if not before or after is None:
+            continue
+        change = (after - before) / before * 100
+        mark = ''
+        if change > threshold:
+            mark = '  <-- 变慢'
+            regressions += 1
+        elif change < -threshold:
+            mark = '  变快'
+        print(f"{key:<{width}}  {before:>12.4f} -> {after:>12.4f} ms  {change:>+7.1f}%{mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比两次基准测试结果')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10, help='视为变化的百分比（默认 10）')
+    args = parser.parse_args(argv)
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    regressions = compare(old, new, args.threshold)
+    print(f"\n{regressions} 项指标变慢超过 {args.threshold:g}%")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
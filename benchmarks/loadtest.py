@@ -0,0 +1,196 @@
+"""
+HTTP 接口压测。
+
+默认在本机临时目录中创建应用和名单，启动服务器（端口由系统分配），
+用多个线程并发请求 /api/students、/api/random 和 /ping，
+统计每个接口的 p50/p95/p99 延迟、吞吐量和错误数。
+也可以用 --url 压测一个已经运行的实例（此时不会修改其名单）。
+
+用法:
+    python -m benchmarks.loadtest --concurrency 16 --duration 10 --students 1000
+    python -m benchmarks.loadtest --server dev --endpoints /ping
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.common import make_names, quiet_logging, summarize, write_results
+
+DEFAULT_ENDPOINTS = '/api/students,/api/random,/ping'
+
+
+class _Worker(threading.Thread):
+    """按轮转顺序请求各个接口，记录每次请求的耗时"""
+
+    def __init__(self, host, port, endpoints, deadline, max_requests, offset):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.endpoints = endpoints
+        self.deadline = deadline
+        self.max_requests = max_requests
+        self.offset = offset
+        self.samples = {endpoint: [] for endpoint in endpoints}
+        self.errors = {endpoint: 0 for endpoint in endpoints}
+        self._conn = None
+
+    def _request(self, path):
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        self._conn.request('GET', path)
+        response = self._conn.getresponse()
+        response.read()
+        if response.will_close:
+            # 内置服务器每个响应后关闭连接，下次请求重新建立
+            self._conn.close()
+            self._conn = None
+        return response.status
+
+    def run(self):
+        i = self.offset
+        done = 0
+        while time.perf_counter() < self.deadline and (self.max_requests is None or done < self.max_requests):
+            endpoint = self.endpoints[i % len(self.endpoints)]
+            i += 1
+            done += 1
+            started = time.perf_counter()
+            try:
+                status = self._request(endpoint)
+            except (OSError, http.client.HTTPException):
+                status = None
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+            elapsed = time.perf_counter() - started
+            if status is not None and status < 400:
+                self.samples[endpoint].append(elapsed)
+            else:
+                self.errors[endpoint] += 1
+        if self._conn is not None:
+            self._conn.close()
+
+
+def run_load(host, port, endpoints, concurrency, duration, requests_per_worker, warmup):
+    """并发压测，返回每个接口和总体的统计"""
+    if warmup:
+        _Worker(host, port, endpoints, time.perf_counter() + warmup, None, 0).run()
+
+    started = time.perf_counter()
+    deadline = started + duration
+    workers = [_Worker(host, port, endpoints, deadline, requests_per_worker, i) for i in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    results = {'duration_s': round(elapsed, 3), 'endpoints': {}}
+    all_samples, all_errors = [], 0
+    for endpoint in endpoints:
+        samples = [s for worker in workers for s in worker.samples[endpoint]]
+        errors = sum(worker.errors[endpoint] for worker in workers)
+        all_samples += samples
+        all_errors += errors
+        results['endpoints'][endpoint] = dict(
+            summarize(samples), errors=errors, throughput_rps=round(len(samples) / elapsed, 1))
+    results['total'] = dict(
+        summarize(all_samples), errors=all_errors, throughput_rps=round(len(all_samples) / elapsed, 1))
+    return results
+
+
+class _LocalServer:
+    """在后台线程中运行的本地服务器（数据在临时目录中）"""
+
+    def __init__(self, mode, threads, students, workdir):
+        from main import create_app
+        from storage import DEFAULT_CLASS_ID
+        self.app = create_app({
+            'STUDENTS_FILE': os.path.join(workdir, 'students.json'),
+            'CLASSES_DIR': os.path.join(workdir, 'classes'),
+            'PICK_STATE_FILE': os.path.join(workdir, 'pick_state.json'),
+            'DATABASE_FILE': os.path.join(workdir, 'rollcall.db'),
+            'MAX_STUDENTS': max(students, 100),
+        })
+        services = self.app.extensions['rollcall']
+        services.storage.set_max_students(DEFAULT_CLASS_ID, max(students, 100))
+        services.storage.replace_students(DEFAULT_CLASS_ID, make_names(students))
+        self.services = services
+
+        if mode == 'production':
+            from server import PooledWSGIServer, load_server_config
+            config = load_server_config({'mode': mode, 'threads': threads}, environ={})
+            self.server = PooledWSGIServer('127.0.0.1', 0, self.app, config)
+        else:
+            from werkzeug.serving import make_server
+            self.server = make_server('127.0.0.1', 0, self.app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.thread.join()
+        if hasattr(self.server, 'drain'):
+            self.server.drain(5)
+        self.server.server_close()
+        self.services.pick_engine.close()
+        self.services.storage.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='HTTP 接口压测')
+    parser.add_argument('--url', help='压测已经运行的实例（如 http://127.0.0.1:5000），默认在本机启动一个')
+    parser.add_argument('--server', choices=['dev', 'production'], default='production',
+                        help='本机启动的服务器类型（默认 production，即内置线程池服务器）')
+    parser.add_argument('--threads', type=int, default=32, help='production 服务器的工作线程数（默认 32）')
+    parser.add_argument('--students', type=int, default=1000, help='本机实例的名单人数（默认 1000）')
+    parser.add_argument('--endpoints', default=DEFAULT_ENDPOINTS, help=f'压测的接口，逗号分隔（默认 {DEFAULT_ENDPOINTS}）')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发连接数（默认 8）')
+    parser.add_argument('--duration', type=float, default=10, help='压测时长，秒（默认 10）')
+    parser.add_argument('--requests', type=int, help='每个并发连接最多发送的请求数（达到后提前结束）')
+    parser.add_argument('--warmup', type=float, default=1, help='正式计时前的预热时长，秒（默认 1）')
+    parser.add_argument('--output', help='结果文件（默认 benchmarks/results/loadtest-<时间>.json）')
+    args = parser.parse_args(argv)
+
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    workdir = None
+    local = None
+    try:
+        if args.url:
+            parts = urlsplit(args.url)
+            host, port = parts.hostname, parts.port or 80
+        else:
+            workdir = tempfile.mkdtemp(prefix='rollcall-load-')
+            quiet_logging(workdir)
+            local = _LocalServer(args.server, args.threads, args.students, workdir)
+            host, port = '127.0.0.1', local.port
+        print(f"压测 http://{host}:{port}  并发 {args.concurrency}  时长 {args.duration} 秒")
+        results = run_load(host, port, endpoints, args.concurrency, args.duration,
+                           args.requests, args.warmup)
+    finally:
+        if local is not None:
+            local.close()
+        if workdir is not None:
+            from logconfig import shutdown_logging
+            shutdown_logging()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for endpoint, summary in list(results['endpoints'].items()) + [('总计', results['total'])]:
+        if not summary['count']:
+            print(f"  {endpoint:<16} 没有成功的请求，错误 {summary['errors']}")
+            continue
+        print(f"  {endpoint:<16} {summary['throughput_rps']:>9.1f} req/s   "
+              f"p50 {summary['p50_ms']:.2f} ms   p95 {summary['p95_ms']:.2f} ms   "
+              f"p99 {summary['p99_ms']:.2f} ms   错误 {summary['errors']}")
+    path = write_results('loadtest', vars(args), results, args.output)
+    print(f"结果已保存: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+名单存储和点名的微基准。
+
+对每个存储后端和名单规模测量：
+
+- save_students: 整体保存名单（replace_students）
+- load_students_cold: 新建存储对象后第一次读取名单（从磁盘解析）
+- load_students_cached: 缓存命中时读取名单
+- random_choice: 对名单列表调用 random.choice
+- pick_engine: 通过点名引擎点名一次（/api/random 实际使用的路径）
+- add_student_reject: 添加已存在的学生（规范化 + 查重后拒绝，不写盘）
+- add_student: 添加新学生（校验 + 写入）
+
+用法:
+    python -m benchmarks.microbench --sizes 100,1k,10k,100k,1m --backends json,sqlite
+"""
+
+import argparse
+import gc
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import make_names, parse_sizes, quiet_logging, summarize, write_results
+
+DEFAULT_SIZES = '100,1k,10k,100k,1m'
+DEFAULT_BACKENDS = 'json,sqlite'
+
+
+def _time_once(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def _time_per_op(func, iterations, repeat):
+    """每轮连续调用 iterations 次，返回每轮的单次平均耗时"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        samples.append((time.perf_counter() - started) / iterations)
+    return samples
+
+
+def _open_storage(backend, workdir, max_students):
+    from storage import create_storage
+    return create_storage(
+        backend,
+        students_file=os.path.join(workdir, 'students.json'),
+        classes_dir=os.path.join(workdir, 'classes'),
+        db_path=os.path.join(workdir, 'rollcall.db'),
+        journaled=True,
+        default_max_students=max_students,
+    )
+
+
+def bench_size(backend, size, repeat, iterations, workdir):
+    """在 workdir 中测量一个后端、一个名单规模下的全部指标"""
+    from storage import DEFAULT_CLASS_ID, StudentExistsError, normalize_name
+    from picker import PickEngine
+
+    names = make_names(size)
+    max_students = size + repeat * iterations + 10
+    results = {}
+
+    storage = _open_storage(backend, workdir, max_students)
+    try:
+        results['save_students'] = summarize(
+            [_time_once(lambda: storage.replace_students(DEFAULT_CLASS_ID, names)) for _ in range(repeat)])
+    finally:
+        storage.close()
+
+    cold = []
+    for _ in range(repeat):
+        storage = _open_storage(backend, workdir, max_students)
+        try:
+            cold.append(_time_once(lambda: storage.list_students(DEFAULT_CLASS_ID)))
+        finally:
+            storage.close()
+    results['load_students_cold'] = summarize(cold)
+
+    storage = _open_storage(backend, workdir, max_students)
+    engine = None
+    try:
+        storage.list_students(DEFAULT_CLASS_ID)
+        results['load_students_cached'] = summarize(
+            [_time_once(lambda: storage.list_students(DEFAULT_CLASS_ID)) for _ in range(repeat)])
+
+        students = storage.list_students(DEFAULT_CLASS_ID)
+        rng = random.Random(0)
+        results['random_choice'] = summarize(
+            _time_per_op(lambda: rng.choice(students), iterations, repeat))
+
+        # 点名状态只写到临时目录，延迟写盘避免计入点名耗时
+        engine = PickEngine(storage, os.path.join(workdir, 'pick_state.json'),
+                            flush_delay=3600, rng=random.Random(0))
+        engine.pick(DEFAULT_CLASS_ID)   # 首次点名时构建索引，不计入
+        results['pick_engine'] = summarize(
+            _time_per_op(lambda: engine.pick(DEFAULT_CLASS_ID), iterations, repeat))
+
+        existing = f"  {names[size // 2]}  "
+
+        def add_existing():
+            try:
+                storage.add_student(DEFAULT_CLASS_ID, normalize_name(existing))
+            except StudentExistsError:
+                pass
+        results['add_student_reject'] = summarize(_time_per_op(add_existing, iterations, repeat))
+
+        new_names = iter(make_names(repeat * iterations, prefix='新生'))
+        add_iterations = max(1, iterations // 10)
+        results['add_student'] = summarize(_time_per_op(
+            lambda: storage.add_student(DEFAULT_CLASS_ID, normalize_name(next(new_names))),
+            add_iterations, repeat))
+    finally:
+        if engine is not None:
+            engine.close()
+        storage.close()
+    return results
+
+
+def run(sizes, backends, repeat, iterations):
+    results = []
+    for backend in backends:
+        for size in sizes:
+            workdir = tempfile.mkdtemp(prefix='rollcall-bench-')
+            try:
+                gc.collect()
+                started = time.perf_counter()
+                metrics = bench_size(backend, size, repeat, iterations, workdir)
+                elapsed = time.perf_counter() - started
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            results.append({'backend': backend, 'size': size, 'metrics': metrics})
+            _print_row(backend, size, metrics, elapsed)
+    return results
+
+
+def _print_row(backend, size, metrics, elapsed):
+    print(f"\n[{backend}] {size} 名学生（用时 {elapsed:.1f} 秒）")
+    for name, summary in metrics.items():
+        print(f"  {name:<22} p50 {summary['p50_ms']:>10.4f} ms   min {summary['min_ms']:>10.4f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='名单存储和点名的微基准')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'名单规模，逗号分隔（默认 {DEFAULT_SIZES}）')
+    parser.add_argument('--backends', default=DEFAULT_BACKENDS, help=f'存储后端（默认 {DEFAULT_BACKENDS}）')
+    parser.add_argument('--repeat', type=int, default=5, help='每项测量的轮数（默认 5）')
+    parser.add_argument('--iterations', type=int, default=200, help='单次操作类指标每轮的调用次数（默认 200）')
+    parser.add_argument('--output', help='结果文件（默认 benchmarks/results/microbench-<时间>.json）')
+    args = parser.parse_args(argv)
+
+    log_dir = tempfile.mkdtemp(prefix='rollcall-bench-log-')
+    try:
+        quiet_logging(log_dir)
+        results = run(parse_sizes(args.sizes), [b.strip() for b in args.backends.split(',') if b.strip()],
+                      args.repeat, args.iterations)
+    finally:
+        from logconfig import shutdown_logging
+        shutdown_logging()
+        shutil.rmtree(log_dir, ignore_errors=True)
+    path = write_results('microbench', vars(args), results, args.output)
+    print(f"\n结果已保存: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+启动时间测量。
+
+反复启动程序（打包后的可执行文件，或 source 表示用当前解释器运行 run_app.py），
+从创建进程开始计时，直到 /ping 返回第一个响应，包括解释器启动和打包程序的加载时间；
+同时从 --profile-startup 的输出中读取各阶段耗时。可以一次测量多个版本，便于对比。
+
+用法:
+    python -m benchmarks.startup --target 当前=旧版本/ClassRollCall/班级点名器 --target 优化=dist/ClassRollCall/班级点名器
+    python -m benchmarks.startup --target source --runs 20
+"""
+
+import argparse
+import http.client
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.common import summarize, write_results
+
+SOURCE_TARGET = 'source'
+# --profile-startup 报告中的阶段行（"  导入主应用模块   133.8 ms"）和里程碑行（"  [首个响应] 距脚本开始 255.6 ms"）
+_PHASE_LINE = re.compile(r'^\s+(\S.*?)\s+([\d.]+) ms$')
+_MILESTONE_LINE = re.compile(r'^\s+\[(.+?)\] 距脚本开始 ([\d.]+) ms$')
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _ping(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=0.5)
+    try:
+        conn.request('GET', '/ping')
+        response = conn.getresponse()
+        response.read()
+        return response.status == 200
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        conn.close()
+
+
+def _command(path):
+    if path == SOURCE_TARGET:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return [sys.executable, os.path.join(root, 'run_app.py')]
+    return [os.path.abspath(path)]
+
+
+def parse_report(output):
+    """从 --profile-startup 的输出中读取 {阶段或里程碑: 毫秒}"""
+    timings = {}
+    in_report = False
+    for line in output.splitlines():
+        if line.rstrip().endswith('启动耗时报告:'):
+            in_report = True
+            continue
+        if not in_report:
+            continue
+        match = _MILESTONE_LINE.match(line) or _PHASE_LINE.match(line)
+        if match is None:
+            in_report = False
+            continue
+        timings[match.group(1)] = float(match.group(2))
+    return timings
+
+
+def launch_once(command, timeout):
+    """
+    启动一次程序并等待 /ping 响应。
+
+    Returns:
+        tuple: (从创建进程到首个响应的秒数, 报告中的各阶段毫秒数)
+    """
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command + ['--profile-startup', '--port', str(port)],
+        cwd=os.path.dirname(command[-1]), stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+    )
+    try:
+        deadline = started + timeout
+        while not _ping(port):
+            if process.poll() is not None or time.perf_counter() > deadline:
+                raise RuntimeError(f"程序没有响应 /ping: {' '.join(command)}")
+            time.sleep(0.002)
+        elapsed = time.perf_counter() - started
+        # --profile-startup 会在输出报告后自行退出
+        output, _ = process.communicate(timeout=timeout)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    return elapsed, parse_report(output.decode('utf-8', errors='replace'))
+
+
+def measure(commands, runs, warmup, timeout):
+    """
+    轮流启动各个程序各 runs 次（之前各预热 warmup 次），让机器负载的波动平均地影响每个程序。
+
+    Args:
+        commands (dict): 名称 -> 启动命令
+
+    Returns:
+        dict: 名称 -> 从创建进程到首个响应的时间和各阶段耗时的统计
+    """
+    for _ in range(warmup):
+        for command in commands.values():
+            launch_once(command, timeout)
+    totals = {label: [] for label in commands}
+    phases = {label: {} for label in commands}
+    for _ in range(runs):
+        for label, command in commands.items():
+            elapsed, timings = launch_once(command, timeout)
+            totals[label].append(elapsed)
+            for name, ms in timings.items():
+                phases[label].setdefault(name, []).append(ms / 1000)
+    return {
+        label: {
+            'command': command,
+            'first_response': summarize(totals[label]),
+            'phases': {name: summarize(samples) for name, samples in phases[label].items()},
+        }
+        for label, command in commands.items()
+    }
+
+
+def _parse_target(text):
+    label, sep, path = text.partition('=')
+    return (label, path) if sep else (text, text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='启动时间测量')
+    parser.add_argument('--target', action='append', required=True,
+                        help='要测量的程序，格式为 名称=路径（路径为 source 时运行 run_app.py），可以重复指定')
+    parser.add_argument('--runs', type=int, default=10, help='每个程序启动的次数（默认 10）')
+    parser.add_argument('--warmup', type=int, default=1, help='正式测量前的预热启动次数（默认 1）')
+    parser.add_argument('--timeout', type=float, default=30, help='单次启动的超时，秒（默认 30）')
+    parser.add_argument('--output', help='结果文件（默认 benchmarks/results/startup-<时间>.json）')
+    args = parser.parse_args(argv)
+
+    commands = {label: _command(path) for label, path in map(_parse_target, args.target)}
+    results = measure(commands, args.runs, args.warmup, args.timeout)
+    for label, result in results.items():
+        summary = result['first_response']
+        print(f"\n[{label}] 从创建进程到首个响应: p50 {summary['p50_ms']:.1f} ms   "
+              f"min {summary['min_ms']:.1f} ms   max {summary['max_ms']:.1f} ms")
+        for name, phase in result['phases'].items():
+            print(f"  {name:<24} p50 {phase['p50_ms']:>8.1f} ms")
+    path = write_results('startup', vars(args), results, args.output)
+    print(f"\n结果已保存: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,13 @@
 chcp 65001 > nul
 echo 正在打包班级点名器应用...
 
+REM build.bat fast: 启动优化版本（预先生成静态资源包、.pyc 不压缩、不使用 UPX），见 namepicker.spec
+set ROLLCALL_FAST_STARTUP=
+if /i "%~1"=="fast" (
+    set ROLLCALL_FAST_STARTUP=1
+    echo 打包模式: 启动优化
+)
+
 REM 清理旧的打包文件
 echo 清理旧文件...
 if exist build rmdir /s /q build
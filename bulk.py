@@ -0,0 +1,228 @@
+"""
+班级点名器 - 名单批量导入与导出
+
+导入支持 CSV、NDJSON（每行一个 JSON）和 JSON 数组三种格式，均以流的方式逐行解析，
+不需要先把整个上传内容读入内存。导出以生成器的形式逐行产出，配合 Flask 的流式响应，
+即使是多个班级的大型名单也不会在内存中拼出完整的响应体。
+"""
+
+import codecs
+import csv
+import io
+import json
+
+from codec import dumps_text
+from storage import InvalidRequestError
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+FORMAT_JSON = 'json'
+FORMATS = (FORMAT_CSV, FORMAT_NDJSON, FORMAT_JSON)
+
+MIMETYPES = {
+    FORMAT_CSV: 'text/csv',
+    FORMAT_NDJSON: 'application/x-ndjson',
+    FORMAT_JSON: 'application/json',
+}
+
+_MIMETYPE_FORMATS = {
+    'text/csv': FORMAT_CSV,
+    'application/csv': FORMAT_CSV,
+    'application/x-ndjson': FORMAT_NDJSON,
+    'application/ndjson': FORMAT_NDJSON,
+    'application/jsonl': FORMAT_NDJSON,
+    'application/json': FORMAT_JSON,
+}
+
+# CSV 第一行如果是这些表头则跳过
+_CSV_HEADERS = {'name', '姓名', '名字', '学生', '学生姓名'}
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def detect_format(requested, mimetype):
+    """
+    确定导入/导出格式：优先使用显式指定的 format 参数，其次根据 Content-Type 推断。
+
+    Raises:
+        InvalidRequestError: 格式不受支持
+    """
+    fmt = (requested or _MIMETYPE_FORMATS.get(mimetype or '', '')).lower()
+    if fmt == 'jsonl':
+        fmt = FORMAT_NDJSON
+    if fmt not in FORMATS:
+        raise InvalidRequestError(f"不支持的格式，可选: {', '.join(FORMATS)}")
+    return fmt
+
+
+def _row_name(value):
+    """从一行数据中取出名字：字符串本身，或对象的 name 字段"""
+    if isinstance(value, dict):
+        return value.get('name')
+    return value
+
+
+def iter_import_rows(stream, fmt):
+    """
+    逐行解析上传内容。
+
+    Args:
+        stream: 二进制输入流（如 request.stream）
+        fmt (str): FORMAT_CSV / FORMAT_NDJSON / FORMAT_JSON
+
+    Yields:
+        tuple: (行号（从 1 开始）, 原始名字值或 InvalidRequestError)
+    """
+    if fmt == FORMAT_JSON:
+        yield from _iter_json_array(stream)
+        return
+
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == FORMAT_CSV:
+        for row_no, row in enumerate(csv.reader(text), start=1):
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            if row_no == 1 and row[0].strip().lower() in _CSV_HEADERS:
+                continue
+            yield row_no, row[0]
+    else:
+        for row_no, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield row_no, _row_name(json.loads(line))
+            except json.JSONDecodeError:
+                yield row_no, InvalidRequestError('无效的 JSON 行')
+
+
+def _iter_json_array(stream):
+    """
+    增量解析 JSON 数组：每次读取一块数据，用 raw_decode 逐个解出数组元素。
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(_CHUNK_SIZE)
+        if not chunk:
+            eof = True
+            buffer = buffer[pos:] + utf8.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise InvalidRequestError('JSON 内容必须是数组')
+    pos += 1
+
+    row_no = 0
+    expect_value = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise InvalidRequestError('JSON 数组不完整')
+        char = buffer[pos]
+        if char == ']':
+            return
+        if char == ',' and not expect_value:
+            pos += 1
+            expect_value = True
+            continue
+        if not expect_value:
+            raise InvalidRequestError('JSON 数组格式错误')
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # 数字等值可能恰好在块边界被截断，确认其后还有分隔符
+                if end >= len(buffer) and not eof:
+                    raise json.JSONDecodeError('incomplete', buffer, end)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise InvalidRequestError('JSON 数组格式错误')
+                fill()
+        pos = end
+        row_no += 1
+        expect_value = False
+        yield row_no, _row_name(value)
+
+
+def export_rows(storage, class_ids, fmt, include_class):
+    """
+    以生成器方式导出名单。
+
+    Args:
+        storage: RosterStorage 实例
+        class_ids (list): 要导出的班级
+        fmt (str): 导出格式
+        include_class (bool): 是否在每行中包含班级 ID（多班级导出时使用）
+
+    Yields:
+        str: 响应体片段
+    """
+    if fmt == FORMAT_CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(['class', 'name'] if include_class else ['name'])
+        for class_id in class_ids:
+            for name in storage.iter_students(class_id):
+                writer.writerow([class_id, name] if include_class else [name])
+                if buffer.tell() >= _CHUNK_SIZE:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+        yield buffer.getvalue()
+        return
+
+    def records():
+        for class_id in class_ids:
+            for name in storage.iter_students(class_id):
+                if include_class:
+                    yield dumps_text({'class': class_id, 'name': name})
+                elif fmt == FORMAT_NDJSON:
+                    yield dumps_text({'name': name})
+                else:
+                    yield dumps_text(name)
+
+    if fmt == FORMAT_NDJSON:
+        parts = (record + '\n' for record in records())
+    else:
+        parts = _json_array_parts(records())
+    yield from _batched(parts)
+
+
+def _json_array_parts(records):
+    yield '['
+    for index, record in enumerate(records):
+        yield record if index == 0 else ',' + record
+    yield ']'
+
+
+def _batched(parts):
+    """把细小的片段合并成约 _CHUNK_SIZE 大小的块，减少流式响应的写次数"""
+    batch = []
+    size = 0
+    for part in parts:
+        batch.append(part)
+        size += len(part)
+        if size >= _CHUNK_SIZE:
+            yield ''.join(batch)
+            batch = []
+            size = 0
+    if batch:
+        yield ''.join(batch)
@@ -0,0 +1,191 @@
+"""
+JSON 序列化与 API 响应压缩。
+
+所有名单文件、日志记录和 API 响应的 JSON 都经过这里：安装了 orjson 时使用 orjson
+（直接输出 UTF-8 字节，比标准库快数倍），否则使用标准库 json。两者输出相同的紧凑格式
+（不转义中文，没有多余空格），设置环境变量 ROLLCALL_JSON=json 可以强制使用标准库。
+
+超过 COMPRESS_MIN_SIZE 的文本响应（JSON、CSV、NDJSON、指标）按 Accept-Encoding 用 gzip
+或 deflate 压缩，流式导出边生成边压缩；事件流不压缩，以免推送被缓冲。最常用的全量名单
+响应按名单版本缓存序列化结果和各压缩版本（ResponseCache）。
+"""
+
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None and os.environ.get('ROLLCALL_JSON', '').lower() != 'json' else 'json'
+
+ENCODING_GZIP = 'gzip'
+ENCODING_DEFLATE = 'deflate'
+COMPRESS_MIN_SIZE = 1024    # 小于该字节数的响应不压缩（压缩收益抵不上开销）
+COMPRESS_LEVEL = 6
+# zlib 的 wbits: 31 为 gzip 格式，15 为 zlib 格式（即 HTTP 的 deflate）
+_WBITS = {ENCODING_GZIP: 31, ENCODING_DEFLATE: 15}
+COMPRESSIBLE_MIMETYPES = frozenset((
+    'application/json', 'application/x-ndjson', 'text/csv', 'text/plain',
+))
+
+if BACKEND == 'orjson':
+    def dumps(obj, indent=False):
+        """序列化为 UTF-8 编码的 JSON 字节，indent 为 True 时缩进两格"""
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+
+    def loads(data):
+        """解析 JSON（str 或 UTF-8 字节），格式错误时抛出 json.JSONDecodeError"""
+        return orjson.loads(data)
+else:
+    _compact_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    _indent_encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+
+    def dumps(obj, indent=False):
+        """序列化为 UTF-8 编码的 JSON 字节，indent 为 True 时缩进两格"""
+        return (_indent_encoder if indent else _compact_encoder).encode(obj).encode('utf-8')
+
+    def loads(data):
+        """解析 JSON（str 或 UTF-8 字节），格式错误时抛出 json.JSONDecodeError"""
+        return json.loads(data)
+
+
+def dumps_text(obj):
+    """序列化为紧凑的 JSON 字符串"""
+    return dumps(obj).decode('utf-8')
+
+
+def choose_encoding(accept_encodings):
+    """
+    按 Accept-Encoding 选择压缩格式。
+
+    Args:
+        accept_encodings: werkzeug 的 request.accept_encodings
+
+    Returns:
+        str: 'gzip'、'deflate'，客户端都不接受时返回 None
+    """
+    for encoding in (ENCODING_GZIP, ENCODING_DEFLATE):
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, _WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    """逐块压缩流式响应；每块之后 Z_SYNC_FLUSH，客户端能及时收到已经生成的部分"""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, _WBITS[encoding])
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def compress_response(response, accept_encodings, min_size=COMPRESS_MIN_SIZE):
+    """
+    按 Accept-Encoding 原地压缩响应。已经压缩、不是文本类型、状态码不是 200
+    或小于 min_size 的响应保持不变；流式响应（导出）总是压缩。
+
+    Returns:
+        Response: 传入的响应对象
+    """
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    streamed = response.is_streamed
+    if not streamed and (response.content_length or 0) < min_size:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+    if streamed:
+        response.response = compress_stream(response.iter_encoded(), encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class EncodedBody:
+    """预先序列化的响应体；各压缩版本在第一次被请求时生成并保存"""
+
+    __slots__ = ('data', '_compressed', '_lock')
+
+    def __init__(self, data):
+        self.data = data
+        self._compressed = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        body = self._compressed.get(encoding)
+        if body is None:
+            # 多个请求同时未命中时只压缩一次
+            with self._lock:
+                body = self._compressed.get(encoding)
+                if body is None:
+                    body = self._compressed[encoding] = compress(self.data, encoding)
+        return body
+
+
+class ResponseCache:
+    """
+    按名单版本缓存预先序列化的响应体。
+
+    每个键（班级）只保留最新版本，版本号变化即失效；最多保留 max_entries 个键，
+    超出时淘汰最久未使用的。
+
+    Args:
+        max_entries (int): 最多缓存的键数
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # 键 -> (版本号, EncodedBody)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        """返回该版本的 EncodedBody，没有缓存或版本不同时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, obj):
+        """序列化 obj 并缓存为该键的 version 版本，返回 EncodedBody"""
+        body = EncodedBody(dumps(obj))
+        with self._lock:
+            entry = self._entries.get(key)
+            # 并发时可能有更新的版本已经写入，不用旧版本覆盖
+            if entry is None or entry[0] <= version:
+                self._entries[key] = (version, body)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return body
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'serializer': BACKEND,
+            }
@@ -0,0 +1,195 @@
+"""
+班级点名器 - 实时事件推送（Server-Sent Events）
+
+每个连接到 /api/events 的客户端订阅一个班级，服务端把名单变更和点名结果
+广播给该班级的所有订阅者。每个订阅者有一个有界队列：消费过慢（例如投影电脑休眠）
+时，排队中的名单变更被合并为一条 resync 事件（客户端收到后自行增量同步），
+点名事件只保留最近的若干条，因此单个慢客户端不会让服务端内存无限增长，
+也不会阻塞发布者。
+
+每个打开的事件流在连接期间一直占用服务器的一个工作线程，订阅数有上限（max_clients，
+小于工作线程数），超出时拒绝订阅（503），保证普通请求总有线程可用。
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+from codec import dumps_text
+
+EVENT_HELLO = 'hello'       # 连接建立，携带客户端 ID
+EVENT_ROSTER = 'roster'     # 名单变更
+EVENT_PICK = 'pick'         # 点名结果
+EVENT_RESYNC = 'resync'     # 有事件被合并/丢弃，客户端需要重新同步名单
+
+DEFAULT_QUEUE_SIZE = 256
+HEARTBEAT_INTERVAL = 15     # 秒，空闲时发送注释行保持连接并及时发现断开的客户端
+RETRY_MS = 3000             # 断线后浏览器自动重连的间隔
+
+Event = namedtuple('Event', ['id', 'name', 'data'])
+
+
+class SubscriberLimitError(Exception):
+    """事件流订阅数已达上限"""
+    status_code = 503
+
+    def __init__(self, limit):
+        super().__init__(f'实时推送连接数已达上限（{limit}），请稍后再试')
+        self.limit = limit
+
+
+class Subscription:
+    """
+    单个客户端的事件队列。
+
+    Args:
+        class_id (str): 订阅的班级
+        client_id (str): 客户端 ID（随 hello 事件下发，点名请求带上它以便识别自己的事件）
+        queue_size (int): 队列上限
+    """
+
+    def __init__(self, class_id, client_id, queue_size=DEFAULT_QUEUE_SIZE):
+        self.class_id = class_id
+        self.client_id = client_id
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.closed = False
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def put(self, event):
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._queue) >= self.queue_size:
+                self._coalesce(event.id)
+            self._queue.append(event)
+            self._cond.notify()
+
+    def _coalesce(self, event_id):
+        """队列已满：名单变更合并为一条 resync，点名事件只保留较新的一半"""
+        others = [e for e in self._queue if e.name not in (EVENT_ROSTER, EVENT_RESYNC)]
+        others = others[-(self.queue_size // 2):]
+        self.dropped += len(self._queue) - len(others)
+        self._queue.clear()
+        self._queue.append(Event(event_id, EVENT_RESYNC, {'dropped': self.dropped}))
+        self._queue.extend(others)
+
+    def get(self, timeout):
+        """取出下一个事件，超时返回 None"""
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            if self._queue:
+                return self._queue.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class EventBroker:
+    """
+    按班级分发事件的发布/订阅中心（线程安全，进程内）。
+
+    Args:
+        queue_size (int): 每个订阅者的队列上限
+        max_clients (int): 同时连接的订阅者上限，None 表示不限制
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, max_clients=None):
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self.rejected = 0
+        self._subscribers = {}      # class_id -> set(Subscription)
+        self._count = 0
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._next_client = 0
+
+    def subscribe(self, class_id):
+        """
+        Raises:
+            SubscriberLimitError: 订阅数已达 max_clients
+        """
+        with self._lock:
+            if self.max_clients is not None and self._count >= self.max_clients:
+                self.rejected += 1
+                raise SubscriberLimitError(self.max_clients)
+            self._count += 1
+            self._next_client += 1
+            subscription = Subscription(class_id, f"c{self._next_client}", self.queue_size)
+            self._subscribers.setdefault(class_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.class_id)
+            if subscribers is not None and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscription.class_id]
+
+    def publish(self, class_id, name, data):
+        """
+        向班级的所有订阅者广播事件（不会阻塞：慢客户端的队列满时合并事件）。
+
+        Returns:
+            int: 收到事件的订阅者数量
+        """
+        with self._lock:
+            self._next_id += 1
+            event = Event(self._next_id, name, data)
+            subscribers = list(self._subscribers.get(class_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+        return len(subscribers)
+
+    def stream(self, subscription, heartbeat=HEARTBEAT_INTERVAL):
+        """
+        生成订阅者的 SSE 响应体，客户端断开（生成器被关闭）时自动退订。
+
+        Yields:
+            str: SSE 格式的文本片段
+        """
+        try:
+            yield f"retry: {RETRY_MS}\n"
+            yield format_event(Event(0, EVENT_HELLO, {'client_id': subscription.client_id}))
+            last_sent = time.monotonic()
+            while not subscription.closed:
+                event = subscription.get(timeout=heartbeat)
+                if event is not None:
+                    yield format_event(event)
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= heartbeat:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            subscribers = [s for group in self._subscribers.values() for s in group]
+        return {
+            'clients': len(subscribers),
+            'dropped': sum(s.dropped for s in subscribers),
+            'rejected': self.rejected,
+        }
+
+    def close(self):
+        """关闭所有订阅（进程退出时调用，让阻塞中的流尽快结束）"""
+        with self._lock:
+            subscribers = [s for group in self._subscribers.values() for s in group]
+            self._subscribers.clear()
+            self._count = 0
+        for subscription in subscribers:
+            subscription.close()
+
+
+def format_event(event):
+    data = dumps_text(event.data)
+    return f"id: {event.id}\nevent: {event.name}\ndata: {data}\n\n"
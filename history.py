@@ -0,0 +1,438 @@
+"""
+班级点名器 - 点名历史
+
+每次点名以定长二进制记录追加到 pick_history.bin（16 字节：毫秒时间戳 int64、
+班级编号 uint32、学生编号 uint32，小端序），班级和学生的编号与名字的对应关系
+追加在同名的 .names 文件中（JSON lines）。学生改名时只追加一条改名记录，
+历史记录中的编号不变，统计会跟随学生的新名字。
+
+多个进程共享历史文件时，名字表的追加在跨进程文件锁（.names.lock）内进行：
+追加前先读入其他进程新写入的条目，同一个名字只会分配一个编号；
+写入中断留下的半行在持有锁时截掉，不会和之后追加的条目粘在一起。
+
+统计（每个学生的次数、最近一次被点时间、按天/按周的次数）保存在内存中，
+首次查询时通过 mmap 顺序扫描一次文件建立，之后每次点名增量更新，
+查询只需汇总涉及的天数，与历史总条数无关。最近点名记录的查询直接在 mmap 上
+从指定位置向前读取。
+"""
+
+import datetime
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from journal import FileLock
+from storage import CHANGE_RENAME, InvalidRequestError
+
+RECORD = struct.Struct('<qII')      # 时间戳（毫秒）、班级编号、学生编号
+
+INTERVAL_DAY = 'day'
+INTERVAL_WEEK = 'week'
+INTERVALS = (INTERVAL_DAY, INTERVAL_WEEK)
+
+
+def parse_date(value, field):
+    """
+    解析 YYYY-MM-DD 格式的日期参数，None 或空字符串返回 None。
+
+    Raises:
+        InvalidRequestError: 日期格式无效
+    """
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise InvalidRequestError(f'{field} 参数应为 YYYY-MM-DD 格式的日期') from None
+
+
+def _format_time(timestamp_ms):
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000).isoformat(timespec='seconds')
+
+
+class _DayClock:
+    """把毫秒时间戳换算为本地日期序号；记录按时间排列，缓存当天的起止时间避免逐条换算"""
+
+    def __init__(self):
+        self._start = self._end = 0
+        self._ordinal = 0
+
+    def ordinal(self, timestamp_ms):
+        if self._start <= timestamp_ms < self._end:
+            return self._ordinal
+        day = datetime.date.fromtimestamp(timestamp_ms / 1000)
+        start = datetime.datetime.combine(day, datetime.time())
+        self._start = int(start.timestamp() * 1000)
+        self._end = int((start + datetime.timedelta(days=1)).timestamp() * 1000)
+        self._ordinal = day.toordinal()
+        return self._ordinal
+
+
+class _ClassAggregates:
+    """单个班级的增量统计"""
+
+    __slots__ = ('counts', 'last', 'days', 'day_totals')
+
+    def __init__(self):
+        self.counts = {}        # 学生编号 -> 总次数
+        self.last = {}          # 学生编号 -> 最近一次被点的时间戳
+        self.days = {}          # 日期序号 -> {学生编号: 次数}
+        self.day_totals = {}    # 日期序号 -> 次数
+
+    def add(self, student, timestamp_ms, day):
+        self.counts[student] = self.counts.get(student, 0) + 1
+        self.last[student] = timestamp_ms
+        per_day = self.days.get(day)
+        if per_day is None:
+            per_day = self.days[day] = {}
+        per_day[student] = per_day.get(student, 0) + 1
+        self.day_totals[day] = self.day_totals.get(day, 0) + 1
+
+
+class PickHistory:
+    """
+    追加写入的点名历史（线程安全）。
+
+    Args:
+        path (str): 二进制记录文件，名字表保存在 path + '.names'
+    """
+
+    def __init__(self, path='pick_history.bin'):
+        self.path = path
+        self.names_path = f"{path}.names"
+        self._lock = threading.Lock()
+        self._names_lock = FileLock(f"{self.names_path}.lock")
+        self._names_offset = 0      # 名字表中已读入的字节数（只计完整的行）
+        self._class_ids = []        # 班级编号 -> 班级 ID
+        self._class_index = {}      # 班级 ID -> 班级编号
+        self._students = []         # 学生编号 -> (班级编号, 当前名字)
+        self._student_index = {}    # (班级编号, 名字) -> 学生编号
+        self._last_timestamp = 0
+        self._aggregates = None     # 班级编号 -> _ClassAggregates，首次查询时建立
+        self._clock = _DayClock()
+        self._file = None
+        with self._names_lock:
+            self._sync_names(repair=True)
+            self._truncate_partial_record()
+
+    # ---- 文件 ----
+
+    def _sync_names(self, repair=False):
+        """
+        读入名字表中上次读取位置之后的完整行（其他进程追加的条目），调用方需持有 self._lock
+        或在初始化中。
+
+        Args:
+            repair (bool): 截掉末尾不完整的行，只能在持有 self._names_lock 时使用
+        """
+        try:
+            f = open(self.names_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self._names_offset)
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    # 旧版本中截断的半行与之后的条目粘在了一起，跳过这一行
+                    logging.warning(f"点名历史名字表中有无法解析的记录，已跳过: {self.names_path}")
+                else:
+                    self._apply_name_entry(entry)
+                self._names_offset += len(raw)
+            if repair and os.fstat(f.fileno()).st_size > self._names_offset:
+                # 写入中断留下的不完整行只可能在末尾（追加都在锁内进行）
+                logging.warning(f"点名历史名字表末尾有不完整的记录，已截断: {self.names_path}")
+                os.truncate(self.names_path, self._names_offset)
+
+    def _apply_name_entry(self, entry):
+        if 'class' in entry:
+            self._class_index[entry['class']] = len(self._class_ids)
+            self._class_ids.append(entry['class'])
+        elif 'student' in entry:
+            class_index, name = entry['c'], entry['student']
+            self._student_index[(class_index, name)] = len(self._students)
+            self._students.append((class_index, name))
+        elif 'rename' in entry:
+            student, new_name = entry['rename'], entry['n']
+            if not 0 <= student < len(self._students):
+                logging.warning(f"点名历史名字表中的改名记录指向不存在的学生编号 {student}，已忽略")
+                return
+            class_index, old_name = self._students[student]
+            if self._student_index.get((class_index, old_name)) == student:
+                del self._student_index[(class_index, old_name)]
+            self._student_index[(class_index, new_name)] = student
+            self._students[student] = (class_index, new_name)
+
+    def _truncate_partial_record(self):
+        """去掉写入中断留下的不完整记录，并读取最后一条记录的时间"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        usable = size - size % RECORD.size
+        if usable != size:
+            logging.warning(f"点名历史末尾有不完整的记录，已截断: {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(usable)
+        if usable:
+            with open(self.path, 'rb') as f:
+                f.seek(usable - RECORD.size)
+                self._last_timestamp = RECORD.unpack(f.read(RECORD.size))[0]
+
+    def _write_names(self, entries):
+        """追加名字表条目，调用方需持有 self._lock 和 self._names_lock，并已调用 _sync_names(repair=True)"""
+        data = ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in entries).encode('utf-8')
+        with open(self.names_path, 'ab') as f:
+            f.write(data)
+        self._names_offset += len(data)
+        for entry in entries:
+            self._apply_name_entry(entry)
+
+    def _student_name(self, student):
+        """学生编号对应的当前名字；名字表损坏导致编号缺失时返回 None"""
+        if 0 <= student < len(self._students):
+            return self._students[student][1]
+        return None
+
+    def _map(self):
+        """
+        以只读方式映射记录文件。
+
+        Returns:
+            tuple: (mmap 或 None, 记录条数)
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return None, 0
+        count = size // RECORD.size
+        if not count:
+            return None, 0
+        with open(self.path, 'rb') as f:
+            return mmap.mmap(f.fileno(), count * RECORD.size, access=mmap.ACCESS_READ), count
+
+    def _ensure_aggregates(self):
+        """首次查询时扫描一次记录文件建立统计，调用方需持有 self._lock"""
+        if self._aggregates is not None:
+            return
+        started = time.perf_counter()
+        aggregates = {}
+        mapped, count = self._map()
+        if mapped is not None:
+            view = memoryview(mapped)
+            try:
+                for timestamp_ms, class_index, student in RECORD.iter_unpack(view):
+                    entry = aggregates.get(class_index)
+                    if entry is None:
+                        entry = aggregates[class_index] = _ClassAggregates()
+                    entry.add(student, timestamp_ms, self._clock.ordinal(timestamp_ms))
+            finally:
+                view.release()
+                mapped.close()
+        self._aggregates = aggregates
+        logging.info(f"点名历史统计已建立: {count} 条记录，耗时 {time.perf_counter() - started:.3f} 秒")
+
+    # ---- 写入 ----
+
+    def record(self, class_id, names, timestamp=None):
+        """
+        追加一次点名（可包含多名学生）。
+
+        Args:
+            class_id (str): 班级 ID
+            names (list): 被点到的学生
+            timestamp (float): 点名时间（秒），默认当前时间
+        """
+        if not names:
+            return
+        timestamp_ms = int((time.time() if timestamp is None else timestamp) * 1000)
+        with self._lock:
+            # 保证文件中的时间非递减（系统时间被回拨时沿用上一条的时间）
+            timestamp_ms = max(timestamp_ms, self._last_timestamp)
+            class_index = self._class_index.get(class_id)
+            if class_index is None or any((class_index, name) not in self._student_index for name in names):
+                # 有新的班级或学生：在跨进程锁内先读入其他进程分配的编号，再追加
+                with self._names_lock:
+                    self._sync_names(repair=True)
+                    if class_id not in self._class_index:
+                        self._write_names([{'class': class_id}])
+                    class_index = self._class_index[class_id]
+                    new_entries = [
+                        {'student': name, 'c': class_index}
+                        for name in dict.fromkeys(names) if (class_index, name) not in self._student_index
+                    ]
+                    if new_entries:
+                        self._write_names(new_entries)
+
+            students = [self._student_index[(class_index, name)] for name in names]
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+            self._file.write(b''.join(RECORD.pack(timestamp_ms, class_index, s) for s in students))
+            self._file.flush()
+            self._last_timestamp = timestamp_ms
+
+            if self._aggregates is not None:
+                entry = self._aggregates.get(class_index)
+                if entry is None:
+                    entry = self._aggregates[class_index] = _ClassAggregates()
+                day = self._clock.ordinal(timestamp_ms)
+                for student in students:
+                    entry.add(student, timestamp_ms, day)
+
+    def on_roster_change(self, change):
+        """名单变更回调：学生改名后历史记录跟随新名字"""
+        if change.op != CHANGE_RENAME:
+            return
+        with self._lock, self._names_lock:
+            self._sync_names(repair=True)
+            class_index = self._class_index.get(change.class_id)
+            if class_index is None:
+                return
+            student = self._student_index.get((class_index, change.name))
+            if student is not None:
+                self._write_names([{'rename': student, 'n': change.new_name}])
+
+    # ---- 查询 ----
+
+    def _day_range(self, start, end):
+        return (start.toordinal() if start else None, end.toordinal() if end else None)
+
+    def student_stats(self, class_id, start=None, end=None):
+        """
+        每个学生被点到的次数和最近一次被点的时间，按次数从多到少排列。
+
+        Args:
+            start, end (datetime.date): 可选的统计日期范围（含两端）；
+                last_picked 始终是全部历史中最近一次被点的时间
+        """
+        with self._lock:
+            self._sync_names()
+            self._ensure_aggregates()
+            class_index = self._class_index.get(class_id)
+            entry = self._aggregates.get(class_index) if class_index is not None else None
+            if entry is None:
+                return []
+            if start is None and end is None:
+                counts = dict(entry.counts)
+            else:
+                first, last = self._day_range(start, end)
+                counts = {}
+                for day, per_day in entry.days.items():
+                    if (first is None or day >= first) and (last is None or day <= last):
+                        for student, count in per_day.items():
+                            counts[student] = counts.get(student, 0) + count
+            result = [
+                {
+                    'name': name,
+                    'count': count,
+                    'last_picked': _format_time(entry.last[student]),
+                }
+                for student, count in counts.items()
+                if (name := self._student_name(student)) is not None
+            ]
+        result.sort(key=lambda item: (-item['count'], item['name']))
+        return result
+
+    def buckets(self, class_id, interval=INTERVAL_DAY, start=None, end=None, name=None):
+        """
+        按天或按周（周一开始）汇总点名次数，只返回有点名的时间段。
+
+        Args:
+            name (str): 只统计某个学生
+        """
+        if interval not in INTERVALS:
+            raise InvalidRequestError(f"interval 参数应为 {' 或 '.join(INTERVALS)}")
+        first, last = self._day_range(start, end)
+        totals = {}
+        with self._lock:
+            self._sync_names()
+            self._ensure_aggregates()
+            class_index = self._class_index.get(class_id)
+            entry = self._aggregates.get(class_index) if class_index is not None else None
+            if entry is None:
+                return []
+            student = None
+            if name is not None:
+                student = self._student_index.get((class_index, name))
+                if student is None:
+                    return []
+            for day, total in entry.day_totals.items():
+                if (first is not None and day < first) or (last is not None and day > last):
+                    continue
+                count = total if student is None else entry.days[day].get(student, 0)
+                if not count:
+                    continue
+                if interval == INTERVAL_WEEK:
+                    day -= datetime.date.fromordinal(day).weekday()
+                totals[day] = totals.get(day, 0) + count
+        return [
+            {'start': datetime.date.fromordinal(day).isoformat(), 'count': count}
+            for day, count in sorted(totals.items())
+        ]
+
+    def recent(self, class_id, limit=50, before=None):
+        """
+        最近的点名记录（从新到旧），直接读取映射的记录文件。
+
+        Args:
+            limit (int): 最多返回的条数
+            before (int): 翻页游标，只返回序号小于它的记录（上一页返回的 next）
+
+        Returns:
+            tuple: (记录列表, 下一页的游标；没有更早的记录时为 None)
+        """
+        with self._lock:
+            self._sync_names()
+            class_index = self._class_index.get(class_id)
+        if class_index is None:
+            return [], None
+        mapped, count = self._map()
+        if mapped is None:
+            return [], None
+        records = []
+        next_cursor = None
+        try:
+            end = count if before is None else max(0, min(before, count))
+            for i in range(end - 1, -1, -1):
+                timestamp_ms, record_class, student = RECORD.unpack_from(mapped, i * RECORD.size)
+                if record_class == class_index:
+                    records.append((timestamp_ms, student))
+                    if len(records) >= limit:
+                        next_cursor = i if i > 0 else None
+                        break
+        finally:
+            mapped.close()
+        with self._lock:
+            self._sync_names()
+            picks = [
+                {'name': name, 'time': _format_time(timestamp_ms)}
+                for timestamp_ms, student in records
+                if (name := self._student_name(student)) is not None
+            ]
+        return picks, next_cursor
+
+    def stats(self):
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+            return {
+                'records': size // RECORD.size,
+                'classes': len(self._class_ids),
+                'students': len(self._students),
+                'aggregated': self._aggregates is not None,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = None
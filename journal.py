@@ -0,0 +1,477 @@
+"""
+班级点名器 - 学生名单写入日志（journal）
+
+每次增删学生只向 `<名单文件>.log` 追加一行 JSON 记录，写入成本与名单大小无关。
+多个并发写入共享一次 fsync（组提交）。日志累积到一定长度后在后台线程中压缩：
+把当前名单写入临时文件，再通过 os.replace 原子替换快照文件，因此崩溃时
+快照要么是旧版本、要么是新版本，不会出现被截断的半个文件。
+
+启动时按 快照 + 轮换中的日志 + 当前日志 的顺序回放得到最新名单。
+回放是幂等的（重复添加/删除不会出错），所以压缩中途崩溃也不会丢数据。
+
+多个进程共享同一份名单时，写入、回放和压缩完成时的替换都在跨进程文件锁（FileLock）内进行。
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from codec import dumps, loads
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+OP_ADD = 'add'
+OP_DELETE = 'del'
+OP_RENAME = 'ren'
+
+
+def _fsync_directory(path):
+    """在 POSIX 系统上同步目录项，确保 os.replace 的结果落盘"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_json_atomic(path, data, indent=False):
+    """
+    通过 临时文件 + fsync + os.replace 原子地写入 JSON 文件。
+
+    Args:
+        path (str): 目标文件路径
+        data: 可 JSON 序列化的数据
+        indent (bool): 是否缩进（需要手工编辑的配置文件），默认紧凑格式
+
+    Returns:
+        int: 写入的字节数
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(dumps(data, indent=indent))
+        f.flush()
+        os.fsync(f.fileno())
+        size = os.fstat(f.fileno()).st_size
+    os.replace(tmp_path, path)
+    _fsync_directory(path)
+    return size
+
+
+def _lock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    # msvcrt 没有无限等待的阻塞锁，轮询直到拿到第一个字节的锁
+    os.lseek(fd, 0, os.SEEK_SET)
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(0.01)
+
+
+def _unlock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """
+    跨进程的排他文件锁（POSIX 上为 flock，Windows 上为 msvcrt.locking），
+    同一进程内的其他线程同样会被阻塞；同一线程可以重复获取。
+
+    锁文件本身可以保存少量数据，只能在持有锁时通过 read()/write() 读写。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    _lock_fd(fd)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                _unlock_fd(fd)
+            finally:
+                os.close(fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def read(self):
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(self._fd, 65536)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    def write(self, data):
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, data)
+        os.ftruncate(self._fd, len(data))
+
+
+def apply_op(index, op, name, new_name=None):
+    """把一条日志记录应用到有序集合（dict）上，重复操作是无害的"""
+    if op == OP_ADD:
+        index.setdefault(name, None)
+    elif op == OP_DELETE:
+        index.pop(name, None)
+    elif op == OP_RENAME:
+        if name in index and new_name not in index:
+            # 原位改名，保持名单顺序
+            names = list(index)
+            names[names.index(name)] = new_name
+            index.clear()
+            index.update(dict.fromkeys(names))
+
+
+def _encode_record(op, name, new_name=None):
+    record = {'op': op, 'name': name}
+    if new_name is not None:
+        record['new'] = new_name
+    return dumps(record) + b'\n'
+
+
+class RosterJournal:
+    """
+    学生名单的追加式写入日志。
+
+    Args:
+        snapshot_path (str): 快照文件路径（即 students.json，格式保持为 JSON 数组）
+        fsync_interval (float): 组提交的等待窗口（秒），窗口内的写入共享一次 fsync
+        compact_min_entries (int): 触发压缩的最小日志条数；实际阈值为
+            max(该值, 当前名单人数)，使压缩的摊还成本保持为 O(1)
+        lock (FileLock): 多个进程共享名单时的跨进程锁，调用方在写入和回放时持有，
+            后台压缩替换快照时也会获取；on_compacted 在持有该锁、快照替换完成后调用
+    """
+
+    def __init__(self, snapshot_path, fsync_interval=0.01, compact_min_entries=256,
+                 lock=None, on_compacted=None):
+        self.snapshot_path = snapshot_path
+        self.log_path = f"{snapshot_path}.log"
+        self.rotated_path = f"{snapshot_path}.log.1"
+        self.fsync_interval = fsync_interval
+        self.compact_min_entries = compact_min_entries
+        self.lock = lock
+        self.on_compacted = on_compacted
+
+        self._lock = threading.RLock()
+        self._synced = threading.Condition(self._lock)
+        self._log_file = None
+        self._entries = 0           # 当前日志中的记录数
+        self._written_seq = 0       # 已写入（未必已落盘）的记录序号
+        self._synced_seq = 0        # 已 fsync 的记录序号
+        self._generation = 0        # 每次整体重写快照时递增，用于作废过期的后台压缩
+        self._compacting = False
+        self._flusher = None
+        self._closed = False
+
+    @property
+    def watch_paths(self):
+        """缓存失效检测需要关注的文件"""
+        return (self.snapshot_path, self.log_path, self.rotated_path)
+
+    # ---- 读取与回放 ----
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return []
+        with open(self.snapshot_path, 'rb') as f:
+            data = loads(f.read())
+        return data if isinstance(data, list) else []
+
+    def _replay(self, path, index):
+        """
+        回放一个日志文件，返回 (记录条数, 最后一条完整记录之后的偏移量)。
+        崩溃可能留下半行记录，遇到无法解析的行即停止回放。
+        """
+        if not os.path.exists(path):
+            return 0, 0
+        count = 0
+        good_offset = 0
+        with open(path, 'rb') as f:
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break
+                try:
+                    record = loads(raw)
+                    apply_op(index, record['op'], record['name'], record.get('new'))
+                except (ValueError, KeyError, TypeError):
+                    break
+                count += 1
+                good_offset += len(raw)
+        return count, good_offset
+
+    def load(self):
+        """
+        回放 快照 + 日志 得到当前名单。
+
+        Returns:
+            list: 学生名字列表
+        """
+        with self._lock:
+            index = dict.fromkeys(self._read_snapshot())
+            rotated_exists = os.path.exists(self.rotated_path)
+            if rotated_exists:
+                self._replay(self.rotated_path, index)
+            count, good_offset = self._replay(self.log_path, index)
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > good_offset:
+                logging.warning(f"名单日志末尾存在不完整记录，已截断: {self.log_path}")
+                self._close_log()
+                with open(self.log_path, 'r+b') as f:
+                    f.truncate(good_offset)
+            self._entries = count
+            students = list(index)
+            if rotated_exists and not self._compacting and self.lock is None:
+                # 上次压缩未完成（进程崩溃），直接用回放结果重新生成快照。
+                # 多进程共享时轮换日志可能属于另一个进程正在进行的压缩，留给下次压缩处理
+                logging.info("检测到未完成的名单日志压缩，正在重新生成快照")
+                self._checkpoint_locked(students)
+            return students
+
+    def replay_tail(self, index, start, end):
+        """
+        只回放当前日志 [start, end) 区间新追加的记录（其他进程写入后增量刷新缓存），
+        调用方需持有跨进程锁。
+
+        Returns:
+            list: 回放的 (操作, 名字, 新名字) 列表；遇到不完整的记录时返回 None，
+                由调用方整体重新加载
+        """
+        with self._lock, open(self.log_path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+            if len(data) != end - start or (data and not data.endswith(b'\n')):
+                return None
+            changes = []
+            for raw in data.splitlines():
+                try:
+                    record = loads(raw)
+                    apply_op(index, record['op'], record['name'], record.get('new'))
+                except (ValueError, KeyError, TypeError):
+                    return None
+                changes.append((record['op'], record['name'], record.get('new')))
+            self._entries += len(changes)
+            return changes
+
+    # ---- 写入 ----
+
+    def _open_log(self):
+        if self._log_file is not None and self.lock is not None:
+            # 其他进程可能已经轮换了日志，此时句柄指向的是轮换出去的旧文件
+            try:
+                current = os.stat(self.log_path).st_ino
+            except OSError:
+                current = None
+            if current != os.fstat(self._log_file.fileno()).st_ino:
+                self._close_log()
+        if self._log_file is None:
+            self._log_file = open(self.log_path, 'ab')
+        return self._log_file
+
+    def _close_log(self):
+        if self._log_file is not None:
+            try:
+                self._log_file.flush()
+                os.fsync(self._log_file.fileno())
+            finally:
+                self._log_file.close()
+                self._log_file = None
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name='roster-journal-fsync', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        """后台组提交线程：等待一个短窗口收集写入，然后一次 fsync"""
+        while True:
+            with self._lock:
+                while self._written_seq == self._synced_seq and not self._closed:
+                    self._synced.wait()
+                if self._closed:
+                    return
+            time.sleep(self.fsync_interval)
+            with self._lock:
+                target = self._written_seq
+                try:
+                    if self._log_file is not None:
+                        self._log_file.flush()
+                        os.fsync(self._log_file.fileno())
+                except OSError as e:
+                    logging.error(f"同步名单日志失败: {str(e)}")
+                self._synced_seq = max(self._synced_seq, target)
+                self._synced.notify_all()
+
+    def append(self, op, name, new_name=None):
+        """
+        追加一条变更记录，在记录落盘（fsync）后返回。
+
+        Args:
+            op (str): OP_ADD、OP_DELETE 或 OP_RENAME
+            name (str): 学生名字
+            new_name (str): OP_RENAME 的新名字
+        """
+        self.append_many([(op, name, new_name)] if new_name is not None else [(op, name)])
+
+    def append_many(self, records):
+        """
+        一次写入多条变更记录（批量导入时使用），共享一次 write 和一次 fsync。
+
+        Args:
+            records (list): (操作, 名字) 或 (OP_RENAME, 旧名字, 新名字) 列表
+
+        Returns:
+            int: 写入的字节数
+        """
+        if not records:
+            return 0
+        data = b''.join(_encode_record(*record) for record in records)
+        with self._lock:
+            log_file = self._open_log()
+            log_file.write(data)
+            log_file.flush()
+            self._entries += len(records)
+            self._written_seq += 1
+            seq = self._written_seq
+            self._ensure_flusher()
+            self._synced.notify_all()
+            while self._synced_seq < seq and not self._closed:
+                self._synced.wait()
+        return len(data)
+
+    def needs_compaction(self, roster_size):
+        return self._entries >= max(self.compact_min_entries, roster_size)
+
+    def maybe_compact(self, students):
+        """
+        日志过长时在后台压缩。
+
+        调用方必须保证 students 恰好是截至目前所有日志记录回放后的名单
+        （即在名单锁内、append 之后调用）。
+        """
+        with self._lock:
+            if self._compacting or not self.needs_compaction(len(students)):
+                return False
+            if os.path.exists(self.rotated_path):
+                # 上一次后台压缩失败留下了轮换日志，直接同步写一次完整快照
+                self._checkpoint_locked(list(students))
+                return True
+            # 先把当前日志轮换出去，新的写入进入新日志，压缩期间不阻塞写入
+            self._close_log()
+            os.replace(self.log_path, self.rotated_path)
+            rotated_inode = os.stat(self.rotated_path).st_ino
+            self._entries = 0
+            self._compacting = True
+            generation = self._generation
+        snapshot = list(students)
+        threading.Thread(
+            target=self._compact, args=(snapshot, generation, rotated_inode),
+            name='roster-journal-compact', daemon=True,
+        ).start()
+        return True
+
+    def _still_current(self, generation, rotated_inode):
+        """压缩结果是否仍然有效：名单没有被整体重写，轮换日志也没有被其他进程处理掉"""
+        if generation != self._generation:
+            return False
+        try:
+            return os.stat(self.rotated_path).st_ino == rotated_inode
+        except OSError:
+            return False
+
+    def _compact(self, students, generation, rotated_inode):
+        # 临时文件名带上进程号，多个进程同时压缩时互不覆盖
+        tmp_path = f"{self.snapshot_path}.compact.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(dumps(students))
+                f.flush()
+                os.fsync(f.fileno())
+            with self.lock if self.lock is not None else nullcontext(), self._lock:
+                if not self._still_current(generation, rotated_inode):
+                    # 期间名单被整体重写过，本次压缩结果已过期
+                    os.remove(tmp_path)
+                    return
+                os.replace(tmp_path, self.snapshot_path)
+                _fsync_directory(self.snapshot_path)
+                os.remove(self.rotated_path)
+                if self.on_compacted is not None:
+                    self.on_compacted()
+            logging.info(f"名单日志压缩完成: {len(students)} 名学生")
+        except OSError as e:
+            logging.error(f"名单日志压缩失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _checkpoint_locked(self, students):
+        """写入完整快照并清空日志，调用方需持有 self._lock，返回快照的字节数"""
+        size = write_json_atomic(self.snapshot_path, students)
+        self._close_log()
+        with open(self.log_path, 'wb'):
+            pass
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+        self._entries = 0
+        self._generation += 1
+        return size
+
+    def replace_all(self, students):
+        """用完整名单替换快照（例如导入或初始化时），同时清空日志，返回写入的字节数"""
+        with self._lock:
+            return self._checkpoint_locked(list(students))
+
+    def close(self):
+        """停止后台线程并确保日志落盘"""
+        with self._lock:
+            self._closed = True
+            self._synced.notify_all()
+            self._close_log()
@@ -0,0 +1,160 @@
+"""
+班级点名器 - 日志配置
+
+请求线程只把日志记录放入内存队列（QueueHandler），由后台的 QueueListener 线程
+统一写入文件和控制台，请求处理不会等待磁盘 I/O。日志文件按大小或按时间轮换，
+避免无限增长；每个请求都会产生的 INFO 日志（获取名单、点名、访问首页等）
+可以按比例采样，格式可选普通文本或 JSON lines。
+
+配置项（环境变量，均为可选）：
+
+- ROLLCALL_LOG_FILE: 日志文件，默认 app_log.txt
+- ROLLCALL_LOG_FORMAT: text（默认）或 json
+- ROLLCALL_LOG_ROTATE: size（按大小，默认）或 time（按时间）
+- ROLLCALL_LOG_MAX_BYTES: 按大小轮换时单个文件的上限，默认 5 MB
+- ROLLCALL_LOG_WHEN: 按时间轮换的周期（TimedRotatingFileHandler 的 when 参数），默认 midnight
+- ROLLCALL_LOG_BACKUPS: 保留的历史文件数，默认 5
+- ROLLCALL_LOG_SAMPLE: 请求日志的采样率（0~1），默认 1（全部记录）
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+
+REQUEST_LOGGER = 'rollcall.request'     # 每个请求都会产生的 INFO 日志使用这个 logger
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+DEFAULT_LOG_CONFIG = {
+    'file': 'app_log.txt',
+    'format': 'text',
+    'rotate': 'size',
+    'max_bytes': 5 * 1024 * 1024,
+    'when': 'midnight',
+    'backups': 5,
+    'sample': 1.0,
+}
+
+_ENV_VARS = {
+    'ROLLCALL_LOG_FILE': 'file',
+    'ROLLCALL_LOG_FORMAT': 'format',
+    'ROLLCALL_LOG_ROTATE': 'rotate',
+    'ROLLCALL_LOG_MAX_BYTES': 'max_bytes',
+    'ROLLCALL_LOG_WHEN': 'when',
+    'ROLLCALL_LOG_BACKUPS': 'backups',
+    'ROLLCALL_LOG_SAMPLE': 'sample',
+}
+
+_listener = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+                    + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    按比例随机保留 INFO 及以下级别的日志，WARNING 及以上级别总是保留。
+
+    Args:
+        rate (float): 保留比例，0~1
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+def load_log_config(environ=None):
+    environ = os.environ if environ is None else environ
+    config = dict(DEFAULT_LOG_CONFIG)
+    for env_name, key in _ENV_VARS.items():
+        if environ.get(env_name):
+            config[key] = environ[env_name]
+    config['format'] = str(config['format']).lower()
+    config['rotate'] = str(config['rotate']).lower()
+    config['max_bytes'] = int(config['max_bytes'])
+    config['backups'] = int(config['backups'])
+    config['sample'] = min(1.0, max(0.0, float(config['sample'])))
+    return config
+
+
+def _file_handler(config):
+    if config['rotate'] == 'time':
+        return logging.handlers.TimedRotatingFileHandler(
+            config['file'], when=config['when'], backupCount=config['backups'], encoding='utf-8')
+    return logging.handlers.RotatingFileHandler(
+        config['file'], maxBytes=config['max_bytes'], backupCount=config['backups'], encoding='utf-8')
+
+
+def setup_logging(config=None, level=logging.INFO):
+    """
+    配置根 logger：QueueHandler + 后台 QueueListener（文件 + 控制台）。
+    重复调用不会重复添加处理器。
+
+    Args:
+        config (dict): 见 load_log_config，默认从环境变量读取
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    config = config or load_log_config()
+    root = logging.getLogger()
+
+    formatter = JsonLinesFormatter() if config['format'] == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = []
+    try:
+        handlers.append(_file_handler(config))
+    except OSError as e:
+        # 日志文件不可写时仍然输出到控制台
+        print(f"无法打开日志文件 {config['file']}: {e}")
+    handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    # 请求日志和 Werkzeug 的访问日志按比例采样，在进入队列之前丢弃
+    sampling = SamplingFilter(config['sample'])
+    for name in (REQUEST_LOGGER, 'werkzeug'):
+        logging.getLogger(name).addFilter(sampling)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """停止后台线程，写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
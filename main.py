@@ -4,166 +4,915 @@
 提供随机点名功能的 RESTful API 服务，管理学生数据，并提供前端界面。
 """
 
-from flask import Flask, render_template, jsonify, request, send_from_directory, abort
-import random
-import json
+from flask import Blueprint, Flask, current_app, g, render_template, jsonify, request, Response, stream_with_context
+from flask.json.provider import JSONProvider
 import os
-import webbrowser
 import logging
-from threading import Timer
-from werkzeug.utils import secure_filename
-
-# 配置日志系统
-if not logging.getLogger().handlers:
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler("app_log.txt", encoding='utf-8', mode='a'),
-            logging.StreamHandler()
-        ]
-    )
-
-# 获取端口号（从环境变量或使用默认值）
-port = int(os.environ.get('APP_PORT', 5000))
-logging.info(f"Flask 应用将使用端口: {port}")
+import time
+import atexit
+from collections import namedtuple
+from contextlib import nullcontext
+from werkzeug.local import LocalProxy
 
-# 初始化 Flask 应用
-app = Flask(__name__, static_folder='static', template_folder='templates')
+from storage import (
+    DEFAULT_CLASS_ID, IO_LOAD, IO_SAVE, StorageError, InvalidRequestError, VersionConflictError,
+    create_storage, normalize_name, validate_class_id,
+)
+from picker import PickEngine
+from history import PickHistory, parse_date
+from revisions import RosterRevisions
+from search import DEFAULT_LIMIT as SEARCH_DEFAULT_LIMIT, MAX_LIMIT as SEARCH_MAX_LIMIT, StudentSearch, pinyin_available
+from events import EventBroker, EVENT_ROSTER, EVENT_PICK, SubscriberLimitError
+from server import DEFAULT_SERVER_CONFIG, event_stream_limit
+from bulk import MIMETYPES, FORMAT_CSV, FORMAT_NDJSON, detect_format, iter_import_rows, export_rows
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, UNMATCHED_ROUTE, MetricsRegistry
+from logconfig import REQUEST_LOGGER, setup_logging
+from assets import (
+    BUNDLE_FILE as ASSET_BUNDLE_FILE, AssetPipeline, ENCODING_IDENTITY, IMMUTABLE_CACHE_CONTROL, PAGE_CACHE_CONTROL, select_encoding,
+)
+import codec
+from codec import (
+    COMPRESS_MIN_SIZE, ENCODING_DEFLATE, ENCODING_GZIP, ResponseCache, choose_encoding, compress_response,
+)
 
 # 应用配置常量
-STUDENTS_FILE = 'students.json'     # 学生数据文件路径
-MAX_STUDENTS = 100                  # 学生数量上限
+STUDENTS_FILE = 'students.json'     # 默认班级的学生数据文件路径
+CLASSES_DIR = 'classes'             # 其他班级名单文件目录（json 后端）
+PICK_STATE_FILE = 'pick_state.json'  # 点名策略状态（次数、洗牌袋、缺席名单）
+PICK_HISTORY_FILE = 'pick_history.bin'  # 点名历史（追加写入的二进制记录）
+ROSTER_HISTORY_DIR = 'roster_history'   # 名单版本历史（每个班级一个子目录）
 APP_IDENTIFIER = "RollCallPy"       # 应用标识符（用于实例检测）
+MAX_IMPORT_ERRORS = 1000            # 批量导入时错误报告最多返回的条数
+MAX_PAGE_SIZE = 5000                # 分页获取名单时每页的最大人数
+EVENT_RETRY_AFTER = 30              # 秒，事件流连接数已满时建议客户端重试的间隔
+
+# 每个应用实例持有的服务对象，保存在 app.extensions['rollcall']
+Services = namedtuple('Services', ['storage', 'pick_engine', 'event_broker', 'assets', 'metrics', 'history',
+                                   'search', 'responses', 'revisions'])
+
+# 路由中通过代理访问当前应用的服务对象
+storage = LocalProxy(lambda: current_app.extensions['rollcall'].storage)
+pick_engine = LocalProxy(lambda: current_app.extensions['rollcall'].pick_engine)
+event_broker = LocalProxy(lambda: current_app.extensions['rollcall'].event_broker)
+assets = LocalProxy(lambda: current_app.extensions['rollcall'].assets)
+metrics = LocalProxy(lambda: current_app.extensions['rollcall'].metrics)
+pick_history = LocalProxy(lambda: current_app.extensions['rollcall'].history)
+student_search = LocalProxy(lambda: current_app.extensions['rollcall'].search)
+response_cache = LocalProxy(lambda: current_app.extensions['rollcall'].responses)
+roster_revisions = LocalProxy(lambda: current_app.extensions['rollcall'].revisions)
+
+bp = Blueprint('rollcall', __name__)
+
+class FastJSONProvider(JSONProvider):
+    """jsonify 和 request.get_json 使用 codec 的序列化（有 orjson 时使用 orjson）"""
+
+    def dumps(self, obj, **kwargs):
+        return codec.dumps_text(obj)
+
+    def loads(self, s, **kwargs):
+        return codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        # 直接用序列化得到的字节构造响应，省去一次解码和编码
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(codec.dumps(obj), mimetype='application/json')
+
+# 每个请求都会产生的 INFO 日志（按 ROLLCALL_LOG_SAMPLE 采样）
+request_log = logging.getLogger(REQUEST_LOGGER)
 
-def open_browser():
+def load_config(overrides=None):
+    """
+    读取应用配置：默认值和环境变量，再用 overrides 覆盖。
+
+    Returns:
+        dict: 配置项（键名与 Flask 的 app.config 一致，使用大写）
+    """
+    config = {
+        'PORT': int(os.environ.get('APP_PORT', 5000)),
+        'STUDENTS_FILE': STUDENTS_FILE,
+        'CLASSES_DIR': CLASSES_DIR,
+        'PICK_STATE_FILE': PICK_STATE_FILE,
+        'PICK_HISTORY_FILE': PICK_HISTORY_FILE,
+        'ROSTER_HISTORY_DIR': ROSTER_HISTORY_DIR,
+        # 名单版本历史的保留天数，0 表示永久保留
+        'ROSTER_HISTORY_DAYS': float(os.environ.get('ROLLCALL_ROSTER_HISTORY_DAYS', 30)),
+        'MAX_STUDENTS': int(os.environ.get('ROLLCALL_MAX_STUDENTS', 100)),  # 新班级的默认人数上限
+        # 存储后端: json（名单文件）或 sqlite（多班级数据库）
+        'STORAGE_BACKEND': os.environ.get('ROLLCALL_STORAGE', 'json').lower(),
+        'DATABASE_FILE': os.environ.get('ROLLCALL_DB', 'rollcall.db'),
+        # json 后端的写入模式: journal（追加日志 + 后台压缩）或 json（每次整体重写文件）
+        'STORAGE_MODE': os.environ.get('ROLLCALL_STORAGE_MODE', 'journal').lower(),
+        # 启动时记录运行环境（目录、音频文件、路由等），默认关闭以加快启动
+        'CHECK_ENVIRONMENT': os.environ.get('ROLLCALL_CHECK_ENV', '') not in ('', '0'),
+        # 启动时压缩 static/ 下的 CSS/JS（排查前端问题时可设为 0 以便查看原始代码）
+        'MINIFY_ASSETS': os.environ.get('ROLLCALL_MINIFY_ASSETS', '1') not in ('', '0'),
+        # 预先处理好的静态资源包（python assets.py 生成，打包时自动生成），设为空字符串则每次启动重新处理
+        'ASSET_BUNDLE': os.environ.get('ROLLCALL_ASSET_BUNDLE', ASSET_BUNDLE_FILE),
+        # 超过该字节数的 JSON/CSV 等响应按 Accept-Encoding 压缩，设为 0 关闭压缩
+        'COMPRESS_MIN_SIZE': int(os.environ.get('ROLLCALL_COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE)),
+        # 同时连接的事件流上限，超出时返回 503；默认按工作线程数（ROLLCALL_THREADS）留出处理普通请求的线程
+        'MAX_EVENT_CLIENTS': int(os.environ.get('ROLLCALL_MAX_EVENT_CLIENTS') or event_stream_limit(
+            int(os.environ.get('ROLLCALL_THREADS') or DEFAULT_SERVER_CONFIG['threads']))),
+    }
+    config.update(overrides or {})
+    return config
+
+def create_app(config=None, profiler=None):
+    """
+    创建并初始化 Flask 应用。
+
+    Args:
+        config (dict): 覆盖默认配置的配置项，见 load_config
+        profiler: 可选的启动计时器（需提供 phase(name) 上下文管理器），用于 --profile-startup
+
+    Returns:
+        Flask: 应用实例，服务对象保存在 app.extensions['rollcall']
+    """
+    phase = profiler.phase if profiler is not None else (lambda name: nullcontext())
+    setup_logging()
+
+    with phase('创建 Flask 应用'):
+        app = Flask(__name__, static_folder='static', template_folder='templates')
+        app.config.update(load_config(config))
+        app.json = FastJSONProvider(app)
+        app.register_blueprint(bp)
+        # 按路由预先分配请求计数器和耗时直方图
+        metrics_registry = MetricsRegistry()
+        metrics_registry.prepare_routes(rule.rule for rule in app.url_map.iter_rules())
+        metrics_registry.prepare_io((IO_LOAD, IO_SAVE))
+
+    with phase('初始化名单存储'):
+        storage = create_storage(
+            app.config['STORAGE_BACKEND'],
+            students_file=app.config['STUDENTS_FILE'],
+            classes_dir=app.config['CLASSES_DIR'],
+            db_path=app.config['DATABASE_FILE'],
+            journaled=(app.config['STORAGE_MODE'] == 'journal'),
+            default_max_students=app.config['MAX_STUDENTS'],
+        )
+        storage.add_io_observer(metrics_registry.observe_io)
+        # 初始化学生数据文件
+        if storage.backend_name == 'json' and not os.path.exists(app.config['STUDENTS_FILE']):
+            storage.replace_students(DEFAULT_CLASS_ID, [])
+            logging.info(f"初始化学生数据文件: {app.config['STUDENTS_FILE']}")
+
+    with phase('加载名单和点名状态'):
+        # 点名引擎订阅名单变更，增量维护候选权重；实时事件广播名单变更和点名结果
+        pick_engine = PickEngine(storage, app.config['PICK_STATE_FILE'])
+        event_broker = EventBroker(max_clients=app.config['MAX_EVENT_CLIENTS'])
+        storage.add_listener(_roster_change_publisher(event_broker))
+        # 点名历史只在启动时读取名字表，统计在首次查询时才建立
+        history = PickHistory(app.config['PICK_HISTORY_FILE'])
+        storage.add_listener(history.on_roster_change)
+        # 名单版本历史：记录每次变更，默认班级从启动时的名单开始记录，其他班级从第一次变更开始
+        revisions = RosterRevisions(storage, app.config['ROSTER_HISTORY_DIR'],
+                                    retention_days=app.config['ROSTER_HISTORY_DAYS'])
+        storage.add_listener(revisions.on_roster_change)
+        try:
+            revisions.track(DEFAULT_CLASS_ID)
+        except (OSError, StorageError) as e:
+            logging.error(f"初始化名单版本历史失败: {str(e)}")
+        # 姓名搜索索引在首次搜索某个班级时建立，之后跟随名单变更增量更新
+        search = StudentSearch(storage)
+        if not pinyin_available():
+            logging.warning("未安装 pypinyin，姓名搜索只支持汉字，不支持拼音（pip install pypinyin）")
+        # 启动时回放 快照 + 日志，预先加载名单到缓存
+        logging.info(f"已加载学生名单: {storage.count(DEFAULT_CLASS_ID)}个")
+
+    with phase('构建静态资源'):
+        # 静态资源压缩、加指纹并预先 gzip/br（内容未变的直接使用资源包）；首页只在这里渲染一次
+        asset_pipeline = AssetPipeline(app.static_folder, minify=app.config['MINIFY_ASSETS'])
+        asset_pipeline.build(bundle=app.config['ASSET_BUNDLE'])
+        app.add_template_global(asset_pipeline.url, 'asset_url')
+        with app.app_context():
+            asset_pipeline.add_page('index.html', render_template('index.html'))
+
+    app.extensions['rollcall'] = Services(storage, pick_engine, event_broker, asset_pipeline,
+                                          metrics_registry, history, search, ResponseCache(), revisions)
+
+    atexit.register(storage.close)
+    atexit.register(pick_engine.close)
+    atexit.register(event_broker.close)
+    atexit.register(history.close)
+
+    if app.config['CHECK_ENVIRONMENT']:
+        with phase('环境检查'):
+            check_environment(app)
+    return app
+
+def _roster_change_publisher(broker):
+    """返回名单变更回调：把存储层的名单变更转发为 roster 事件"""
+    def publish_roster_change(change):
+        data = {'op': change.op, 'version': change.version}
+        if change.name is not None:
+            data['name'] = change.name
+        if change.new_name is not None:
+            data['new'] = change.new_name
+        broker.publish(change.class_id, EVENT_ROSTER, data)
+    return publish_roster_change
+
+def open_browser(port):
     """
     尝试打开浏览器访问应用。
     用于应用启动时自动打开应用页面。
     """
+    import webbrowser  # 只在需要时导入，减少启动时间
     url = f"http://127.0.0.1:{port}/"
     webbrowser.open_new(url)
     logging.info(f"尝试打开浏览器: {url}")
 
-def load_students():
+def load_students(class_id=DEFAULT_CLASS_ID):
     """
-    从 JSON 文件加载学生列表。
+    加载班级学生列表。
     
+    Args:
+        class_id (str): 班级 ID，默认为兼容旧接口的默认班级
+
     Returns:
         list: 学生名字列表，如果加载失败则返回空列表
     """
-    try:
-        if os.path.exists(STUDENTS_FILE):
-            with open(STUDENTS_FILE, 'r', encoding='utf-8') as f:
-                students = json.load(f)
-                return students if isinstance(students, list) else []
-    except (json.JSONDecodeError, IOError) as e:
-        logging.error(f"加载学生名单失败: {str(e)}")
-    return []
+    return storage.list_students(class_id)
 
-def save_students(students):
+def save_students(students, class_id=DEFAULT_CLASS_ID):
     """
-    将学生列表保存到 JSON 文件。
+    用完整名单覆盖班级名单。日常的增删请直接使用 storage 的单条操作。
     
     Args:
         students (list): 要保存的学生名字列表
+        class_id (str): 班级 ID
         
     Returns:
         bool: 保存成功返回 True，否则返回 False
     """
     try:
-        with open(STUDENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(students, f, ensure_ascii=False, indent=2)
+        storage.replace_students(class_id, students)
         return True
-    except IOError as e:
+    except StorageError as e:
         logging.error(f"保存学生名单失败: {str(e)}")
         return False
 
+def _roster_etag(version, encoding=None):
+    """名单响应的 ETag；压缩的响应与 /assets 一样加上编码后缀，各编码版本的 ETag 互不相同"""
+    return f"v{version}-{encoding}" if encoding else f"v{version}"
+
+def _parse_roster_etag(tag):
+    """ETag 中的名单版本号（忽略编码后缀），不是名单的 ETag 时返回 None"""
+    tag, _, encoding = tag.partition('-')
+    if encoding and encoding not in (ENCODING_GZIP, ENCODING_DEFLATE):
+        return None
+    if tag.startswith('v') and tag[1:].isdigit():
+        return int(tag[1:])
+    return None
+
+def _with_roster_version(response, version):
+    """给名单响应加上版本号相关的头（ETag 和 X-Roster-Version），要求客户端每次都重新验证"""
+    response.set_etag(_roster_etag(version))
+    response.headers['X-Roster-Version'] = str(version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _expected_version():
+    """
+    If-Match 头中的名单版本号（乐观并发控制），没有该头或为 * 时返回 None。
+    写操作只在名单仍是这个版本时执行，否则返回 409。
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    for tag in request.if_match.as_set():
+        version = _parse_roster_etag(tag)
+        if version is not None:
+            return version
+    raise InvalidRequestError('If-Match 应为名单的 ETag，例如 "v123"')
+
+def _encoded_response(body):
+    """用预先序列化的响应体构造 JSON 响应，客户端接受压缩时直接使用缓存的压缩版本"""
+    response = Response(body.data, mimetype='application/json')
+    min_size = current_app.config['COMPRESS_MIN_SIZE']
+    if min_size and len(body.data) >= min_size:
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is not None:
+            response.set_data(body.encoded(encoding))
+            response.headers['Content-Encoding'] = encoding
+    return response
+
+def _full_roster_response(class_id, version=None):
+    """
+    返回全量名单。序列化结果按名单版本缓存，名单没有变化时不再重新序列化。
+
+    Args:
+        version (int): 已经查询到的当前版本号，None 表示在这里查询
+    """
+    if version is None:
+        version = storage.version(class_id)
+    body = response_cache.get(class_id, version)
+    if body is None:
+        version, students = storage.snapshot(class_id)
+        body = response_cache.put(class_id, version, students)
+    return _with_roster_version(_encoded_response(body), version)
+
+def _roster_response(class_id):
+    """写操作成功后返回最新名单，ETag 与名单内容对应，可以直接用于下一次 If-Match"""
+    return _full_roster_response(class_id)
+
+def _not_modified_tag(version):
+    """If-None-Match 中与当前名单版本对应的 ETag（任一编码版本），没有时返回 None"""
+    if request.if_none_match.star_tag:
+        return _roster_etag(version)
+    for tag in request.if_none_match.as_set(include_weak=True):
+        if _parse_roster_etag(tag) == version:
+            return tag
+    return None
+
+def _conflict_response(e):
+    """名单已被修改：409，并附上当前版本号"""
+    response = jsonify({'error': str(e), 'version': e.version})
+    response.status_code = e.status_code
+    return _with_roster_version(response, e.version)
+
+# 响应压缩：超过阈值的 JSON、CSV 等文本响应按 Accept-Encoding 压缩，已经压缩的响应不再处理
+
+@bp.after_app_request
+def _compress_response(response):
+    min_size = current_app.config['COMPRESS_MIN_SIZE']
+    if min_size:
+        compress_response(response, request.accept_encodings, min_size)
+    # 压缩后的名单响应（包括 _encoded_response 直接返回的缓存版本）换成带编码后缀的 ETag
+    encoding = response.headers.get('Content-Encoding')
+    version = response.headers.get('X-Roster-Version')
+    if encoding and version is not None and response.status_code == 200:
+        response.set_etag(_roster_etag(version, encoding))
+    return response
+
+# 请求指标：只更新预先分配的计数器
+
+@bp.before_app_request
+def _start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    metrics.request_started()
+
+@bp.after_app_request
+def _record_request_metrics(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        rule = request.url_rule
+        metrics.observe_request(rule.rule if rule is not None else UNMATCHED_ROUTE,
+                                response.status_code, time.perf_counter() - started)
+    return response
+
+@bp.teardown_app_request
+def _finish_request_metrics(error):
+    # 流式响应（事件流）在连接关闭时才执行 teardown，期间计入处理中的请求
+    if g.pop('metrics_started', None) is not None:
+        metrics.request_finished()
+
 # Flask 路由定义
 
-@app.route('/')
+def _asset_response(asset, cache_control):
+    """
+    返回预先处理好的资源：按 Accept-Encoding 选择压缩版本，
+    ETag 为内容哈希（不同编码的 ETag 不同），If-None-Match 命中时返回 304。
+    """
+    encoding, body = select_encoding(asset, request.accept_encodings)
+    response = Response(body, mimetype=asset.mimetype)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    if encoding == ENCODING_IDENTITY:
+        response.set_etag(asset.digest)
+        # 音频等未压缩的资源支持 Range 请求
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(body))
+    response.headers['Content-Encoding'] = encoding
+    response.set_etag(f"{asset.digest}-{encoding}")
+    return response.make_conditional(request)
+
+@bp.route('/')
 def index():
-    """渲染主页"""
+    """返回启动时预渲染的主页"""
+    page = assets.page('index.html')
+    if page is None:
+        logging.error("首页未能在启动时渲染")
+        return jsonify({'error': '渲染页面失败'}), 500
+    request_log.info("访问首页")
+    return _asset_response(page, PAGE_CACHE_CONTROL)
+
+@bp.route('/assets/<path:filename>')
+def get_asset(filename):
+    """带内容指纹的静态资源，内容不会变化，允许浏览器长期缓存"""
+    asset = assets.get(filename)
+    if asset is None:
+        return jsonify({'error': '资源不存在'}), 404
+    return _asset_response(asset, IMMUTABLE_CACHE_CONTROL)
+
+@bp.route('/api/students', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/students', methods=['GET'])
+def get_students(class_id):
+    """
+    获取班级所有学生的 API 端点。
+
+    响应带有 ETag（名单版本号，压缩的响应加编码后缀），If-None-Match 命中时返回 304，不再序列化名单；
+    全量名单的序列化结果按版本缓存，同一版本只序列化和压缩一次；
+    提供 since 参数时只返回该版本之后的变更，版本过旧时退回全量名单；
+    提供 offset/limit 时分页返回 {'version', 'total', 'offset', 'students'}。
+    """
     try:
-        logging.info("访问首页")
-        return render_template('index.html')
+        since = _int_arg('since', minimum=0)
+        offset = _int_arg('offset', minimum=0)
+        limit = _int_arg('limit', minimum=1)
+        version = storage.version(class_id)
+        tag = _not_modified_tag(version)
+        if tag is not None:
+            # 304 沿用客户端缓存的那个编码版本的 ETag
+            response = _with_roster_version(Response(status=304), version)
+            response.set_etag(tag)
+            return response
+
+        if offset is not None or limit is not None:
+            offset = offset or 0
+            limit = min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+            version, total, students = storage.page(class_id, offset, limit)
+            request_log.info(f"分页获取学生列表: {offset}+{len(students)}/{total}")
+            return _with_roster_version(
+                jsonify({'version': version, 'total': total, 'offset': offset, 'students': students}), version)
+
+        if since is not None:
+            version, changes = storage.changes_since(class_id, since)
+            if changes is not None:
+                return _with_roster_version(
+                    jsonify({'version': version, 'full': False, 'changes': changes}), version)
+            version, students = storage.snapshot(class_id)
+            request_log.info(f"增量同步版本过旧，返回全量学生列表: {len(students)}个")
+            return _with_roster_version(
+                jsonify({'version': version, 'full': True, 'students': students}), version)
+
+        request_log.info(f"获取学生列表: {storage.count(class_id)}个")
+        return _full_roster_response(class_id, version)
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
-        logging.error(f"渲染首页时出错: {str(e)}")
-        return jsonify({'error': f'渲染页面失败: {str(e)}'}), 500
+        logging.error(f"获取学生列表失败: {str(e)}")
+        return jsonify({'error': '服务器错误'}), 500
 
-@app.route('/api/students', methods=['GET'])
-def get_students():
-    """获取所有学生的 API 端点"""
+@bp.route('/api/students/search', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/students/search', methods=['GET'])
+def search_students(class_id):
+    """
+    按姓名搜索学生：?q= 支持汉字、全拼和拼音首字母前缀（如 林雨、linyu、lyf），
+    可选 limit 参数（默认 20，最多 200）。未安装 pypinyin 时只能按汉字搜索。
+    """
     try:
-        students = load_students()
-        logging.info(f"获取学生列表: {len(students)}个")
-        return jsonify(students)
+        query = request.args.get('q', '')
+        limit = min(_int_arg('limit', minimum=1) or SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT)
+        results = student_search.search(class_id, query, limit)
+        return jsonify({'query': query, 'students': results, 'pinyin': pinyin_available()})
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
-        logging.error(f"获取学生列表失败: {str(e)}")
+        logging.error(f"搜索学生失败: {str(e)}")
+        return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+@bp.route('/api/students/history', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/students/history', methods=['GET'])
+def get_roster_history(class_id):
+    """名单的历史版本（从新到旧）：?limit=条数，?before= 上一页返回的 next 游标"""
+    try:
+        validate_class_id(class_id)
+        limit = min(_int_arg('limit', minimum=1) or 50, 1000)
+        versions, next_cursor = roster_revisions.history(class_id, limit=limit,
+                                                         before=_int_arg('before', minimum=0))
+        return jsonify({'versions': versions, 'next': next_cursor})
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logging.error(f"获取名单历史失败: {str(e)}")
         return jsonify({'error': '服务器错误'}), 500
 
-@app.route('/api/students', methods=['POST'])
-def add_student():
+@bp.route('/api/students/restore', methods=['POST'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/students/restore', methods=['POST'])
+def restore_students(class_id):
+    """
+    把名单恢复为历史版本（?version=），返回恢复后的名单。
+    恢复会产生一个新版本，之前的版本仍在历史中，可以再恢复回去。
+    """
+    try:
+        validate_class_id(class_id)
+        version = _int_arg('version', minimum=0)
+        if version is None:
+            raise InvalidRequestError('缺少 version 参数')
+        roster_revisions.restore(class_id, version, expected_version=_expected_version())
+        logging.info(f"恢复名单到版本: {version}")
+        return _roster_response(class_id)
+    except VersionConflictError as e:
+        return _conflict_response(e)
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logging.error(f"恢复名单失败: {str(e)}")
+        return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+@bp.route('/api/students', methods=['POST'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/students', methods=['POST'])
+def add_student(class_id):
     """添加学生的 API 端点"""
-    students = load_students()
-    
-    if len(students) >= MAX_STUDENTS:
-        return jsonify({'error': f'学生数量已达到上限 ({MAX_STUDENTS})'}), 400
-        
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         if not data or 'name' not in data:
             return jsonify({'error': '无效的请求数据，缺少 name 字段'}), 400
-            
-        new_student = data['name'].strip()
-        if not new_student:
-            return jsonify({'error': '学生姓名不能为空'}), 400
-            
-        if len(new_student) > 50:  # 名字长度限制
-            return jsonify({'error': '学生姓名过长（最多50个字符）'}), 400
-            
-        if new_student in students:
-            return jsonify({'error': '该学生已存在'}), 400
-            
-        students.append(new_student)
-        if save_students(students):
-            logging.info(f"添加学生: {new_student}")
-            return jsonify(students)
-        else:
-            return jsonify({'error': '保存失败'}), 500
-            
+
+        new_student = normalize_name(data['name'])
+        storage.add_student(class_id, new_student, expected_version=_expected_version())
+        logging.info(f"添加学生: {new_student}")
+        return _roster_response(class_id)
+
+    except VersionConflictError as e:
+        return _conflict_response(e)
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         logging.error(f"添加学生失败: {str(e)}")
         return jsonify({'error': f'服务器错误: {str(e)}'}), 500
 
-@app.route('/api/students/<name>', methods=['DELETE'])
-def delete_student(name):
+@bp.route('/api/students/<name>', methods=['DELETE'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/students/<name>', methods=['DELETE'])
+def delete_student(class_id, name):
     """删除学生的 API 端点"""
     try:
-        students = load_students()
-        if name in students:
-            students.remove(name)
-            if save_students(students):
-                logging.info(f"删除学生: {name}")
-                return jsonify(students)
-            else:
-                return jsonify({'error': '保存失败'}), 500
-        return jsonify({'error': '学生不存在'}), 404
+        storage.delete_student(class_id, name, expected_version=_expected_version())
+        logging.info(f"删除学生: {name}")
+        return _roster_response(class_id)
+    except VersionConflictError as e:
+        return _conflict_response(e)
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         logging.error(f"删除学生失败: {str(e)}")
         return jsonify({'error': f'服务器错误: {str(e)}'}), 500
 
-@app.route('/api/random', methods=['GET'])
-def get_random_student():
-    """随机选择学生的 API 端点"""
-    students = load_students()
-    if not students:
-        return jsonify({'error': '没有学生'}), 400
-    chosen = random.choice(students)
-    logging.info(f"随机选择学生: {chosen}")
-    return jsonify({'name': chosen})
-
-@app.route('/ping', methods=['GET'])
+@bp.route('/api/students/<name>', methods=['PATCH'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/students/<name>', methods=['PATCH'])
+def rename_student(class_id, name):
+    """原位修改学生姓名（保持名单顺序），一次存储写入"""
+    try:
+        data = request.get_json(silent=True)
+        if not data or 'name' not in data:
+            return jsonify({'error': '无效的请求数据，缺少 name 字段'}), 400
+        new_name = normalize_name(data['name'])
+        storage.rename_student(class_id, name, new_name, expected_version=_expected_version())
+        logging.info(f"修改学生姓名: {name} -> {new_name}")
+        return _roster_response(class_id)
+    except VersionConflictError as e:
+        return _conflict_response(e)
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logging.error(f"修改学生姓名失败: {str(e)}")
+        return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+@bp.route('/api/students', methods=['PATCH'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/students', methods=['PATCH'])
+def rename_students(class_id):
+    """
+    批量改名: {"renames": [{"from": 旧名字, "to": 新名字}, ...]}
+    按顺序执行并在一次写入中提交，任意一项失败则全部不生效。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        items = data.get('renames')
+        if not isinstance(items, list) or not items:
+            raise InvalidRequestError('无效的请求数据，缺少 renames 字段')
+        renames = []
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('from'), str):
+                raise InvalidRequestError('renames 中的每一项都需要 from 和 to 字段')
+            renames.append((item['from'], normalize_name(item.get('to'))))
+        storage.rename_students(class_id, renames, expected_version=_expected_version())
+        logging.info(f"批量修改学生姓名: {len(renames)}项")
+        return _roster_response(class_id)
+    except VersionConflictError as e:
+        return _conflict_response(e)
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logging.error(f"批量修改学生姓名失败: {str(e)}")
+        return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+@bp.route('/api/students/import', methods=['POST'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/students/import', methods=['POST'])
+def import_students(class_id):
+    """
+    批量导入学生（CSV / NDJSON / JSON 数组）。
+
+    上传内容以流的方式逐行解析，校验规则与单个添加相同，
+    所有有效的名字在一次写入中提交，并返回逐行的错误报告。
+    """
+    try:
+        validate_class_id(class_id)
+        expected_version = _expected_version()
+        upload = request.files.get('file')
+        if upload is not None:
+            fmt = detect_format(request.args.get('format') or os.path.splitext(upload.filename or '')[1][1:],
+                                upload.mimetype)
+            stream = upload.stream
+        else:
+            fmt = detect_format(request.args.get('format'), request.mimetype)
+            stream = request.stream
+
+        names = []
+        row_numbers = []
+        errors = []
+        for row_no, value in iter_import_rows(stream, fmt):
+            if isinstance(value, StorageError):
+                errors.append({'row': row_no, 'name': None, 'error': str(value)})
+                continue
+            try:
+                names.append(normalize_name(value))
+                row_numbers.append(row_no)
+            except StorageError as e:
+                errors.append({'row': row_no, 'name': value if isinstance(value, str) else None,
+                               'error': str(e)})
+
+        added, rejected = storage.add_students(class_id, names, expected_version=expected_version)
+        for index, name, error in rejected:
+            errors.append({'row': row_numbers[index], 'name': name, 'error': str(error)})
+        errors.sort(key=lambda e: e['row'])
+
+        logging.info(f"批量导入学生: 成功 {len(added)} 个，失败 {len(errors)} 个")
+        return jsonify({
+            'added': len(added),
+            'rejected': len(errors),
+            'errors': errors[:MAX_IMPORT_ERRORS],
+            'total': storage.count(class_id),
+        })
+    except VersionConflictError as e:
+        return _conflict_response(e)
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logging.error(f"批量导入学生失败: {str(e)}")
+        return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+def _export_response(class_ids, fmt, include_class, filename):
+    """构造流式导出响应"""
+    return Response(
+        stream_with_context(export_rows(storage, class_ids, fmt, include_class)),
+        mimetype=MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+@bp.route('/api/students/export', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/students/export', methods=['GET'])
+def export_students(class_id):
+    """流式导出班级名单，?format=csv（默认）/ ndjson / json"""
+    try:
+        validate_class_id(class_id)
+        fmt = detect_format(request.args.get('format', FORMAT_CSV), None)
+        request_log.info(f"导出班级名单: {class_id} ({fmt})")
+        return _export_response([class_id], fmt, False, class_id)
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/export', methods=['GET'])
+def export_all_students():
+    """流式导出所有班级的名单，每行包含班级 ID，?format=ndjson（默认）/ csv / json"""
+    try:
+        fmt = detect_format(request.args.get('format', FORMAT_NDJSON), None)
+        request_log.info(f"导出全部班级名单 ({fmt})")
+        return _export_response(storage.list_classes(), fmt, True, 'rollcall')
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+def _int_arg(name, minimum=None):
+    """读取可选的整数查询参数，格式错误时抛出 InvalidRequestError"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        raise InvalidRequestError(f'参数 {name} 必须是整数')
+    if minimum is not None and value < minimum:
+        raise InvalidRequestError(f'参数 {name} 不能小于 {minimum}')
+    return value
+
+@bp.route('/api/random', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/random', methods=['GET'])
+def get_random_student(class_id):
+    """
+    随机选择学生的 API 端点（按班级配置的点名策略）。
+    提供 count 参数时一次点名多名学生（不重复），可选 seed 参数复现结果。
+    """
+    try:
+        count = _int_arg('count', minimum=1)
+        seed = _int_arg('seed')
+        chosen = pick_engine.pick_many(class_id, count or 1, seed=seed)
+        metrics.count_picks(class_id, len(chosen))
+        request_log.info(f"随机选择学生: {', '.join(chosen)}")
+        try:
+            pick_history.record(class_id, chosen)
+        except OSError as e:
+            logging.error(f"记录点名历史失败: {str(e)}")
+        event_broker.publish(class_id, EVENT_PICK, {
+            'names': chosen,
+            'origin': request.headers.get('X-Client-Id'),
+        })
+        if count is None:
+            return jsonify({'name': chosen[0]})
+        return jsonify({'names': chosen, 'seed': seed})
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/history', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/history', methods=['GET'])
+def get_pick_history(class_id):
+    """最近的点名记录（从新到旧）：?limit=条数，?before= 上一页返回的 next 游标"""
+    try:
+        validate_class_id(class_id)
+        limit = min(_int_arg('limit', minimum=1) or 50, 1000)
+        picks, next_cursor = pick_history.recent(class_id, limit=limit, before=_int_arg('before', minimum=0))
+        return jsonify({'picks': picks, 'next': next_cursor})
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/history/students', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/history/students', methods=['GET'])
+def get_pick_history_students(class_id):
+    """每个学生被点到的次数和最近一次被点的时间，可选 ?from=&to=（YYYY-MM-DD）限定日期范围"""
+    try:
+        validate_class_id(class_id)
+        students = pick_history.student_stats(
+            class_id,
+            start=parse_date(request.args.get('from'), 'from'),
+            end=parse_date(request.args.get('to'), 'to'),
+        )
+        return jsonify({'students': students})
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/history/buckets', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/history/buckets', methods=['GET'])
+def get_pick_history_buckets(class_id):
+    """按天或按周汇总的点名次数：?interval=day|week，可选 from、to 和 name（只统计某个学生）"""
+    try:
+        validate_class_id(class_id)
+        interval = request.args.get('interval', 'day')
+        buckets = pick_history.buckets(
+            class_id,
+            interval=interval,
+            start=parse_date(request.args.get('from'), 'from'),
+            end=parse_date(request.args.get('to'), 'to'),
+            name=request.args.get('name'),
+        )
+        return jsonify({'interval': interval, 'buckets': buckets})
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/events', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/events', methods=['GET'])
+def stream_events(class_id):
+    """
+    Server-Sent Events 推送通道：连接后先收到带客户端 ID 的 hello 事件，
+    之后收到班级的 roster（名单变更）、pick（点名结果）和 resync（需要重新同步）事件。
+    """
+    try:
+        validate_class_id(class_id)
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    try:
+        subscription = event_broker.subscribe(class_id)
+    except SubscriberLimitError as e:
+        logging.warning(f"事件订阅被拒绝: {str(e)}")
+        response = jsonify({'error': str(e)})
+        response.status_code = e.status_code
+        response.headers['Retry-After'] = str(EVENT_RETRY_AFTER)
+        return response
+    request_log.info(f"事件订阅: 班级 {class_id}，客户端 {subscription.client_id}")
+    response = Response(stream_with_context(event_broker.stream(subscription)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/api/groups', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/groups', methods=['GET'])
+def get_groups(class_id):
+    """随机分组: ?n=组数 或 ?size=每组人数，可选 seed 复现分组"""
+    try:
+        groups, seed = pick_engine.make_groups(
+            class_id,
+            groups=_int_arg('n', minimum=1),
+            size=_int_arg('size', minimum=1),
+            seed=_int_arg('seed'),
+        )
+        request_log.info(f"随机分组: {len(groups)}组")
+        return jsonify({'groups': groups, 'seed': seed})
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/picker', methods=['GET'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/picker', methods=['GET'])
+def get_picker_status(class_id):
+    """获取点名策略、各学生被点次数和缺席名单"""
+    try:
+        return jsonify(pick_engine.get_status(class_id))
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/picker', methods=['PUT'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/picker', methods=['PUT'])
+def update_picker(class_id):
+    """切换点名策略: random / shuffle_bag / weighted"""
+    try:
+        data = request.get_json(silent=True) or {}
+        pick_engine.set_strategy(class_id, data.get('strategy'))
+        logging.info(f"班级 {class_id} 点名策略设置为: {data.get('strategy')}")
+        return jsonify(pick_engine.get_status(class_id))
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/picker/reset', methods=['POST'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/picker/reset', methods=['POST'])
+def reset_picker(class_id):
+    """清空点名次数和洗牌袋，重新开始"""
+    try:
+        pick_engine.reset(class_id)
+        logging.info(f"班级 {class_id} 点名状态已重置")
+        return jsonify(pick_engine.get_status(class_id))
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/absent', methods=['PUT'], defaults={'class_id': DEFAULT_CLASS_ID})
+@bp.route('/api/classes/<class_id>/absent', methods=['PUT'])
+def update_absent(class_id):
+    """设置今日缺席名单（点名时跳过，次日自动失效）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        names = data.get('names')
+        if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+            raise InvalidRequestError('names 必须是学生名字列表')
+        absent = pick_engine.set_absent(class_id, names)
+        logging.info(f"班级 {class_id} 今日缺席: {len(absent)}人")
+        return jsonify({'absent': absent})
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/classes', methods=['GET'])
+def get_classes():
+    """列出所有班级及人数"""
+    try:
+        classes = [
+            {'id': class_id, 'count': storage.count(class_id),
+             'max_students': storage.get_max_students(class_id)}
+            for class_id in storage.list_classes()
+        ]
+        return jsonify(classes)
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/classes/<class_id>/config', methods=['GET'])
+def get_class_config(class_id):
+    """获取班级配置（人数上限）"""
+    try:
+        validate_class_id(class_id)
+        return jsonify({'id': class_id, 'max_students': storage.get_max_students(class_id)})
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/api/classes/<class_id>/config', methods=['PUT'])
+def update_class_config(class_id):
+    """修改班级配置（人数上限）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        max_students = data.get('max_students')
+        if not isinstance(max_students, int) or isinstance(max_students, bool) or max_students < 1:
+            raise InvalidRequestError('max_students 必须是正整数')
+        storage.set_max_students(class_id, max_students)
+        logging.info(f"班级 {class_id} 人数上限设置为: {max_students}")
+        return jsonify({'id': class_id, 'max_students': max_students})
+    except StorageError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式的运行指标"""
+    roster_sizes = {}
+    for class_id in storage.list_classes():
+        try:
+            roster_sizes[class_id] = storage.count(class_id)
+        except StorageError as e:
+            logging.warning(f"统计班级 {class_id} 人数失败: {str(e)}")
+    events = event_broker.stats()
+    text = metrics.render(roster_sizes, [
+        ('rollcall_event_clients', '已连接的事件流客户端数', events['clients']),
+        ('rollcall_event_dropped', '事件流中被合并或丢弃的事件数', events['dropped']),
+        ('rollcall_event_rejected', '因连接数达到上限被拒绝的事件订阅数', events['rejected']),
+    ])
+    return Response(text, content_type=METRICS_CONTENT_TYPE)
+
+@bp.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """名单缓存和全量名单响应缓存的命中统计，用于确认缓存是否生效"""
+    return jsonify(dict(storage.stats(), responses=response_cache.stats()))
+
+@bp.route('/ping', methods=['GET'])
 def ping():
     """
     实例检测的 ping 端点
@@ -172,28 +921,30 @@ def ping():
     # logging.debug("收到实例检测 ping 请求")  # 避免过多日志
     return jsonify({'app': APP_IDENTIFIER, 'status': 'ok'}) 
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     """处理 404 错误"""
     logging.warning(f"404错误: {request.path}")
     return jsonify({'error': '资源不存在'}), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     """处理 500 错误"""
     logging.error(f"500错误: {str(error)}")
     return jsonify({'error': '服务器内部错误'}), 500
 
-def check_environment():
+def check_environment(app):
     """
     检查运行环境并记录关键信息到日志
-    用于应用启动时的环境检查
+    仅在配置 CHECK_ENVIRONMENT（环境变量 ROLLCALL_CHECK_ENV=1）时于启动时执行
     """
+    storage = app.extensions['rollcall'].storage
     logging.info("="*30 + " Flask 应用启动检查 " + "="*30)
     logging.info(f"当前工作目录: {os.getcwd()}")
     logging.info(f"静态文件目录: {app.static_folder} (存在: {os.path.exists(app.static_folder)})")
     logging.info(f"模板文件目录: {app.template_folder} (存在: {os.path.exists(app.template_folder)})")
-    logging.info(f"学生名单文件: {STUDENTS_FILE} (存在: {os.path.exists(STUDENTS_FILE)})")
+    logging.info(f"学生名单文件: {app.config['STUDENTS_FILE']} (存在: {os.path.exists(app.config['STUDENTS_FILE'])})")
+    logging.info(f"名单存储后端: {storage.backend_name} (json 写入模式: {app.config['STORAGE_MODE']})")
     
     # 检查音频文件
     audio_files = ['roll.mp3', 'select.mp3', 'click.mp3']
@@ -227,29 +978,28 @@ def check_environment():
         logging.error(f"获取路由信息时出错: {e}")
     logging.info(f"注册的应用路由: {routes}")
 
-# 应用入口点
-if __name__ == '__main__':
-    # 执行环境检查
-    check_environment()
-    
+def main(config=None):
+    """直接运行 main.py 时的入口：创建应用并按 ROLLCALL_SERVER 等环境变量启动服务器"""
+    from server import load_server_config, serve
+
+    app = create_app(config)
+
     # 确保数据目录存在
     if not os.path.exists('static'):
         os.makedirs('static')
         logging.info("创建静态文件目录")
-        
-    # 初始化学生数据文件
-    students_json_path = os.path.join(os.getcwd(), STUDENTS_FILE)
-    if not os.path.exists(students_json_path):
-        save_students([])
-        logging.info(f"初始化学生数据文件: {students_json_path}")
-    
+
+    port = app.config['PORT']
     logging.info(f"Flask应用即将在端口 {port} 上启动 (直接运行)")
-    
+
     # 应用程序启动
     try:
-        # Flask运行
-        # 移除 threaded=True，让 werkzeug 处理
-        app.run(debug=False, host='127.0.0.1', port=port, use_reloader=False)
+        serve(app, port, load_server_config(),
+              on_shutdown=[app.extensions['rollcall'].event_broker.close])
     except Exception as e:
         logging.error(f"Flask应用启动失败: {str(e)}")
         raise
+
+# 应用入口点
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+班级点名器 - 运行指标（Prometheus 文本格式）
+
+请求钩子只更新预先分配好的计数器和直方图桶（一次二分查找加几次整数加法），
+短暂持有一把锁，不在锁内做任何 I/O。名单人数等开销较大的数值在抓取 /metrics 时才计算。
+"""
+
+import threading
+from bisect import bisect_left
+
+# 请求耗时直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# 名单读写耗时直方图的桶上界（秒）
+IO_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+UNMATCHED_ROUTE = '<unmatched>'     # 没有匹配到路由的请求（404）
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """固定桶的累积直方图，调用方负责加锁"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # 最后一个桶是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{_labels(labels, le=le)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {self.sum!r}')
+        lines.append(f'{name}_count{_labels(labels)} {self.count}')
+        return lines
+
+
+class _RouteMetrics:
+    __slots__ = ('latency', 'statuses')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.statuses = {}      # 状态码 -> 次数
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+class MetricsRegistry:
+    """
+    进程内的指标仓库（线程安全）。
+
+    路由在应用创建后通过 prepare_routes 预先登记；运行中才出现的路由（理论上没有）
+    和未匹配的请求会在第一次出现时登记。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {UNMATCHED_ROUTE: _RouteMetrics()}
+        self._in_flight = 0
+        self._io = {}           # 操作 -> (Histogram, [字节数])
+        self._picks = {}        # 班级 ID -> 被点到的学生人次
+
+    def prepare_routes(self, rules):
+        with self._lock:
+            for rule in rules:
+                self._routes.setdefault(rule, _RouteMetrics())
+
+    def prepare_io(self, operations):
+        with self._lock:
+            for op in operations:
+                self._io.setdefault(op, (Histogram(IO_BUCKETS), [0]))
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def observe_request(self, route, status, seconds):
+        with self._lock:
+            metrics = self._routes.get(route)
+            if metrics is None:
+                metrics = self._routes[route] = _RouteMetrics()
+            metrics.latency.observe(seconds)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def observe_io(self, op, seconds, nbytes):
+        """存储层读写计时回调（见 RosterStorage.add_io_observer）"""
+        with self._lock:
+            entry = self._io.get(op)
+            if entry is None:
+                entry = self._io[op] = (Histogram(IO_BUCKETS), [0])
+            entry[0].observe(seconds)
+            if nbytes:
+                entry[1][0] += nbytes
+
+    def count_picks(self, class_id, count):
+        with self._lock:
+            self._picks[class_id] = self._picks.get(class_id, 0) + count
+
+    def render(self, roster_sizes=None, extra_gauges=()):
+        """
+        生成 Prometheus 文本格式。
+
+        Args:
+            roster_sizes (dict): 班级 ID -> 名单人数（抓取时由调用方计算）
+            extra_gauges: (指标名, 说明, 数值) 列表
+        """
+        # 在锁内只复制数值，格式化放到锁外
+        with self._lock:
+            in_flight = self._in_flight
+            routes = {
+                route: (list(m.latency.counts), m.latency.sum, m.latency.count, dict(m.statuses))
+                for route, m in self._routes.items()
+            }
+            io = {op: (list(h.counts), h.sum, h.count, nbytes[0]) for op, (h, nbytes) in self._io.items()}
+            picks = dict(self._picks)
+
+        lines = [
+            '# HELP rollcall_requests_in_flight 正在处理的请求数',
+            '# TYPE rollcall_requests_in_flight gauge',
+            f'rollcall_requests_in_flight {in_flight}',
+            '# HELP rollcall_requests_total 按路由和状态码统计的请求数',
+            '# TYPE rollcall_requests_total counter',
+        ]
+        for route, (_counts, _sum, _count, statuses) in sorted(routes.items()):
+            for status, count in sorted(statuses.items()):
+                lines.append(f'rollcall_requests_total{_labels({"route": route}, status=status)} {count}')
+
+        lines += [
+            '# HELP rollcall_request_duration_seconds 按路由统计的请求耗时',
+            '# TYPE rollcall_request_duration_seconds histogram',
+        ]
+        for route, (counts, total, count, _statuses) in sorted(routes.items()):
+            if count:
+                lines += _snapshot_histogram(LATENCY_BUCKETS, counts, total, count).render(
+                    'rollcall_request_duration_seconds', {'route': route})
+
+        lines += [
+            '# HELP rollcall_storage_duration_seconds 名单读取（load）和写入（save）的耗时',
+            '# TYPE rollcall_storage_duration_seconds histogram',
+        ]
+        for op, (counts, total, count, _nbytes) in sorted(io.items()):
+            lines += _snapshot_histogram(IO_BUCKETS, counts, total, count).render(
+                'rollcall_storage_duration_seconds', {'op': op})
+        lines += [
+            '# HELP rollcall_storage_bytes_total 名单读取和写入的字节数',
+            '# TYPE rollcall_storage_bytes_total counter',
+        ]
+        for op, (_counts, _sum, _count, nbytes) in sorted(io.items()):
+            lines.append(f'rollcall_storage_bytes_total{_labels({"op": op})} {nbytes}')
+
+        lines += [
+            '# HELP rollcall_picks_total 被点到的学生人次',
+            '# TYPE rollcall_picks_total counter',
+        ]
+        for class_id, count in sorted(picks.items()):
+            lines.append(f'rollcall_picks_total{_labels({"class_id": class_id})} {count}')
+
+        if roster_sizes is not None:
+            lines += [
+                '# HELP rollcall_roster_size 班级名单人数',
+                '# TYPE rollcall_roster_size gauge',
+            ]
+            for class_id, size in sorted(roster_sizes.items()):
+                lines.append(f'rollcall_roster_size{_labels({"class_id": class_id})} {size}')
+
+        for name, help_text, value in extra_gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def _snapshot_histogram(buckets, counts, total, count):
+    histogram = Histogram(buckets)
+    histogram.counts, histogram.sum, histogram.count = counts, total, count
+    return histogram
@@ -1,17 +1,33 @@
 # -*- mode: python ; coding: utf-8 -*-
 
 import os
+import sys
 
 block_cipher = None
 
+# 启动优化模式（set ROLLCALL_FAST_STARTUP=1 或 build.bat fast）：
+# - 打包前生成静态资源包（assets.bundle），启动时直接使用其中压缩好的资源，不带 static/ 下的原始文件
+# - 模块预先编译为 .pyc 文件直接放在程序目录中（noarchive），导入时不必再从 PYZ 压缩包中解压；
+#   字节码按 -O 优化级别编译
+# - 不使用 UPX（每次启动都要解压被 UPX 压缩的动态库）
+FAST_STARTUP = os.environ.get('ROLLCALL_FAST_STARTUP', '') not in ('', '0')
+
 added_files = [
     ('templates', 'templates'),
-    ('static', 'static'),
     ('students.json', '.'),
-    ('main.py', '.'),
     ('使用说明.md', '.'),
 ]
 
+if FAST_STARTUP:
+    sys.path.insert(0, SPECPATH)
+    from assets import BUNDLE_FILE, build_bundle
+    os.makedirs(workpath, exist_ok=True)
+    bundle_path = os.path.join(workpath, BUNDLE_FILE)
+    build_bundle('static', bundle_path)
+    added_files.append((bundle_path, '.'))
+else:
+    added_files.append(('static', 'static'))
+
 # 如果app_log.txt存在，则添加它
 if os.path.exists('app_log.txt'):
     added_files.append(('app_log.txt', '.'))
@@ -46,7 +62,27 @@ a = Analysis(
         'encodings.gbk',
         'encodings.ascii',
         'time',
-        'shutil'
+        'shutil',
+        # 本地模块（run_app.py 在函数内导入 main，这里显式声明以确保被打包）
+        'main',
+        'journal',
+        'storage',
+        'sqlite3',
+        'picker',
+        'history',
+        'search',
+        'bulk',
+        'csv',
+        'events',
+        'server',
+        'logconfig',
+        'assets',
+        'metrics',
+        'codec',
+        'revisions',
+        # 可选依赖（在函数内或 try 中导入，这里显式声明以确保被打包）
+        'pypinyin',
+        'waitress',
     ],
     hookspath=[],
     hooksconfig={},
@@ -55,7 +91,8 @@ a = Analysis(
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
-    noarchive=False,
+    noarchive=FAST_STARTUP,
+    optimize=1 if FAST_STARTUP else -1,
 )
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 
@@ -68,7 +105,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=not FAST_STARTUP,
     console=True,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -82,7 +119,7 @@ coll = COLLECT(
     a.zipfiles,
     a.datas,
     strip=False,
-    upx=True,
+    upx=not FAST_STARTUP,
     upx_exclude=[],
     name='ClassRollCall',
 ) 
\ No newline at end of file
@@ -0,0 +1,542 @@
+"""
+班级点名器 - 点名选择引擎
+
+支持按班级配置的点名策略：
+
+- random: 等概率随机（原有行为）
+- shuffle_bag: 洗牌袋，每一轮中每位学生恰好被点到一次，轮与轮交界处不会连续点到同一人
+- weighted: 按历史被点次数的倒数加权，被点得少的学生更容易被点到
+
+另外可以把学生标记为"今日缺席"，缺席名单在日期变化后自动失效。
+
+每个班级的候选权重保存在一棵整数树状数组（Fenwick tree）中，
+单次点名和名单增删都是 O(log n) 的增量更新，不需要重建。
+点名状态（次数、洗牌袋、缺席名单）保存在 JSON 文件中，重启后继续生效。
+"""
+
+import datetime
+import json
+import logging
+import os
+import random
+import threading
+
+from journal import write_json_atomic
+from storage import (
+    CHANGE_ADD, CHANGE_DELETE, CHANGE_RENAME, StorageError, InvalidRequestError, StudentNotFoundError,
+)
+
+STRATEGY_RANDOM = 'random'
+STRATEGY_SHUFFLE_BAG = 'shuffle_bag'
+STRATEGY_WEIGHTED = 'weighted'
+STRATEGIES = (STRATEGY_RANDOM, STRATEGY_SHUFFLE_BAG, STRATEGY_WEIGHTED)
+
+# weighted 策略使用整数权重 WEIGHT_SCALE // (次数 + 1)，避免浮点累加误差
+WEIGHT_SCALE = 720720
+
+
+class NoEligibleStudentError(StorageError):
+    status_code = 400
+
+    def __init__(self, message='没有学生'):
+        super().__init__(message)
+
+
+class FenwickTree:
+    """
+    支持单点赋值、前缀和与按累计权重查找的整数树状数组。
+    所有操作均为 O(log n)，append 用于名单增长时扩容。
+    """
+
+    def __init__(self, weights=()):
+        self._weights = list(weights)
+        n = len(self._weights)
+        self._tree = [0] + self._weights
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self):
+        return len(self._weights)
+
+    def _prefix(self, i):
+        """前 i 个元素的权重和"""
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    @property
+    def total(self):
+        return self._prefix(len(self._weights))
+
+    def weight(self, index):
+        return self._weights[index]
+
+    def set(self, index, weight):
+        delta = weight - self._weights[index]
+        if not delta:
+            return
+        self._weights[index] = weight
+        i = index + 1
+        n = len(self._weights)
+        while i <= n:
+            self._tree[i] += delta
+            i += i & -i
+
+    def append(self, weight):
+        """在末尾追加一个元素，返回其下标"""
+        self._weights.append(weight)
+        i = len(self._weights)
+        # 节点 i 覆盖区间 (i - lowbit(i), i]
+        self._tree.append(weight + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+        return i - 1
+
+    def find(self, target):
+        """
+        返回累计权重首次超过 target 的元素下标（0 <= target < total）。
+        """
+        pos = 0
+        step = 1 << (len(self._weights).bit_length())
+        while step:
+            nxt = pos + step
+            if nxt <= len(self._weights) and self._tree[nxt] <= target:
+                pos = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return pos
+
+
+class _ClassPickState:
+    """单个班级的点名状态"""
+
+    def __init__(self, strategy=STRATEGY_RANDOM):
+        self.strategy = strategy
+        self.counts = {}            # 学生 -> 累计被点次数
+        self.bag = set()            # 洗牌袋中本轮尚未被点到的学生
+        self.excluded = set()       # 今日缺席的学生
+        self.excluded_date = None
+        self.last = None            # 上一次点到的学生
+        # 以下为运行时索引，根据名单重建
+        self.names = []             # 槽位 -> 学生（None 表示空槽）
+        self.slots = {}             # 学生 -> 槽位
+        self.free_slots = []
+        self.tree = FenwickTree()
+        self.synced = False
+        self.version = None         # 索引对应的名单版本号
+
+    def weight(self, name):
+        if name in self.excluded:
+            return 0
+        if self.strategy == STRATEGY_WEIGHTED:
+            return max(1, WEIGHT_SCALE // (self.counts.get(name, 0) + 1))
+        if self.strategy == STRATEGY_SHUFFLE_BAG:
+            return 1 if name in self.bag else 0
+        return 1
+
+    def refresh(self, name):
+        slot = self.slots.get(name)
+        if slot is not None:
+            self.tree.set(slot, self.weight(name))
+
+    def rebuild(self, students, version=None):
+        """按完整名单重建槽位与权重，O(n)"""
+        self.version = version
+        self.names = list(students)
+        self.slots = {name: slot for slot, name in enumerate(self.names)}
+        self.free_slots = []
+        roster = set(self.slots)
+        self.counts = {name: n for name, n in self.counts.items() if name in roster}
+        self.bag &= roster
+        self.excluded &= roster
+        if self.last not in roster:
+            self.last = None
+        self.tree = FenwickTree(self.weight(name) for name in self.names)
+        self.synced = True
+
+    def add(self, name):
+        if name in self.slots:
+            return
+        if self.strategy == STRATEGY_SHUFFLE_BAG:
+            # 新同学加入当前这一轮
+            self.bag.add(name)
+        weight = self.weight(name)
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.names[slot] = name
+            self.tree.set(slot, weight)
+        else:
+            self.names.append(name)
+            slot = self.tree.append(weight)
+        self.slots[name] = slot
+
+    def remove(self, name):
+        slot = self.slots.pop(name, None)
+        if slot is None:
+            return
+        self.tree.set(slot, 0)
+        self.names[slot] = None
+        self.free_slots.append(slot)
+        self.counts.pop(name, None)
+        self.bag.discard(name)
+        self.excluded.discard(name)
+        if self.last == name:
+            self.last = None
+
+    def rename(self, old_name, new_name):
+        """改名时沿用原槽位、次数和状态"""
+        slot = self.slots.pop(old_name, None)
+        if slot is None:
+            return
+        self.slots[new_name] = slot
+        self.names[slot] = new_name
+        if old_name in self.counts:
+            self.counts[new_name] = self.counts.pop(old_name)
+        for names in (self.bag, self.excluded):
+            if old_name in names:
+                names.discard(old_name)
+                names.add(new_name)
+        if self.last == old_name:
+            self.last = new_name
+
+    def apply(self, op, name, new_name=None):
+        """
+        应用一条名单变更。
+
+        Returns:
+            bool: 无法增量应用（整体替换）时返回 False，需要按完整名单重建
+        """
+        if op == CHANGE_ADD:
+            self.add(name)
+        elif op == CHANGE_DELETE:
+            self.remove(name)
+        elif op == CHANGE_RENAME:
+            self.rename(name, new_name)
+        else:
+            return False
+        return True
+
+    def expire_exclusions(self, today):
+        if self.excluded and self.excluded_date != today:
+            excluded, self.excluded = self.excluded, set()
+            for name in excluded:
+                self.refresh(name)
+
+    def set_strategy(self, strategy):
+        self.strategy = strategy
+        if strategy == STRATEGY_SHUFFLE_BAG:
+            self.bag = set(self.slots)
+        self.tree = FenwickTree(self.weight(name) if name is not None else 0 for name in self.names)
+
+    def to_dict(self):
+        return {
+            'strategy': self.strategy,
+            'counts': self.counts,
+            'bag': sorted(self.bag),
+            'excluded': sorted(self.excluded),
+            'excluded_date': self.excluded_date,
+            'last': self.last,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data.get('strategy', STRATEGY_RANDOM))
+        if state.strategy not in STRATEGIES:
+            state.strategy = STRATEGY_RANDOM
+        state.counts = {str(k): int(v) for k, v in data.get('counts', {}).items()}
+        state.bag = set(data.get('bag', []))
+        state.excluded = set(data.get('excluded', []))
+        state.excluded_date = data.get('excluded_date')
+        state.last = data.get('last')
+        return state
+
+
+def draw_from_state(state, rng, count):
+    """
+    按班级状态的策略抽取 count 名学生（不重复），并更新次数、洗牌袋和上一次点到的学生。
+
+    PickEngine 和点名模拟器（simulate.py）共用这段逻辑；调用方需确认到场人数不少于 count。
+
+    Returns:
+        list: 被点到的学生（按抽取顺序）
+    """
+    chosen = []
+    chosen_slots = set()
+    for _ in range(count):
+        if state.tree.total == 0 and state.strategy == STRATEGY_SHUFFLE_BAG:
+            # 本轮所有到场的学生都已点过，开始新一轮（本批已抽中的暂不参与）
+            state.bag = set(state.slots)
+            state.tree = FenwickTree(
+                0 if name is None or slot in chosen_slots else state.weight(name)
+                for slot, name in enumerate(state.names)
+            )
+        slot = _draw(state, rng, chosen_slots)
+        name = state.names[slot]
+        chosen.append(name)
+        chosen_slots.add(slot)
+        state.bag.discard(name)
+        state.tree.set(slot, 0)
+
+    for name in chosen:
+        state.counts[name] = state.counts.get(name, 0) + 1
+        state.refresh(name)
+    state.last = chosen[-1]
+    return chosen
+
+
+def _draw(state, rng, chosen_slots):
+    """按当前权重抽取一个槽位"""
+    total = state.tree.total
+    # 洗牌袋新一轮的第一位不与上一轮最后一位重复
+    avoid = state.slots.get(state.last) if state.strategy == STRATEGY_SHUFFLE_BAG else None
+    avoid_weight = state.tree.weight(avoid) if avoid is not None and avoid not in chosen_slots else 0
+    if avoid_weight and avoid_weight < total:
+        state.tree.set(avoid, 0)
+        slot = state.tree.find(rng.randrange(total - avoid_weight))
+        state.tree.set(avoid, avoid_weight)
+        return slot
+    return state.tree.find(rng.randrange(total))
+
+
+class PickEngine:
+    """
+    多班级点名引擎。
+
+    通过 storage.add_listener 订阅名单变更，增量维护每个班级的候选权重；
+    索引记录对应的名单版本号，落后时（例如其他进程修改了名单）按 changes_since 补齐，
+    首次使用某个班级或无法增量补齐时才按完整名单重建一次。
+
+    Args:
+        storage: RosterStorage 实例
+        state_file (str): 点名状态文件路径
+        flush_delay (float): 状态变化后延迟写盘的秒数，合并短时间内的多次点名
+    """
+
+    def __init__(self, storage, state_file='pick_state.json', flush_delay=0.5, rng=None):
+        self.storage = storage
+        self.state_file = state_file
+        self.flush_delay = flush_delay
+        self.rng = rng or random.Random()
+        self._lock = threading.RLock()
+        self._states = self._load_states()
+        self._flush_timer = None
+        storage.add_listener(self._on_roster_change)
+
+    # ---- 持久化 ----
+
+    def _load_states(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {class_id: _ClassPickState.from_dict(entry) for class_id, entry in data.items()}
+        except (json.JSONDecodeError, IOError, AttributeError, TypeError, ValueError) as e:
+            logging.error(f"加载点名状态失败: {str(e)}")
+            return {}
+
+    def _schedule_flush(self):
+        """调用方需持有 self._lock"""
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """立即把点名状态写入磁盘"""
+        with self._lock:
+            self._flush_timer = None
+            data = {class_id: state.to_dict() for class_id, state in self._states.items()}
+        try:
+            write_json_atomic(self.state_file, data)
+        except OSError as e:
+            logging.error(f"保存点名状态失败: {str(e)}")
+
+    def close(self):
+        with self._lock:
+            timer, self._flush_timer = self._flush_timer, None
+        if timer is not None:
+            timer.cancel()
+        self.flush()
+
+    # ---- 名单同步 ----
+
+    def _state(self, class_id):
+        """返回已与名单同步的班级状态，调用方需持有 self._lock"""
+        state = self._states.get(class_id)
+        if state is None:
+            state = self._states[class_id] = _ClassPickState()
+        version = self.storage.version(class_id)
+        if state.synced and state.version < version:
+            # 变更通知还没送到，或名单被其他进程修改：先尝试按变更记录补齐
+            version, changes = self.storage.changes_since(class_id, state.version)
+            if changes is None:
+                state.synced = False
+            else:
+                for change in changes:
+                    if change['version'] <= state.version:
+                        continue
+                    if not state.apply(change['op'], change['name'], change.get('new')):
+                        state.synced = False
+                        break
+                    state.version = change['version']
+                self._schedule_flush()
+        if not state.synced or state.version != version:
+            version, students = self.storage.snapshot(class_id)
+            state.rebuild(students, version)
+        state.expire_exclusions(datetime.date.today().isoformat())
+        return state
+
+    def _on_roster_change(self, change):
+        with self._lock:
+            state = self._states.get(change.class_id)
+            if state is None or not state.synced or change.version is None or change.version <= state.version:
+                return
+            # 版本号不连续（漏掉了变更）或整体替换名单时，下次使用时重建
+            if change.version != state.version + 1 or not state.apply(change.op, change.name, change.new_name):
+                state.synced = False
+            else:
+                state.version = change.version
+            self._schedule_flush()
+
+    # ---- 点名 ----
+
+    def pick(self, class_id):
+        """
+        按班级当前策略点名一次。
+
+        Returns:
+            str: 被点到的学生
+
+        Raises:
+            NoEligibleStudentError: 没有学生或所有学生都缺席
+        """
+        return self.pick_many(class_id, 1)[0]
+
+    def pick_many(self, class_id, count, seed=None):
+        """
+        按班级当前策略一次点名 count 名学生（不重复）。
+
+        每次抽取后把被抽中的槽位权重临时置零，因此整批抽取只需 count 次
+        O(log n) 的树状数组查找，与名单大小基本无关。
+
+        Args:
+            class_id (str): 班级 ID
+            count (int): 点名人数
+            seed (int): 可选的随机种子；点名状态相同时，相同种子得到相同结果
+
+        Returns:
+            list: 被点到的学生（按抽取顺序）
+
+        Raises:
+            NoEligibleStudentError: 没有学生或所有学生都缺席
+            InvalidRequestError: 点名人数超过到场人数
+        """
+        rng = random.Random(seed) if seed is not None else self.rng
+        with self._lock:
+            state = self._state(class_id)
+            if not state.slots:
+                raise NoEligibleStudentError()
+            eligible = len(state.slots) - len(state.excluded)
+            if eligible == 0:
+                raise NoEligibleStudentError('所有学生都已标记为缺席')
+            if count > eligible:
+                raise InvalidRequestError(f'点名人数超过到场人数 ({eligible})')
+
+            chosen = draw_from_state(state, rng, count)
+            self._schedule_flush()
+            return chosen
+
+    def make_groups(self, class_id, groups=None, size=None, seed=None):
+        """
+        把到场学生随机分成人数均衡的若干组（各组人数相差不超过 1）。
+
+        对下标数组做一次洗牌，再按轮转方式分组，整体 O(n)。
+        分组不影响点名次数和洗牌袋。
+
+        Args:
+            class_id (str): 班级 ID
+            groups (int): 组数，与 size 二选一
+            size (int): 每组最多人数
+            seed (int): 随机种子，未提供时自动生成并随结果返回，便于复现
+
+        Returns:
+            tuple: (分组列表, 使用的种子)
+
+        Raises:
+            InvalidRequestError: 同时提供或都没有提供组数和每组人数，或组数超过到场人数
+        """
+        if groups is not None and size is not None:
+            raise InvalidRequestError('组数 n 和每组人数 size 只能提供一个')
+        if groups is None and not size:
+            raise InvalidRequestError('需要提供组数 n 或每组人数 size')
+        if seed is None:
+            seed = random.getrandbits(32)
+        with self._lock:
+            state = self._state(class_id)
+            excluded = set(state.excluded)
+        students = [name for name in self.storage.list_students(class_id) if name not in excluded]
+        if not students:
+            raise NoEligibleStudentError()
+        if groups is None:
+            groups = -(-len(students) // size)
+        if groups > len(students):
+            raise InvalidRequestError(f'组数超过到场人数 ({len(students)})')
+
+        order = list(range(len(students)))
+        random.Random(seed).shuffle(order)
+        return [[students[i] for i in order[g::groups]] for g in range(groups)], seed
+
+    # ---- 配置 ----
+
+    def get_status(self, class_id):
+        with self._lock:
+            state = self._state(class_id)
+            return {
+                'strategy': state.strategy,
+                'strategies': list(STRATEGIES),
+                'counts': dict(state.counts),
+                'remaining_in_bag': len(state.bag) if state.strategy == STRATEGY_SHUFFLE_BAG else None,
+                'absent': sorted(state.excluded),
+            }
+
+    def set_strategy(self, class_id, strategy):
+        if strategy not in STRATEGIES:
+            raise InvalidRequestError(f"未知的点名策略: {strategy}")
+        with self._lock:
+            state = self._state(class_id)
+            if state.strategy != strategy:
+                state.set_strategy(strategy)
+                self._schedule_flush()
+
+    def set_absent(self, class_id, names):
+        """
+        设置今日缺席名单（整体替换）。
+
+        Raises:
+            StudentNotFoundError: 名单中包含不存在的学生
+        """
+        with self._lock:
+            state = self._state(class_id)
+            names = set(names)
+            unknown = names - set(state.slots)
+            if unknown:
+                raise StudentNotFoundError(f"学生不存在: {', '.join(sorted(unknown))}")
+            changed = state.excluded ^ names
+            state.excluded = names
+            state.excluded_date = datetime.date.today().isoformat()
+            for name in changed:
+                state.refresh(name)
+            self._schedule_flush()
+            return sorted(names)
+
+    def reset(self, class_id):
+        """清空班级的点名次数和洗牌袋（保留策略和缺席名单）"""
+        with self._lock:
+            state = self._state(class_id)
+            state.counts = {}
+            state.last = None
+            state.set_strategy(state.strategy)
+            self._schedule_flush()
@@ -0,0 +1,332 @@
+"""
+班级点名器 - 名单版本历史
+
+名单的每个版本都可以查看和恢复。历史按段保存在 <目录>/<班级ID>/<起始版本号>.jsonl：
+每段的前两行是检查点（元数据和完整名单），之后每行是一个版本的变更（add/del/ren）。
+段内的变更条数达到 max(checkpoint_interval, 名单人数) 时开始新的一段，所以任意版本
+都能从所在段的检查点回放有限条变更得到，检查点占用的空间摊到每次变更上是常数。
+整体替换名单（包括恢复历史版本）或无法增量同步（例如名单文件被手工修改）时也开始新的一段。
+
+历史从存储层的变更记录（changes_since）同步，与变更通知的到达顺序无关。同步在跨进程
+文件锁内进行，已记录到的版本号和当前段的长度保存在锁文件中：多个进程共享名单时每个版本
+只记录一次，写入中途崩溃留下的半截记录在下次同步时截掉。超过保留天数的旧段整段删除，
+当前段总是保留。
+"""
+
+import bisect
+import datetime
+import logging
+import os
+import threading
+import time
+
+from codec import dumps, loads
+from journal import FileLock, OP_ADD, OP_DELETE, OP_RENAME
+from storage import StorageError
+
+OP_CHECKPOINT = 'checkpoint'    # 历史的起点或定期检查点
+OP_RESET = 'reset'              # 整体替换名单（恢复历史版本时带 from）
+
+SEGMENT_SUFFIX = '.jsonl'
+STATE_FILE = 'state.lock'
+DEFAULT_CHECKPOINT_INTERVAL = 1000
+DEFAULT_RETENTION_DAYS = 30
+
+
+class RevisionNotFoundError(StorageError):
+    status_code = 404
+
+    def __init__(self, version):
+        super().__init__(f'名单版本 {version} 不存在或已过期')
+        self.version = version
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _format_time(timestamp_ms):
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000).isoformat(timespec='seconds')
+
+
+def _format_revision(record):
+    entry = {'version': record['v'], 'time': _format_time(record['t']), 'op': record['op']}
+    for key in ('name', 'new', 'count', 'from'):
+        if key in record:
+            entry[key] = record[key]
+    return entry
+
+
+def _read_segment(path, upto=None, with_names=True):
+    """
+    读取一段历史。
+
+    Args:
+        upto (int): 只读取版本号不超过它的变更
+        with_names (bool): 是否解析检查点的完整名单（列出历史时不需要）
+
+    Returns:
+        tuple: (检查点元数据, 检查点名单或 None, 变更记录列表)
+    """
+    with open(path, 'rb') as f:
+        header = loads(f.readline())
+        line = f.readline()
+        names = loads(line) if with_names else None
+        records = []
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            record = loads(raw)
+            if upto is not None and record['v'] > upto:
+                break
+            records.append(record)
+    return header, names, records
+
+
+def replay(names, records):
+    """
+    在检查点名单上按顺序应用变更，名单顺序与存储层一致（添加在末尾，改名保持原位）。
+    用位置索引代替在列表中查找，回放 k 条变更的时间为 O(人数 + k)。
+    """
+    slots = list(names)
+    positions = {name: i for i, name in enumerate(slots)}
+    for record in records:
+        op, name = record['op'], record['name']
+        if op == OP_ADD:
+            if name not in positions:
+                positions[name] = len(slots)
+                slots.append(name)
+        elif op == OP_DELETE:
+            position = positions.pop(name, None)
+            if position is not None:
+                slots[position] = None
+        elif op == OP_RENAME:
+            new_name = record['new']
+            if name in positions and new_name not in positions:
+                position = positions.pop(name)
+                slots[position] = new_name
+                positions[new_name] = position
+    return [name for name in slots if name is not None]
+
+
+class RosterRevisions:
+    """
+    名单版本历史。注册为存储层的变更回调（on_roster_change）后自动记录。
+
+    Args:
+        storage (RosterStorage): 名单存储
+        directory (str): 历史文件目录，每个班级一个子目录
+        checkpoint_interval (int): 两个检查点之间的最少变更条数，实际为 max(该值, 名单人数)
+        retention_days (float): 旧段的保留天数，0 表示永久保留
+    """
+
+    def __init__(self, storage, directory, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL,
+                 retention_days=DEFAULT_RETENTION_DAYS):
+        self.storage = storage
+        self.directory = directory
+        self.checkpoint_interval = checkpoint_interval
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._file_locks = {}       # 班级 ID -> FileLock
+        self._recorded = {}         # 班级 ID -> 已记录到的版本号，用于跳过已经同步过的变更通知
+        self._local = threading.local()
+
+    def _class_dir(self, class_id):
+        return os.path.join(self.directory, class_id)
+
+    def _segment_path(self, class_id, start_version):
+        return os.path.join(self._class_dir(class_id), f"{start_version:016d}{SEGMENT_SUFFIX}")
+
+    def _file_lock(self, class_id):
+        with self._lock:
+            lock = self._file_locks.get(class_id)
+            if lock is None:
+                lock = self._file_locks[class_id] = FileLock(os.path.join(self._class_dir(class_id), STATE_FILE))
+            return lock
+
+    def _segments(self, class_id):
+        """按起始版本号排列的 [(起始版本号, 路径)]"""
+        try:
+            filenames = os.listdir(self._class_dir(class_id))
+        except FileNotFoundError:
+            return []
+        segments = []
+        for filename in filenames:
+            stem, ext = os.path.splitext(filename)
+            if ext == SEGMENT_SUFFIX and stem.isdigit():
+                segments.append((int(stem), os.path.join(self._class_dir(class_id), filename)))
+        segments.sort()
+        return segments
+
+    # ---- 记录 ----
+
+    def track(self, class_id):
+        """开始记录班级的历史（启动时对默认班级调用，使第一次修改之前的名单也能恢复）"""
+        with self._file_lock(class_id) as lock:
+            self._sync_locked(class_id, lock)
+            self._prune(class_id)
+
+    def on_roster_change(self, change):
+        """名单变更回调：把变更同步到历史，已经记录过的版本直接跳过"""
+        if change.version is not None and change.version <= self._recorded.get(change.class_id, -1):
+            return
+        with self._file_lock(change.class_id) as lock:
+            self._sync_locked(change.class_id, lock)
+
+    def _sync_locked(self, class_id, lock):
+        try:
+            state = loads(lock.read() or b'{}')
+        except ValueError:
+            state = {}
+        changes = None
+        if state:
+            _, changes = self.storage.changes_since(class_id, state['version'])
+            if changes == []:
+                self._recorded[class_id] = state['version']
+                return
+        if not state:
+            # 第一次记录这个班级：当前名单作为历史的起点
+            version, names = self.storage.snapshot(class_id)
+            state = self._start_segment(class_id, OP_CHECKPOINT, version, names)
+        elif changes:
+            state = self._append_changes(class_id, state, changes)
+            if state['ops'] >= max(self.checkpoint_interval, state['count']):
+                version, names = self.storage.snapshot(class_id)
+                # 期间又有新的变更时留到下次同步
+                if version == state['version']:
+                    state = self._start_segment(class_id, OP_CHECKPOINT, version, names)
+        else:
+            # 无法增量同步（整体替换或外部修改）：记录完整名单
+            version, names = self.storage.snapshot(class_id)
+            if version == state['version']:
+                self._recorded[class_id] = version
+                return
+            if version < state['version']:
+                self._archive(class_id)
+            restoring = getattr(self._local, 'restoring', None)
+            restored_from = restoring[1] if restoring and restoring[0] == class_id else None
+            state = self._start_segment(class_id, OP_RESET, version, names, restored_from)
+        lock.write(dumps(state))
+        self._recorded[class_id] = state['version']
+
+    def _append_changes(self, class_id, state, changes):
+        now = _now_ms()
+        count = state['count']
+        lines = []
+        for change in changes:
+            record = {'v': change['version'], 't': now, 'op': change['op'], 'name': change['name']}
+            if 'new' in change:
+                record['new'] = change['new']
+            lines.append(dumps(record) + b'\n')
+            if change['op'] == OP_ADD:
+                count += 1
+            elif change['op'] == OP_DELETE:
+                count -= 1
+        data = b''.join(lines)
+        with open(self._segment_path(class_id, state['segment']), 'r+b') as f:
+            # 截掉上次写入后、状态更新前崩溃留下的记录
+            f.truncate(state['size'])
+            f.seek(state['size'])
+            f.write(data)
+        return dict(state, version=changes[-1]['version'], size=state['size'] + len(data),
+                    ops=state['ops'] + len(changes), count=count)
+
+    def _start_segment(self, class_id, op, version, names, restored_from=None):
+        header = {'v': version, 't': _now_ms(), 'op': op, 'count': len(names)}
+        if restored_from is not None:
+            header['from'] = restored_from
+        data = dumps(header) + b'\n' + dumps(names) + b'\n'
+        with open(self._segment_path(class_id, version), 'wb') as f:
+            f.write(data)
+        self._prune(class_id)
+        return {'version': version, 'segment': version, 'size': len(data), 'ops': 0, 'count': len(names)}
+
+    def _archive(self, class_id):
+        """名单版本号回退（名单数据被整体换掉），旧历史的版本号不再对应，移到备份目录"""
+        backup_dir = os.path.join(self._class_dir(class_id), f"archived-{time.strftime('%Y%m%d%H%M%S')}")
+        os.makedirs(backup_dir, exist_ok=True)
+        for _, path in self._segments(class_id):
+            os.replace(path, os.path.join(backup_dir, os.path.basename(path)))
+        logging.warning(f"班级 {class_id} 的名单版本号回退，旧的版本历史已移到: {backup_dir}")
+
+    def _prune(self, class_id):
+        """删除最后修改时间超过保留天数的旧段，当前段总是保留"""
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        for _, path in self._segments(class_id)[:-1]:
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError as e:
+                logging.warning(f"删除过期的名单历史失败: {str(e)}")
+
+    # ---- 查询与恢复 ----
+
+    def history(self, class_id, limit=50, before=None):
+        """
+        名单的历史版本（从新到旧）。
+
+        Args:
+            limit (int): 最多返回的版本数
+            before (int): 翻页游标，只返回版本号小于它的版本（上一页返回的 next）
+
+        Returns:
+            tuple: (版本列表, 下一页的游标；没有更早的版本时为 None)。每个版本为
+                {'version', 'time', 'op', ...}：增删改名带 name（改名还有 new），
+                整体替换带 count（恢复历史版本时还有 from），最早可恢复的版本 op 为 checkpoint
+        """
+        entries = []
+        with self._file_lock(class_id) as lock:
+            self._sync_locked(class_id, lock)
+            segments = self._segments(class_id)
+            for index in range(len(segments) - 1, -1, -1):
+                start, path = segments[index]
+                if before is not None and start >= before:
+                    continue
+                header, _, records = _read_segment(path, with_names=False)
+                # 定期检查点与上一段最后一条变更是同一个版本，只有最早的一段需要列出
+                if header['op'] != OP_CHECKPOINT or index == 0:
+                    records.insert(0, header)
+                for record in reversed(records):
+                    if before is None or record['v'] < before:
+                        entries.append(_format_revision(record))
+                if len(entries) > limit:
+                    break
+        next_cursor = entries[limit - 1]['version'] if len(entries) > limit else None
+        return entries[:limit], next_cursor
+
+    def rebuild(self, class_id, version):
+        """
+        重建名单的某个历史版本：从所在段的检查点回放该段中的变更。
+
+        Raises:
+            RevisionNotFoundError: 没有这个版本或已超过保留期限
+        """
+        with self._file_lock(class_id) as lock:
+            self._sync_locked(class_id, lock)
+            segments = self._segments(class_id)
+            index = bisect.bisect_right([start for start, _ in segments], version) - 1
+            if index < 0:
+                raise RevisionNotFoundError(version)
+            header, names, records = _read_segment(segments[index][1], upto=version)
+        if header['v'] == version:
+            return names
+        if not records or records[-1]['v'] != version:
+            raise RevisionNotFoundError(version)
+        return replay(names, records)
+
+    def restore(self, class_id, version, expected_version=None):
+        """
+        把名单恢复为历史版本：整体替换名单，产生一个新版本，之前的版本仍保留在历史中。
+
+        Returns:
+            int: 恢复后的名单版本号
+        """
+        names = self.rebuild(class_id, version)
+        # 替换名单的变更回调在本线程中执行，历史记录据此标明恢复自哪个版本
+        self._local.restoring = (class_id, version)
+        try:
+            return self.storage.replace_students(class_id, names, expected_version)
+        finally:
+            self._local.restoring = None
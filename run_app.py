@@ -2,16 +2,22 @@
 班级点名器启动脚本
 这个脚本用于启动班级点名器应用，并在打包为exe后作为入口点
 """
-import subprocess
+import time
+_STARTUP_BEGIN = time.perf_counter()  # 启动计时起点（--profile-startup）
+
 import sys
 import os
-import time
-import webbrowser
 import shutil
 import socket
 import logging
 import traceback
 import functools
+import hashlib
+import argparse
+import contextlib
+import threading
+import _thread
+from concurrent.futures import ThreadPoolExecutor, wait
 from threading import Timer
 # ---- Standard Library Imports for Networking/Cleanup ----
 import http.client
@@ -19,23 +25,92 @@ import json
 import atexit
 # -------------------------------------------------------
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("app_log.txt", encoding='utf-8', mode='a'), # 使用追加模式
-        logging.StreamHandler()
-    ]
-)
+# 配置日志（队列 + 后台线程写入，按大小轮换，见 logconfig.py）
+from logconfig import setup_logging
+setup_logging()
 
 # --- Constants ---
 PORT_FILE = "rollcall.port"
 APP_IDENTIFIER = "RollCallPy" # Must match main.py
 DEFAULT_START_PORT = 5000
 DEFAULT_MAX_PORT = 5050
+PROBE_WORKERS = 16   # 并发探测的线程数
+PROBE_CONNECT_TIMEOUT = 0.1 # 探测端口时连接的超时（秒）
+PROBE_PING_TIMEOUT = 0.3    # 端口有程序监听时 /ping 的超时（秒，连接和读取响应各自计时）
 # -----------------
 
+def parse_args(argv=None):
+    """解析命令行参数（均为可选，未指定时使用环境变量或默认值）"""
+    parser = argparse.ArgumentParser(description="班级点名器")
+    parser.add_argument('--server', choices=['dev', 'production'],
+                        help="服务器模式: dev（开发服务器）或 production（多线程生产服务器）")
+    parser.add_argument('--host', help="监听地址，0.0.0.0 表示允许局域网内的其他设备访问")
+    parser.add_argument('--threads', type=int, help="生产服务器的工作线程数")
+    parser.add_argument('--port', type=int,
+                        help=f"监听端口，0 表示由系统分配；默认使用 {DEFAULT_START_PORT}-{DEFAULT_MAX_PORT} 中第一个空闲端口")
+    parser.add_argument('--check-env', action='store_true',
+                        help="启动时检查并记录运行环境（目录、音频文件、路由等）")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="记录启动各阶段耗时，收到第一个响应后输出报告并退出")
+    return parser.parse_args(argv)
+
+def apply_server_args(args):
+    """把命令行参数写入环境变量，由 main.py 读取"""
+    for env_name, value in (('ROLLCALL_SERVER', args.server),
+                            ('ROLLCALL_HOST', args.host),
+                            ('ROLLCALL_THREADS', args.threads)):
+        if value is not None:
+            os.environ[env_name] = str(value)
+            logging.info(f"服务器参数: {env_name}={value}")
+
+class StartupProfiler:
+    """
+    启动计时：记录各阶段耗时，以及从脚本开始执行到服务器返回第一个响应的总时间
+    （不包括 Python 解释器本身和打包程序解压的时间）。
+    """
+
+    def __init__(self, origin=_STARTUP_BEGIN):
+        self.origin = origin
+        self.phases = []        # (阶段名, 耗时秒)
+        self.milestones = []    # (事件名, 距起点秒)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def mark(self, name):
+        self.milestones.append((name, time.perf_counter() - self.origin))
+
+    def report(self):
+        lines = ["启动耗时报告:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:<20} {seconds * 1000:8.1f} ms")
+        for name, seconds in self.milestones:
+            lines.append(f"  [{name}] 距脚本开始 {seconds * 1000:.1f} ms")
+        text = "\n".join(lines)
+        logging.info(text)
+        return text
+
+def wait_for_first_response(port, profiler, stop_after=False, timeout=30):
+    """在后台等待服务器返回第一个 /ping 响应，记录时间并输出报告"""
+    def wait():
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if ping_instance_http(port, timeout=0.5):
+                profiler.mark("首个响应")
+                profiler.report()
+                if stop_after:
+                    # 与 Ctrl+C 相同，服务器会正常停止
+                    _thread.interrupt_main()
+                return
+            time.sleep(0.01)
+        logging.warning("等待服务器首个响应超时")
+    threading.Thread(target=wait, name='startup-profiler', daemon=True).start()
+
 def is_port_in_use(port, timeout=0.1):
     """检查端口是否被占用 (使用稍长一点的超时)"""
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -50,15 +125,55 @@ def is_port_in_use(port, timeout=0.1):
             logging.debug(f"Error checking port {port}: {e}")
             return False
 
-def find_available_port(start_port=DEFAULT_START_PORT, max_port=DEFAULT_MAX_PORT):
-    """寻找可用端口"""
-    logging.info(f"寻找可用端口范围: {start_port}-{max_port}")
-    for port in range(start_port, max_port):
-        if not is_port_in_use(port):
-            logging.info(f"找到可用端口: {port}")
-            return port
-    logging.warning("未找到可用端口")
-    return None
+PORT_FREE = 'free'          # 没有程序监听
+PORT_INSTANCE = 'instance'  # 正在运行的本应用实例
+PORT_BUSY = 'busy'          # 被其他程序占用
+
+def probe_port(port):
+    """探测单个端口：先尝试连接，连接成功再用 /ping 验证是否为本应用"""
+    if not is_port_in_use(port, timeout=PROBE_CONNECT_TIMEOUT):
+        return PORT_FREE
+    if ping_instance_http(port, timeout=PROBE_PING_TIMEOUT):
+        return PORT_INSTANCE
+    return PORT_BUSY
+
+def probe_deadline(count, workers=PROBE_WORKERS):
+    """
+    探测 count 个端口最坏情况下的耗时：每批 workers 个端口，每个端口最多等待
+    一次连接超时和 /ping 的连接、读取超时。总时限不能短于它，否则响应慢的实例会被当作状态未知，
+    启动脚本随后在更小的空闲端口上再启动一个实例。
+    """
+    batches = -(-count // max(1, workers))
+    return batches * (PROBE_CONNECT_TIMEOUT + 2 * PROBE_PING_TIMEOUT) + 0.2
+
+def probe_ports(start_port=DEFAULT_START_PORT, max_port=DEFAULT_MAX_PORT, deadline=None):
+    """
+    并发探测整个端口范围（一次扫描同时完成实例检测和空闲端口查找），从小的端口开始探测。
+
+    超过 deadline 秒（默认为 probe_deadline，足够完成一次完整扫描）仍未完成探测的端口视为状态未知，
+    既不当作实例也不当作空闲端口。本机端口通常立即返回连接被拒绝，实际耗时远小于 deadline。
+
+    Returns:
+        tuple: (已运行实例的端口, 最小的空闲端口)，找不到时对应项为 None
+    """
+    ports = list(range(start_port, max_port))
+    workers = min(PROBE_WORKERS, len(ports)) or 1
+    if deadline is None:
+        deadline = probe_deadline(len(ports), workers)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='port-probe')
+    try:
+        futures = {executor.submit(probe_port, port): port for port in ports}
+        done, pending = wait(futures, timeout=deadline)
+        if pending:
+            logging.warning(f"端口扫描超时，{len(pending)} 个端口状态未知")
+        results = {futures[future]: future.result() for future in done}
+    finally:
+        # 不等待超时未完成的探测，它们各自的超时很短，会在后台结束
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    instance_port = min((p for p, state in results.items() if state == PORT_INSTANCE), default=None)
+    free_port = min((p for p, state in results.items() if state == PORT_FREE), default=None)
+    return instance_port, free_port
 
 def resource_path(relative_path):
     """获取资源的绝对路径，适用于PyInstaller打包后的情况"""
@@ -75,43 +190,53 @@ def resource_path(relative_path):
     # logging.info(f"解析资源路径: {relative_path} -> {path}")
     return path
 
+def _file_digest(path):
+    """文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(functools.partial(f.read, 1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 def ensure_static_files():
-    """确保静态文件和模板文件存在，并在需要时从打包资源中复制"""
+    """
+    确保静态文件和模板文件存在，并在需要时从打包资源中复制。
+
+    打包后的程序和源码运行时，工作目录就是资源所在的目录，应用直接读取这些文件，不需要复制；
+    只有两者不同时才按内容哈希比较，复制缺失或内容不同的文件。
+    """
     try:
         base_dir = os.getcwd() # 使用当前工作目录作为目标基础
-        static_dir = os.path.join(base_dir, 'static')
-        templates_dir = os.path.join(base_dir, 'templates')
-
-        # 确保目标目录存在
-        os.makedirs(static_dir, exist_ok=True)
-        os.makedirs(templates_dir, exist_ok=True)
-        logging.info(f"确保目标目录存在: {static_dir}, {templates_dir}")
-
-        # 定义需要的文件和它们的源路径 (相对于打包资源或脚本目录)
-        required_files = {
-            os.path.join(static_dir, 'roll.mp3'): resource_path(os.path.join('static', 'roll.mp3')),
-            os.path.join(static_dir, 'select.mp3'): resource_path(os.path.join('static', 'select.mp3')),
-            os.path.join(static_dir, 'click.mp3'): resource_path(os.path.join('static', 'click.mp3')),
-            os.path.join(templates_dir, 'index.html'): resource_path(os.path.join('templates', 'index.html')),
-        }
-
-        for target_path, source_path in required_files.items():
-            # 检查目标文件是否存在或是否有效 (例如，大小检查 > 100字节)
-            is_valid = os.path.exists(target_path) and os.path.getsize(target_path) > 100
-
-            if not is_valid:
-                if os.path.exists(source_path):
-                    try:
-                        shutil.copy2(source_path, target_path)
-                        logging.info(f"已复制文件: {os.path.basename(source_path)} -> {target_path}")
-                    except Exception as copy_error:
-                         logging.error(f"复制文件失败: {source_path} 到 {target_path} - {copy_error}")
-                else:
-                    # 如果源文件不存在，也记录下来
-                    logging.warning(f"源文件未找到，无法复制: {source_path} (目标: {target_path})")
-            # else:
-            #     # 文件已存在，可以考虑不打印日志，减少干扰
-            #     # logging.debug(f"文件已存在且有效: {target_path}")
+        resource_dir = resource_path('')
+        if os.path.normcase(os.path.realpath(resource_dir)) == os.path.normcase(os.path.realpath(base_dir)):
+            logging.debug(f"直接使用资源目录中的文件: {resource_dir}")
+            return
+
+        # 需要的文件 (相对于打包资源或脚本目录)
+        required_files = [
+            os.path.join('static', 'roll.mp3'),
+            os.path.join('static', 'select.mp3'),
+            os.path.join('static', 'click.mp3'),
+            os.path.join('templates', 'index.html'),
+        ]
+
+        for relative_path in required_files:
+            source_path = resource_path(relative_path)
+            target_path = os.path.join(base_dir, relative_path)
+            if not os.path.exists(source_path):
+                # 启动优化的打包只带资源包，不带 static/ 下的原始文件
+                logging.debug(f"源文件不存在，跳过: {source_path}")
+                continue
+            if (os.path.exists(target_path)
+                    and os.path.getsize(target_path) == os.path.getsize(source_path)
+                    and _file_digest(target_path) == _file_digest(source_path)):
+                continue
+            try:
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                shutil.copy2(source_path, target_path)
+                logging.info(f"已复制文件: {os.path.basename(source_path)} -> {target_path}")
+            except Exception as copy_error:
+                logging.error(f"复制文件失败: {source_path} 到 {target_path} - {copy_error}")
 
     except Exception as e:
         logging.error(f"确保文件时出错: {str(e)}")
@@ -121,11 +246,24 @@ def open_browser(port):
     """打开浏览器访问应用"""
     url = f"http://127.0.0.1:{port}"
     try:
+        import webbrowser  # 只在需要时导入，减少启动时间
         logging.info(f"尝试打开浏览器: {url}")
         webbrowser.open_new(url)
     except Exception as e:
         logging.error(f"打开浏览器失败: {str(e)}")
 
+def write_port_file(port):
+    """写入端口文件（供下次启动快速检测实例）并注册退出时清理"""
+    try:
+        with open(PORT_FILE, 'w') as f:
+            f.write(str(port))
+        logging.info(f"已将端口 {port} 写入文件: {PORT_FILE}")
+        # 注册退出时清理端口文件的函数
+        atexit.register(remove_port_file)
+        logging.info("已注册退出时清理端口文件的任务。")
+    except IOError as e:
+        logging.warning(f"写入端口文件 {PORT_FILE} 失败: {e} (应用将继续，但快速实例检测可能失效)")
+
 def remove_port_file():
     """尝试删除端口文件 (用于 atexit 清理)"""
     try:
@@ -167,7 +305,12 @@ def ping_instance_http(port, timeout=0.5):
     return False # Verification failed
 
 def check_and_handle_existing_instance(start_port=DEFAULT_START_PORT, max_port=DEFAULT_MAX_PORT):
-    """优先检查端口文件，然后扫描端口范围验证实例"""
+    """
+    优先检查端口文件，然后扫描端口范围验证实例。找到实例时打开浏览器并退出进程。
+
+    Returns:
+        int: 扫描中找到的最小空闲端口，没有则为 None
+    """
     # 1. 尝试读取端口文件
     instance_found_via_file = False
     if os.path.exists(PORT_FILE):
@@ -195,26 +338,22 @@ def check_and_handle_existing_instance(start_port=DEFAULT_START_PORT, max_port=D
             logging.error(f"读取或处理端口文件 {PORT_FILE} 时出错: {e}")
             remove_port_file() # 出错时也尝试删除
 
-    # 2. 如果通过文件未找到，则扫描端口范围 (Fallback)
+    # 2. 如果通过文件未找到，则并发扫描端口范围，同时记下最小的空闲端口
     logging.info(f"未通过端口文件找到运行实例，开始扫描端口 {start_port}-{max_port}...")
-    for port in range(start_port, max_port):
-        # 快速检查端口是否在使用 (避免对每个都 ping)
-        if is_port_in_use(port, timeout=0.1):
-            logging.debug(f"端口 {port} 被占用，尝试 ping 验证...")
-            # 使用稍短的超时时间进行扫描 ping
-            if ping_instance_http(port, timeout=0.2):
-                logging.info(f"通过端口扫描验证成功 (端口 {port})。")
-                print(f"应用已在端口 {port} 运行，将打开现有实例。")
-                open_browser(port)
-                logging.info("已打开浏览器指向现有实例，当前进程将退出。")
-                sys.exit(0) # 正常退出
-            # else: ping 失败，继续扫描下一个端口
-        # else: port 不在使用，继续扫描下一个端口
+    port, free_port = probe_ports(start_port, max_port)
+    if port is not None:
+        logging.info(f"通过端口扫描验证成功 (端口 {port})。")
+        print(f"应用已在端口 {port} 运行，将打开现有实例。")
+        open_browser(port)
+        logging.info("已打开浏览器指向现有实例，当前进程将退出。")
+        sys.exit(0) # 正常退出
 
     logging.info("在指定范围内未检测到正在运行的本应用实例。")
-    return False # 表示没有找到正在运行的实例
+    return free_port # 扫描中找到的最小空闲端口 (没有则为 None)
 
 def main():
+    args = parse_args()
+    profiler = StartupProfiler()
     logging.info("="*50)
     logging.info("班级点名器启动")
     logging.info(f"Python版本: {sys.version.split()[0]}")
@@ -234,11 +373,13 @@ def main():
             logging.info(f"当前工作目录已是脚本目录: {current_dir}")
         
         # **** 检查是否已有实例在运行 (优先使用端口文件) ****
-        check_and_handle_existing_instance()
+        with profiler.phase("检测实例并探测端口"):
+            free_port = check_and_handle_existing_instance()
         # ******************************************************
 
         # 确保静态/模板文件和目录存在
-        ensure_static_files()
+        with profiler.phase("准备静态文件"):
+            ensure_static_files()
         
         # 确保students.json文件存在于当前工作目录
         students_json_path = os.path.join(current_dir, 'students.json')
@@ -252,78 +393,58 @@ def main():
                 input("错误：无法创建数据文件，请检查权限。按Enter键退出...")
                 sys.exit(1)
         
-        # 寻找可用端口
-        port = find_available_port()
+        # 确定端口：命令行指定 > 扫描时找到的空闲端口；0 表示由系统分配
+        # （服务器直接绑定端口 0，绑定后才知道实际端口，避免先探测再绑定之间端口被占用）
+        port = args.port if args.port is not None else free_port
         if port is None:
-            logging.error("无法找到可用端口 (5000-5050)，且未检测到运行中的实例。请检查端口占用情况")
+            logging.error("无法找到可用端口 (5000-5050)，且未检测到运行中的实例。请检查端口占用情况，或使用 --port 0 由系统分配端口")
             input("错误：无法启动应用，没有可用端口。按Enter键退出...")
             sys.exit(1)
         
-        logging.info(f"将在端口 {port} 启动新实例。")
-        
-        # **** 写入端口文件并注册清理 ****
-        try:
-            with open(PORT_FILE, 'w') as f:
-                f.write(str(port))
-            logging.info(f"已将端口 {port} 写入文件: {PORT_FILE}")
-            # 注册退出时清理端口文件的函数
-            atexit.register(remove_port_file)
-            logging.info("已注册退出时清理端口文件的任务。")
-        except IOError as e:
-            logging.warning(f"写入端口文件 {PORT_FILE} 失败: {e} (应用将继续，但快速实例检测可能失效)")
-        # *********************************
-
-        # 设置环境变量，传递给main.py (虽然exec不需要，但保留可能有用)
-        os.environ['APP_PORT'] = str(port)
+        logging.info(f"将在端口 {port or '(由系统分配)'} 启动新实例。")
+
+        # 服务器参数通过环境变量传给 server.load_server_config
+        apply_server_args(args)
         
         # 运行主应用
         try:
-            # 延迟打开浏览器
-            browser_timer = Timer(1.0, functools.partial(open_browser, port))
-            browser_timer.daemon = True
-            browser_timer.start()
-            
-            main_py_path = os.path.join(current_dir, 'main.py')
-            logging.info(f"准备执行主应用文件: {main_py_path}")
-            
-            if os.path.exists(main_py_path):
-                try:
-                    with open(main_py_path, 'r', encoding='utf-8') as f:
-                        main_code = f.read()
-                    
-                    # 创建一个全局命名空间来执行代码
-                    # 显式传递 __name__ = '__main__' 来运行 main.py 中的主块
-                    # 传递 __file__ 让 main.py 知道自己的路径
-                    main_globals = {
-                        '__name__': '__main__',
-                        '__file__': main_py_path,
-                        # 可以传递其他需要的全局变量
-                    }
-                    logging.info(f"开始执行 main.py (端口: {port})...")
-                    exec(main_code, main_globals)
-                    # exec 会阻塞直到 Flask 服务器停止 (例如 Ctrl+C)
-                    logging.info("main.py 执行完毕 (Flask服务器已停止)")
-                except SystemExit:
-                    logging.info("Flask 服务器正常退出。")
-                except Exception as exec_error:
-                    logging.error(f"执行 main.py 时发生错误: {exec_error}")
-                    logging.error(traceback.format_exc())
-                    # 尝试清理端口文件即使执行出错
-                    remove_port_file()
-                    input("错误：应用主逻辑执行失败。按Enter键退出...")
-                    sys.exit(1)
-            else:
-                 logging.error(f"主应用文件未找到: {main_py_path}")
-                 remove_port_file() # 清理可能已写入的端口文件
-                 input("错误：缺少核心应用文件。按Enter键退出...")
-                 sys.exit(1)
+            # 以普通模块导入主应用（使用字节码缓存，打包后已编译进程序）
+            with profiler.phase("导入主应用模块"):
+                import main as rollcall
+                from server import load_server_config, serve
+            config = {'PORT': port}
+            if args.check_env:
+                config['CHECK_ENVIRONMENT'] = True
+            with profiler.phase("创建应用"):
+                app = rollcall.create_app(config, profiler=profiler)
+            profiler.mark("应用创建完成")
+
+            def on_bound(bound_port):
+                """服务器已绑定端口：写入端口文件，打开浏览器（或等待首个响应）"""
+                if bound_port != port:
+                    logging.info(f"系统分配的端口: {bound_port}")
+                write_port_file(bound_port)
+                if args.profile_startup:
+                    wait_for_first_response(bound_port, profiler, stop_after=True)
+                else:
+                    # 延迟打开浏览器
+                    browser_timer = Timer(1.0, functools.partial(open_browser, bound_port))
+                    browser_timer.daemon = True
+                    browser_timer.start()
 
+            logging.info(f"启动服务器 (端口: {port})...")
+            # serve 会阻塞直到服务器停止 (例如 Ctrl+C)
+            serve(app, port, load_server_config(),
+                  on_shutdown=[app.extensions['rollcall'].event_broker.close], on_bound=on_bound)
+            logging.info("Flask 服务器已停止")
+        except SystemExit:
+            logging.info("Flask 服务器正常退出。")
         except Exception as e:
-            # 这个捕获可能不会执行，因为 exec 内部的错误会在上面捕获
-            logging.error(f"启动应用时发生意外错误: {str(e)}")
+            logging.error(f"启动应用时发生错误: {str(e)}")
             logging.error(traceback.format_exc())
-            remove_port_file() # 尝试清理
-            input("发生未知启动错误。按任意键退出...")
+            # 尝试清理端口文件即使执行出错
+            remove_port_file()
+            input("错误：应用主逻辑执行失败。按Enter键退出...")
             sys.exit(1)
             
     except Exception as e:
@@ -333,7 +454,7 @@ def main():
         input("发生严重初始化错误，按任意键退出...")
         sys.exit(1)
 
-    # 移除末尾的循环，app.run() 或 exec(main.py) 会阻塞
+    # 移除末尾的循环，serve() 会阻塞
     logging.info("班级点名器退出")
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+"""
+学生姓名搜索。
+
+每个班级维护一个内存索引，支持按汉字、全拼和拼音首字母做前缀搜索：
+"林雨"、"linyu"、"lyf" 都能找到 林雨烽，从名字中间的字开始也可以（"雨烽"、"yufeng"、"yf"）。
+
+索引是按键排好序的 (键, 名字) 列表，查询只需一次二分查找加上顺序扫描到足够的结果；
+通过 storage.add_listener 订阅名单变更，增删、改名时只插入或删除这个名字的键，
+不会在查询时重建。查询前会比较名单版本号，名单文件被外部修改时再按变更记录补齐或重建。
+
+拼音需要可选依赖 pypinyin（pip install pypinyin）；未安装时只支持按汉字搜索。
+pypinyin 的字典很大，在第一次建立索引时才导入，不影响启动时间。
+"""
+
+import importlib.util
+import logging
+import threading
+from bisect import bisect_left, insort
+from itertools import islice, product
+
+from storage import CHANGE_ADD, CHANGE_DELETE, CHANGE_RENAME
+
+DEFAULT_LIMIT = 20          # 默认返回的结果数
+MAX_LIMIT = 200             # 单次查询最多返回的结果数
+MAX_READINGS = 4            # 多音字组合出的读音上限，避免生僻组合让索引膨胀
+
+
+_pinyin = None              # 首次使用时导入的 (pinyin, Style)，导入失败时为 False
+_pinyin_installed = None
+
+
+def pinyin_available():
+    """是否支持拼音搜索（只查找 pypinyin 模块，不导入它的字典）"""
+    global _pinyin_installed
+    if _pinyin is not None:
+        return bool(_pinyin)
+    if _pinyin_installed is None:
+        _pinyin_installed = importlib.util.find_spec('pypinyin') is not None
+    return _pinyin_installed
+
+
+def _load_pinyin():
+    global _pinyin
+    if _pinyin is None:
+        try:
+            from pypinyin import Style, pinyin   # 可选依赖：pip install pypinyin
+            _pinyin = (pinyin, Style)
+        except ImportError:
+            _pinyin = False
+    return _pinyin
+
+
+def normalize_query(text):
+    """搜索词和索引键的统一形式：小写，去掉空白和拼音中的隔音符号"""
+    return ''.join(text.split()).replace("'", '').lower()
+
+
+def _readings(name, pinyin, style):
+    """名字的拼音读音（每个读音是音节列表），第一个是最常用的读法"""
+    syllables = pinyin(name, style=style.NORMAL, heteronym=True, errors='default')
+    choices = [[normalize_query(s) for s in options if s] or [''] for options in syllables]
+    return list(islice(product(*choices), MAX_READINGS))
+
+
+def name_keys(name):
+    """
+    名字的全部索引键。
+
+    Returns:
+        tuple: (从第一个字开始的键集合, 从后面某个字开始的键集合)
+    """
+    chars = normalize_query(name)
+    leading = {chars}
+    inner = {chars[i:] for i in range(1, len(chars))}
+    loaded = _load_pinyin()
+    if loaded:
+        for syllables in _readings(name, *loaded):
+            leading.add(''.join(syllables))
+            leading.add(''.join(s[:1] for s in syllables))
+            for i in range(1, len(syllables)):
+                inner.add(''.join(syllables[i:]))
+                initials = ''.join(s[:1] for s in syllables[i:])
+                if len(initials) > 1:   # 单个字母会匹配大量名字，没有意义
+                    inner.add(initials)
+    leading.discard('')
+    inner -= leading
+    inner.discard('')
+    return leading, inner
+
+
+class _ClassIndex:
+    """单个班级的索引：名字开头的匹配排在名字中间的匹配之前"""
+
+    def __init__(self, version, students):
+        self.version = version
+        leading, inner = [], []
+        for name in students:
+            leading_keys, inner_keys = name_keys(name)
+            leading.extend((key, name) for key in leading_keys)
+            inner.extend((key, name) for key in inner_keys)
+        leading.sort()
+        inner.sort()
+        self.leading = leading
+        self.inner = inner
+        self.size = len(students)
+
+    def add(self, name):
+        leading_keys, inner_keys = name_keys(name)
+        for key in leading_keys:
+            insort(self.leading, (key, name))
+        for key in inner_keys:
+            insort(self.inner, (key, name))
+        self.size += 1
+
+    def remove(self, name):
+        leading_keys, inner_keys = name_keys(name)
+        for entries, keys in ((self.leading, leading_keys), (self.inner, inner_keys)):
+            for key in keys:
+                i = bisect_left(entries, (key, name))
+                if i < len(entries) and entries[i] == (key, name):
+                    del entries[i]
+        self.size -= 1
+
+    def apply(self, op, name, new_name=None):
+        if op == CHANGE_ADD:
+            self.add(name)
+        elif op == CHANGE_DELETE:
+            self.remove(name)
+        elif op == CHANGE_RENAME:
+            self.remove(name)
+            self.add(new_name)
+        else:
+            return False
+        return True
+
+    def search(self, query, limit):
+        found = {}
+        for entries in (self.leading, self.inner):
+            i = bisect_left(entries, (query,))
+            while i < len(entries) and len(found) < limit:
+                key, name = entries[i]
+                if not key.startswith(query):
+                    break
+                found.setdefault(name, None)
+                i += 1
+        return list(found)
+
+    def entries(self):
+        return len(self.leading) + len(self.inner)
+
+
+class StudentSearch:
+    """
+    多班级姓名搜索。
+
+    Args:
+        storage: RosterStorage 实例，索引通过 add_listener 跟随名单变更
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self.rebuilds = 0
+        storage.add_listener(self._on_roster_change)
+
+    def _on_roster_change(self, change):
+        with self._lock:
+            index = self._indexes.get(change.class_id)
+            if index is None or change.version is None or change.version <= index.version:
+                return
+            # 版本号不连续（漏掉了变更）或整体替换名单时，下次查询重建
+            if change.version != index.version + 1 or not index.apply(change.op, change.name, change.new_name):
+                del self._indexes[change.class_id]
+                return
+            index.version = change.version
+
+    def _index(self, class_id):
+        """返回与名单同步的索引，调用方需持有 self._lock"""
+        version = self.storage.version(class_id)
+        index = self._indexes.get(class_id)
+        if index is not None and index.version < version:
+            # 变更通知还没送到，或名单被其他进程修改：先尝试按变更记录补齐
+            version, changes = self.storage.changes_since(class_id, index.version)
+            if changes is None:
+                index = None
+            else:
+                for change in changes:
+                    if change['version'] <= index.version:
+                        continue
+                    if not index.apply(change['op'], change['name'], change.get('new')):
+                        index = None
+                        break
+                    index.version = change['version']
+        if index is None or index.version != version:
+            version, students = self.storage.snapshot(class_id)
+            index = self._indexes[class_id] = _ClassIndex(version, students)
+            self.rebuilds += 1
+            logging.info(f"已建立搜索索引: {class_id}，{len(students)} 人")
+        return index
+
+    def search(self, class_id, query, limit=DEFAULT_LIMIT):
+        """
+        按汉字、全拼或拼音首字母前缀搜索学生。
+
+        Returns:
+            list: 匹配的名字，名字开头匹配的在前，最多 limit 个
+        """
+        query = normalize_query(query)
+        if not query:
+            return []
+        with self._lock:
+            return self._index(class_id).search(query, limit)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pinyin': pinyin_available(),
+                'classes': len(self._indexes),
+                'entries': sum(index.entries() for index in self._indexes.values()),
+                'rebuilds': self.rebuilds,
+            }
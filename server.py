@@ -0,0 +1,348 @@
+"""
+班级点名器 - WSGI 服务器
+
+提供两种运行模式：
+
+- dev: Flask 自带的 Werkzeug 开发服务器（与以前的行为一致）
+- production: 多线程 WSGI 服务器。安装了 waitress 时使用 waitress，
+  否则使用本模块内置的线程池服务器（纯 Python，只依赖 Werkzeug）。
+
+两种生产服务器都支持限制工作线程数、连接数和监听队列长度，对方无响应的连接会超时断开；
+收到 SIGINT/SIGTERM 时停止接受新连接，等待正在处理的请求完成后退出。
+waitress 支持 keep-alive；内置服务器沿用 Werkzeug 的请求处理，每个响应后关闭连接。
+"""
+
+import logging
+import math
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, make_server
+
+SERVER_DEV = 'dev'
+SERVER_PRODUCTION = 'production'
+SERVER_MODES = (SERVER_DEV, SERVER_PRODUCTION)
+
+DEFAULT_SERVER_CONFIG = {
+    'mode': SERVER_DEV,
+    'host': '127.0.0.1',        # 0.0.0.0 表示允许局域网内的其他设备访问
+    'threads': 32,              # 工作线程数（每个打开的事件流会一直占用一个线程，见 event_stream_limit）
+    'connection_limit': 200,    # 同时保持的连接数上限，超出时直接返回 503
+    'backlog': 128,             # 监听队列长度
+    'keepalive_timeout': 5,     # 秒，keep-alive 连接空闲多久后断开（waitress）
+    'request_timeout': 30,      # 秒，读取请求或发送响应时对方无响应多久后断开（内置服务器；
+                                # waitress 只有一个无响应超时，统一使用 keepalive_timeout）
+    'shutdown_timeout': 10,     # 秒，退出时等待正在处理的请求完成的最长时间
+}
+
+# 环境变量 -> 配置项
+_ENV_VARS = {
+    'ROLLCALL_SERVER': 'mode',
+    'ROLLCALL_HOST': 'host',
+    'ROLLCALL_THREADS': 'threads',
+    'ROLLCALL_CONNECTION_LIMIT': 'connection_limit',
+    'ROLLCALL_BACKLOG': 'backlog',
+    'ROLLCALL_KEEPALIVE_TIMEOUT': 'keepalive_timeout',
+    'ROLLCALL_REQUEST_TIMEOUT': 'request_timeout',
+    'ROLLCALL_SHUTDOWN_TIMEOUT': 'shutdown_timeout',
+}
+
+
+def load_server_config(overrides=None, environ=None):
+    """
+    读取服务器配置：默认值 < 环境变量 < overrides（如命令行参数，值为 None 的项被忽略）。
+
+    Raises:
+        ValueError: 运行模式未知或数值配置无效
+    """
+    environ = os.environ if environ is None else environ
+    config = dict(DEFAULT_SERVER_CONFIG)
+    for env_name, key in _ENV_VARS.items():
+        if environ.get(env_name):
+            config[key] = environ[env_name]
+    for key, value in (overrides or {}).items():
+        if value is not None:
+            config[key] = value
+
+    config['mode'] = str(config['mode']).lower()
+    if config['mode'] not in SERVER_MODES:
+        raise ValueError(f"未知的服务器模式: {config['mode']}，可选: {', '.join(SERVER_MODES)}")
+    for key in ('threads', 'connection_limit', 'backlog'):
+        config[key] = int(config[key])
+        if config[key] < 1:
+            raise ValueError(f"服务器配置 {key} 必须大于 0")
+    for key in ('keepalive_timeout', 'request_timeout', 'shutdown_timeout'):
+        config[key] = float(config[key])
+    return config
+
+
+def event_stream_limit(threads):
+    """
+    事件流（SSE）同时连接数的默认上限：事件流在连接期间一直占用工作线程，
+    至少留出 max(2, threads // 4) 个线程处理普通请求，否则打开的页面多了所有请求都会排队。
+    """
+    return max(0, threads - max(2, threads // 4))
+
+
+def serve(app, port, config, on_shutdown=(), on_bound=None):
+    """
+    按配置启动服务器并阻塞，直到服务器停止。
+
+    Args:
+        app: WSGI 应用
+        port (int): 端口，0 表示由系统分配
+        config (dict): load_server_config 的返回值
+        on_shutdown: 开始退出时依次调用的函数（例如关闭事件流，让长连接尽快结束）
+        on_bound: 监听套接字绑定后、开始接受请求前以实际端口号调用的函数
+            （端口为 0 时由此得知系统分配的端口，不必先探测再重新绑定）
+    """
+    host = config['host']
+    if host not in ('127.0.0.1', 'localhost', '::1'):
+        logging.warning(f"服务器监听 {host}:{port}，局域网内的其他设备可以访问")
+
+    if config['mode'] == SERVER_DEV:
+        # 与 app.run(debug=False, use_reloader=False) 相同的多线程开发服务器
+        server = make_server(host, port, app, threaded=True)
+        port = server.server_port
+        logging.info(f"使用开发服务器: {host}:{port}")
+        if on_bound is not None:
+            on_bound(port)
+        # serve_forever 捕获 KeyboardInterrupt 后关闭监听套接字
+        server.serve_forever()
+        return
+
+    try:
+        import waitress
+    except ImportError:
+        waitress = None
+
+    if waitress is not None:
+        # waitress 的超时以整秒计；连接空闲、请求读取中途或响应发送中途对方无响应都由
+        # channel_timeout 控制，每 cleanup_interval 秒检查一次
+        channel_timeout = max(1, math.ceil(config['keepalive_timeout']))
+        if config['request_timeout'] != channel_timeout:
+            logging.info(f"waitress 不单独支持 request_timeout，无响应的连接统一在 {channel_timeout} 秒后断开"
+                         "（keepalive_timeout）")
+        server = waitress.create_server(
+            app, host=host, port=port,
+            threads=config['threads'],
+            connection_limit=config['connection_limit'],
+            backlog=config['backlog'],
+            channel_timeout=channel_timeout,
+            cleanup_interval=channel_timeout,
+            ident='RollCallPy',
+            _dispatcher=_waitress_dispatcher(config['threads'], config['shutdown_timeout']),
+        )
+        port = server.effective_port
+        logging.info(f"使用 waitress 服务器: {host}:{port}，{config['threads']} 个工作线程")
+        if on_bound is not None:
+            on_bound(port)
+        restore = _install_signal_handlers(on_shutdown)
+        try:
+            # waitress 在 run() 中捕获 KeyboardInterrupt，停止接受新连接，
+            # 并等待工作线程完成当前请求（最多 shutdown_timeout 秒）后返回
+            server.run()
+        finally:
+            restore()
+        return
+
+    server = PooledWSGIServer(host, port, app, config)
+    port = server.server_port
+    logging.info(f"使用线程池服务器: {host}:{port}，{config['threads']} 个工作线程")
+    if on_bound is not None:
+        on_bound(port)
+    restore = _install_signal_handlers(on_shutdown)
+    try:
+        # serve_forever 捕获 KeyboardInterrupt 后关闭监听套接字
+        server.serve_forever()
+    finally:
+        server.drain(config['shutdown_timeout'])
+        restore()
+
+
+def _waitress_dispatcher(threads, shutdown_timeout):
+    """waitress 的工作线程池，退出时等待 shutdown_timeout 秒（waitress 默认固定为 5 秒）"""
+    from waitress.task import ThreadedTaskDispatcher
+
+    class Dispatcher(ThreadedTaskDispatcher):
+        def shutdown(self, cancel_pending=True, timeout=None):
+            return super().shutdown(cancel_pending, shutdown_timeout if timeout is None else timeout)
+
+    dispatcher = Dispatcher()
+    dispatcher.set_thread_count(threads)
+    return dispatcher
+
+
+def _install_signal_handlers(on_shutdown):
+    """
+    把 SIGINT/SIGTERM 转换为 KeyboardInterrupt（服务器据此停止接受新连接），
+    并在此之前执行 on_shutdown 回调。
+
+    Returns:
+        function: 恢复原来的信号处理函数
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return lambda: None
+    stopping = threading.Event()
+
+    def handler(signum, frame):
+        if not stopping.is_set():
+            stopping.set()
+            logging.info("收到退出信号，停止接受新连接并等待处理中的请求完成...")
+            for callback in on_shutdown:
+                try:
+                    callback()
+                except Exception as e:
+                    logging.error(f"退出回调执行失败: {str(e)}")
+        # 第二次收到信号时同样抛出，中断等待直接退出
+        raise KeyboardInterrupt
+
+    signals = [signal.SIGINT]
+    if hasattr(signal, 'SIGTERM'):
+        signals.append(signal.SIGTERM)
+    previous = {sig: signal.signal(sig, handler) for sig in signals}
+
+    def restore():
+        for sig, old_handler in previous.items():
+            signal.signal(sig, old_handler)
+    return restore
+
+
+# ---------------------------------------------------------------------------
+# 内置线程池服务器（未安装 waitress 时使用）
+# ---------------------------------------------------------------------------
+
+_SERVICE_UNAVAILABLE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain; charset=utf-8\r\n"
+    b"Content-Length: 19\r\n"
+    b"Connection: close\r\n\r\n"
+    b"Service Unavailable"
+)
+
+
+class _PooledRequestHandler(WSGIRequestHandler):
+    """
+    线程池服务器的请求处理器。使用 HTTP/1.1 以便流式响应（事件流）采用分块传输；
+    Werkzeug 在每个响应后都会关闭连接。
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def handle_one_request(self):
+        server = self.server
+        if not server.wait_for_request(self):
+            self.close_connection = True
+            return
+        self.connection.settimeout(server.config['request_timeout'])
+        super().handle_one_request()
+        if server.draining:
+            self.close_connection = True
+
+    def log_request(self, code='-', size='-'):
+        # 请求日志由应用自己记录
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    固定大小线程池的 WSGI 服务器。
+
+    与 Werkzeug 开发服务器（每个连接一个新线程）不同，连接交给固定数量的工作线程处理，
+    超过 connection_limit 的连接直接返回 503；退出时先断开还没有发来请求的连接，
+    再等待正在处理的请求完成。
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, config):
+        self.config = config
+        self.request_queue_size = config['backlog']
+        self.draining = False
+        self._executor = ThreadPoolExecutor(max_workers=config['threads'],
+                                            thread_name_prefix='rollcall-worker')
+        self._slots = threading.BoundedSemaphore(config['connection_limit'])
+        self._connections = {}      # 处理中的连接 -> 是否空闲（等待下一个请求）
+        self._connections_lock = threading.Lock()
+        super().__init__(host, port, app, handler=_PooledRequestHandler)
+
+    def process_request(self, request, client_address):
+        if self.draining or not self._slots.acquire(blocking=False):
+            try:
+                request.sendall(_SERVICE_UNAVAILABLE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        with self._connections_lock:
+            self._connections[request] = False
+        self._executor.submit(self._process_connection, request, client_address)
+
+    def _process_connection(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self._connections_lock:
+                self._connections.pop(request, None)
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def wait_for_request(self, handler):
+        """
+        在 request_timeout 内等待请求数据到达（等待期间的连接视为空闲，退出时可以直接断开）。
+
+        Returns:
+            bool: 有请求需要处理时返回 True；超时、对方关闭或服务器正在退出时返回 False
+        """
+        connection = handler.connection
+        with self._connections_lock:
+            draining = self.draining
+            if not draining:
+                self._connections[connection] = True
+        try:
+            # 退出过程中只处理已经到达的请求，不再等待
+            connection.settimeout(0 if draining else self.config['request_timeout'])
+            return bool(handler.rfile.peek(1))
+        except (OSError, ValueError):
+            return False
+        finally:
+            with self._connections_lock:
+                if connection in self._connections:
+                    self._connections[connection] = False
+
+    def drain(self, timeout):
+        """
+        停止接受连接后调用：断开空闲连接，等待处理中的请求完成，最多等待 timeout 秒。
+
+        Returns:
+            bool: 所有请求都已完成时返回 True
+        """
+        with self._connections_lock:
+            self.draining = True
+            idle = [conn for conn, is_idle in self._connections.items() if is_idle]
+        for connection in idle:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._connections_lock:
+                remaining = len(self._connections)
+            if not remaining:
+                break
+            if time.monotonic() >= deadline:
+                logging.warning(f"等待超时，仍有 {remaining} 个连接未处理完成")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                return False
+            time.sleep(0.05)
+        self._executor.shutdown(wait=True)
+        logging.info("所有请求已处理完成，服务器已停止")
+        return True
@@ -0,0 +1,367 @@
+"""
+点名策略的蒙特卡洛模拟。
+
+模拟一整个学期的点名（例如 40 个班级共 10^7 次），统计各策略的公平性：
+
+- 每位学生被点到的次数（与期望次数的偏差）
+- 最长间隔：某位学生连续多少次点名都没有被点到（包括学期开始前和结束后的部分）
+- 重复率：连续两次点到同一人的比例
+
+安装了 NumPy 时按下标数组批量模拟，规则与 picker.py 完全相同：random 一次生成整段抽取；
+shuffle_bag 按轮生成随机排列，新一轮的第一位与上一轮最后一位相同时与本轮随机一位交换
+（等价于点名引擎中的回避规则）；weighted 的权重同样是 WEIGHT_SCALE // (次数 + 1)，
+用等价的指数时钟模型一次生成整段序列（见 _weighted_chunks）。未安装 NumPy 时逐次调用点名引擎的 draw_from_state，
+结果的分布相同但慢得多。各策略、各组班级分到多个进程并行模拟。
+
+用法:
+    python simulate.py --rosters 40 --size 40 --draws 10000000
+    python simulate.py --strategies weighted,shuffle_bag --size 25-45 --workers 4 --seed 1
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from picker import STRATEGIES, STRATEGY_SHUFFLE_BAG, STRATEGY_WEIGHTED, WEIGHT_SCALE, _ClassPickState, draw_from_state
+
+try:
+    import numpy as np    # 可选依赖：pip install numpy
+except ImportError:
+    np = None
+
+CHUNK_DRAWS = 1 << 18       # 每个班级每批模拟的次数，限制内存占用
+
+
+def numpy_available():
+    return np is not None
+
+
+# ---------------------------------------------------------------------------
+# 统计
+# ---------------------------------------------------------------------------
+
+class _RosterStats:
+    """单个班级的抽取序列（槽位下标）的流式统计，可以分批加入"""
+
+    def __init__(self, size):
+        self.size = size
+        self.draws = 0
+        self.repeats = 0
+        self.max_gap = 0
+        self.prev = -1
+        if np is not None:
+            self.counts = np.zeros(size, dtype=np.int64)
+            self.last_seen = np.full(size, -1, dtype=np.int64)
+        else:
+            self.counts = [0] * size
+            self.last_seen = [-1] * size
+
+    def add(self, seq):
+        if not len(seq):
+            return
+        if np is not None:
+            self._add_array(np.asarray(seq))
+        else:
+            self._add_list(seq)
+        self.draws += len(seq)
+
+    def _add_array(self, seq):
+        positions = np.arange(self.draws, self.draws + len(seq))
+        order = np.argsort(seq, kind='stable')
+        slots, positions = seq[order], positions[order]
+        # 按学生排序后，相邻且属于同一学生的两次抽取之间就是一段间隔
+        first = np.ones(len(slots), dtype=bool)
+        first[1:] = slots[1:] != slots[:-1]
+        inner = (positions[1:] - positions[:-1] - 1)[~first[1:]]
+        leading = positions[first] - self.last_seen[slots[first]] - 1
+        self.max_gap = max(self.max_gap, int(inner.max(initial=0)), int(leading.max(initial=0)))
+        last = np.ones(len(slots), dtype=bool)
+        last[:-1] = first[1:]
+        self.last_seen[slots[last]] = positions[last]
+
+        self.counts += np.bincount(seq, minlength=self.size)
+        self.repeats += int(np.count_nonzero(seq[1:] == seq[:-1])) + int(seq[0] == self.prev)
+        self.prev = int(seq[-1])
+
+    def _add_list(self, seq):
+        position = self.draws
+        for slot in seq:
+            gap = position - self.last_seen[slot] - 1
+            if gap > self.max_gap:
+                self.max_gap = gap
+            self.last_seen[slot] = position
+            self.counts[slot] += 1
+            if slot == self.prev:
+                self.repeats += 1
+            self.prev = slot
+            position += 1
+
+    def result(self):
+        # 最后一次被点到之后直到学期结束的部分也算作间隔
+        trailing = max(self.draws - 1 - int(last) for last in self.last_seen)
+        return {
+            'size': self.size,
+            'draws': self.draws,
+            'counts': [int(c) for c in self.counts],
+            'max_gap': max(self.max_gap, trailing),
+            'repeats': self.repeats,
+        }
+
+
+def summarize(strategy, rosters, elapsed):
+    """
+    汇总各班级的统计。
+
+    Returns:
+        dict: 被点次数与期望次数之比的最小/最大值和变异系数、最长间隔、重复率、单进程吞吐量
+    """
+    draws = sum(r['draws'] for r in rosters)
+    ratios = []
+    for r in rosters:
+        expected = r['draws'] / r['size']
+        ratios.extend(c / expected for c in r['counts'])
+    mean = sum(ratios) / len(ratios)
+    variance = sum((x - mean) ** 2 for x in ratios) / len(ratios)
+    gaps = [r['max_gap'] for r in rosters]
+    pairs = sum(r['draws'] - 1 for r in rosters)
+    return {
+        'strategy': strategy,
+        'rosters': len(rosters),
+        'students': sum(r['size'] for r in rosters),
+        'draws': draws,
+        'picks_min': min(min(r['counts']) for r in rosters),
+        'picks_max': max(max(r['counts']) for r in rosters),
+        'ratio_min': round(min(ratios), 4),
+        'ratio_max': round(max(ratios), 4),
+        'cv': round(variance ** 0.5 / mean, 6),
+        'longest_gap': max(gaps),
+        'longest_gap_mean': round(sum(gaps) / len(gaps), 1),
+        'longest_gap_per_size': round(max(g / r['size'] for g, r in zip(gaps, rosters)), 2),
+        'repeat_rate': round(sum(r['repeats'] for r in rosters) / pairs, 6) if pairs else 0.0,
+        'seconds': round(elapsed, 3),
+        'throughput': round(draws / elapsed) if elapsed else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 批量模拟（NumPy）
+# ---------------------------------------------------------------------------
+
+def _random_chunks(size, draws, rng):
+    for start in range(0, draws, CHUNK_DRAWS):
+        yield rng.integers(0, size, min(CHUNK_DRAWS, draws - start))
+
+
+def _shuffle_bag_chunks(size, draws, rng):
+    """每轮一个随机排列；新一轮的第一位与上一轮最后一位相同时，与本轮其他位置中随机的一位交换"""
+    last = -1
+    rounds_per_chunk = max(1, CHUNK_DRAWS // size)
+    done = 0
+    while done < draws:
+        rounds = min(rounds_per_chunk, -(-(draws - done) // size))
+        bags = np.argsort(rng.random((rounds, size)), axis=1)
+        if size > 1:
+            # 交换只在交换到本轮最后一位时影响下一轮的判断，按顺序处理这些少数的轮
+            clashes = np.flatnonzero(bags[:, 0] == np.concatenate(([last], bags[:-1, -1])))
+            pending = list(clashes[::-1])
+            swaps = rng.integers(1, size, len(pending) + rounds)
+            used = 0
+            while pending:
+                r = pending.pop()
+                previous = bags[r - 1, -1] if r else last
+                if bags[r, 0] != previous:
+                    continue
+                j = swaps[used]
+                used += 1
+                bags[r, 0], bags[r, j] = bags[r, j], bags[r, 0]
+                if j == size - 1 and r + 1 < rounds and (not pending or pending[-1] != r + 1):
+                    pending.append(r + 1)
+        last = bags[-1, -1]
+        seq = bags.ravel()[:draws - done]
+        done += len(seq)
+        yield seq
+
+
+def _weighted_chunks(size, draws, rng):
+    """
+    按"竞争的指数时钟"批量生成加权抽取序列。
+
+    每位学生的权重只在他自己被点到时改变（第 k 次之后为 WEIGHT_SCALE // (k + 1)），
+    所以逐次加权抽取等价于：每位学生有一只时钟，第 k 次响铃到第 k+1 次响铃的间隔服从速率为
+    第 k 次之后权重的指数分布，所有时钟的响铃按时间排序就是点名顺序
+    （下一个响铃的是 i 的概率正好是 i 的权重占总权重的比例，其余时钟无记忆）。
+    这样每位学生的响铃时间可以用一次累加求出，不需要逐次抽取。
+    """
+    generated = 0                               # 每位学生已生成的响铃次数
+    clocks = np.zeros(size)                     # 每位学生最后一次已生成的响铃时间
+    pending_times, pending_slots = np.empty(0), np.empty(0, dtype=np.int64)
+    done = 0
+    while done < draws:
+        # 每批按剩余次数的平均值多生成一些，被点次数略多于平均的学生通常也够用，不够时再生成下一批
+        per_student = min(CHUNK_DRAWS, draws - done) // size * 9 // 8 + 16
+        students = np.repeat(np.arange(size), per_student)
+        picks = generated + np.arange(per_student)
+        rates = np.maximum(1, WEIGHT_SCALE // (picks + 1)).astype(float)
+        times = clocks[:, None] + np.cumsum(rng.standard_exponential((size, per_student)) / rates, axis=1)
+        clocks = times[:, -1]
+        generated += per_student
+        # 早于所有学生最后一次已生成响铃的时间，顺序已经确定
+        horizon = clocks.min()
+        all_times = np.concatenate((pending_times, times.ravel()))
+        all_slots = np.concatenate((pending_slots, students))
+        ready = all_times < horizon
+        order = np.argsort(all_times[ready])
+        seq = all_slots[ready][order][:draws - done]
+        pending_times, pending_slots = all_times[~ready], all_slots[~ready]
+        done += len(seq)
+        yield seq
+
+
+def _simulate_numpy(strategy, sizes, draws, seed):
+    rng = np.random.default_rng(list(seed))
+    chunks = {
+        STRATEGY_SHUFFLE_BAG: _shuffle_bag_chunks,
+        STRATEGY_WEIGHTED: _weighted_chunks,
+    }.get(strategy, _random_chunks)
+    stats = [_RosterStats(size) for size in sizes]
+    for roster in stats:
+        for seq in chunks(roster.size, draws, rng):
+            roster.add(seq)
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# 逐次模拟（点名引擎的 draw_from_state）
+# ---------------------------------------------------------------------------
+
+def _simulate_engine(strategy, sizes, draws, seed):
+    rng = random.Random('-'.join(map(str, seed)))
+    stats = []
+    for size in sizes:
+        state = _ClassPickState(strategy)
+        state.rebuild(range(size))      # 以槽位下标作为学生名
+        roster = _RosterStats(size)
+        for start in range(0, draws, CHUNK_DRAWS):
+            roster.add([draw_from_state(state, rng, 1)[0] for _ in range(min(CHUNK_DRAWS, draws - start))])
+        stats.append(roster)
+    return stats
+
+
+def simulate_rosters(strategy, sizes, draws, seed, use_numpy=True):
+    """
+    模拟一组班级各 draws 次点名（在工作进程中执行）。
+
+    Args:
+        seed (tuple): 整数元组（总种子、策略序号、分组序号），每个任务的随机序列互不相关
+
+    Returns:
+        tuple: (每个班级的统计, 用时秒数)
+    """
+    started = time.perf_counter()
+    simulate = _simulate_numpy if use_numpy and np is not None else _simulate_engine
+    stats = simulate(strategy, sizes, draws, seed)
+    return [roster.result() for roster in stats], time.perf_counter() - started
+
+
+# ---------------------------------------------------------------------------
+# 任务划分与命令行
+# ---------------------------------------------------------------------------
+
+def parse_size(text):
+    """解析班级人数：40 或 25-45（每个班级在范围内随机）"""
+    low, _, high = text.partition('-')
+    low, high = int(low), int(high or low)
+    if not 1 <= low <= high:
+        raise ValueError(f"无效的班级人数: {text}")
+    return low, high
+
+
+def run(strategies, sizes, draws_per_roster, workers, seed, use_numpy=True):
+    """
+    模拟各个策略，每个策略的班级平均分成 workers 组，各组在独立的进程中模拟。
+
+    Returns:
+        tuple: (各策略的汇总, 总用时秒数)
+    """
+    groups = max(1, min(workers, len(sizes)))
+    tasks = []
+    for s, strategy in enumerate(strategies):
+        for g in range(groups):
+            group = sizes[g::groups]
+            if group:
+                tasks.append((strategy, group, draws_per_roster, (seed, s, g), use_numpy))
+
+    started = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outputs = list(executor.map(simulate_rosters, *zip(*tasks)))
+    else:
+        outputs = [simulate_rosters(*task) for task in tasks]
+    elapsed = time.perf_counter() - started
+
+    results = []
+    for strategy in strategies:
+        rosters, seconds = [], 0.0
+        for task, (stats, task_seconds) in zip(tasks, outputs):
+            if task[0] == strategy:
+                rosters.extend(stats)
+                seconds += task_seconds
+        results.append(summarize(strategy, rosters, seconds))
+    return results, elapsed
+
+
+def _print_results(results, elapsed):
+    print(f"{'策略':<12}{'被点次数/期望':>16}{'变异系数':>10}{'最长间隔':>10}{'间隔/人数':>10}"
+          f"{'重复率':>10}{'单进程 次/秒':>16}")
+    for r in results:
+        print(f"{r['strategy']:<14}{r['ratio_min']:>8.3f}~{r['ratio_max']:<8.3f}{r['cv']:>12.5f}"
+              f"{r['longest_gap']:>12}{r['longest_gap_per_size']:>12.2f}{r['repeat_rate']:>12.5f}"
+              f"{r['throughput'] or 0:>16,}")
+    total = sum(r['draws'] for r in results)
+    print(f"\n共模拟 {total:,} 次，用时 {elapsed:.2f} 秒（{total / elapsed:,.0f} 次/秒）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='点名策略的蒙特卡洛模拟')
+    parser.add_argument('--strategies', default=','.join(STRATEGIES),
+                        help=f"要比较的策略，逗号分隔（默认 {','.join(STRATEGIES)}）")
+    parser.add_argument('--rosters', type=int, default=40, help='班级数（默认 40）')
+    parser.add_argument('--size', default='40', help='每班人数，如 40 或 25-45（默认 40）')
+    parser.add_argument('--draws', type=int, default=10_000_000, help='每种策略在所有班级上的总点名次数（默认 10^7）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行的进程数（默认 CPU 核数）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认 0，相同参数得到相同结果）')
+    parser.add_argument('--engine', action='store_true', help='不使用 NumPy，逐次调用点名引擎（用于核对结果）')
+    parser.add_argument('--output', help='把结果保存为 JSON 文件')
+    args = parser.parse_args(argv)
+
+    strategies = [s.strip() for s in args.strategies.split(',') if s.strip()]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        parser.error(f"未知的点名策略: {', '.join(unknown)}")
+    try:
+        low, high = parse_size(args.size)
+    except ValueError as e:
+        parser.error(str(e))
+    size_rng = random.Random(args.seed)
+    sizes = [size_rng.randint(low, high) for _ in range(args.rosters)]
+    draws_per_roster = max(1, args.draws // args.rosters)
+    use_numpy = np is not None and not args.engine
+
+    mode = 'NumPy 批量模拟' if use_numpy else '逐次调用点名引擎'
+    print(f"{len(strategies)} 种策略 × {args.rosters} 个班级（每班 {args.size} 人），"
+          f"每班 {draws_per_roster:,} 次；{mode}，{args.workers} 个进程\n")
+    results, elapsed = run(strategies, sizes, draws_per_roster, args.workers, args.seed, use_numpy)
+    _print_results(results, elapsed)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'seconds': round(elapsed, 3), 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
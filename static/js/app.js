@@ -0,0 +1,1323 @@
+// 全局变量
+let students = [];
+let rosterVersion = null;   // 本地名单对应的服务器版本号，用于增量同步
+let rosterTotal = 0;        // 服务器名单总人数（分页加载完成前可能大于 students.length）
+let rosterLoading = null;   // 正在进行的名单加载，同一时间只有一个
+let reloadRequested = false; // 加载期间又收到了变更，加载完成后再同步一次
+let clientId = null;        // 事件通道分配的客户端 ID，用于识别自己发起的点名
+let audioContext = null;
+let audioUnlocked = false;
+let currentCard = null;
+
+const randomBtn = document.getElementById('randomBtn');
+const nameDisplay = document.getElementById('nameDisplay');
+const studentList = document.getElementById('studentList');
+const studentListContainer = document.getElementById('studentListContainer');
+const newStudent = document.getElementById('newStudent');
+const addStudentBtn = document.getElementById('addStudentBtn');
+const rollSound = document.getElementById('rollSound');
+const selectSound = document.getElementById('selectSound');
+const clickSound = document.getElementById('clickSound');
+const resultCard = document.querySelector('.result-card');
+const cardsContainer = document.getElementById('cardsContainer');
+
+// 音效加载状态
+let soundsLoaded = {
+    roll: false,
+    select: false,
+    click: false
+};
+
+// 音效错误处理
+rollSound.addEventListener('canplaythrough', () => {
+    console.log('Roll sound loaded');
+    soundsLoaded.roll = true;
+});
+selectSound.addEventListener('canplaythrough', () => {
+    console.log('Select sound loaded');
+    soundsLoaded.select = true;
+});
+clickSound.addEventListener('canplaythrough', () => {
+    console.log('Click sound loaded');
+    soundsLoaded.click = true;
+});
+
+// 预先强制加载音频文件
+function preloadAudio() {
+    [rollSound, selectSound, clickSound].forEach(sound => {
+        // 设置音量为0并尝试播放以促使加载
+        sound.volume = 0;
+        sound.load();
+
+        // 添加错误监听器
+        sound.addEventListener('error', (e) => {
+            console.error(`音效加载失败 ${sound.id}:`, e);
+            // 尝试重新加载
+            setTimeout(() => {
+                sound.load();
+            }, 1000);
+        });
+    });
+}
+
+// 解锁音频 - 用户首次交互时调用
+function unlockAudio() {
+    if (audioUnlocked) return Promise.resolve();
+
+    console.log('尝试解锁音频...');
+
+    // 创建音频上下文
+    try {
+        if (!audioContext) {
+            window.AudioContext = window.AudioContext || window.webkitAudioContext;
+            audioContext = new AudioContext();
+        }
+
+        // 恢复音频上下文
+        if (audioContext.state === 'suspended') {
+            audioContext.resume();
+        }
+    } catch (e) {
+        console.warn('创建AudioContext失败:', e);
+    }
+
+    // 尝试播放所有音频
+    const promises = [rollSound, selectSound, clickSound].map(sound => {
+        sound.volume = 0.1;  // 低音量
+
+        // 先暂停重置
+        sound.pause();
+        sound.currentTime = 0;
+
+        // 重新加载
+        sound.load();
+
+        // 尝试播放
+        const playPromise = sound.play();
+        if (playPromise !== undefined) {
+            return playPromise
+                .then(() => {
+                    sound.pause();
+                    sound.currentTime = 0;
+                    console.log(`音频 ${sound.id} 解锁成功`);
+                    return true;
+                })
+                .catch(e => {
+                    console.warn(`音频 ${sound.id} 解锁失败:`, e);
+                    return false;
+                });
+        }
+        return Promise.resolve(false);
+    });
+
+    return Promise.all(promises)
+        .then(results => {
+            const unlocked = results.some(r => r);
+            audioUnlocked = unlocked;
+            console.log('音频解锁状态:', audioUnlocked);
+
+            // 重置音量
+            [rollSound, selectSound, clickSound].forEach(sound => {
+                sound.volume = 1.0;
+            });
+
+            return unlocked;
+        });
+}
+
+// 安全地播放音效
+function playSound(sound) {
+    // 首先尝试解锁音频
+    if (!audioUnlocked) {
+        unlockAudio().then(() => attemptPlaySound(sound));
+    } else {
+        attemptPlaySound(sound);
+    }
+}
+
+// 尝试播放音效
+function attemptPlaySound(sound) {
+    // 检查音效对象存在并且有play方法
+    if (sound && typeof sound.play === 'function') {
+        try {
+            // 重置播放位置
+            sound.pause();
+            sound.currentTime = 0;
+
+            // 确保音量合适
+            if (sound === rollSound) {
+                sound.volume = 0.5;
+            } else {
+                sound.volume = 1.0;
+            }
+
+            // 尝试播放
+            const playPromise = sound.play();
+
+            if (playPromise !== undefined) {
+                playPromise.catch(error => {
+                    console.warn(`播放音效 '${sound.id}' 失败:`, error.message);
+
+                    // 如果是自动播放策略问题，再次尝试解锁并播放
+                    if (error.name === 'NotAllowedError') {
+                        console.info("自动播放受限，尝试再次解锁");
+                        unlockAudio().then(() => {
+                            setTimeout(() => attemptPlaySound(sound), 100);
+                        });
+                    }
+                });
+            }
+        } catch (error) {
+            console.warn(`播放音效 '${sound.id}' 出错:`, error);
+        }
+    } else {
+        console.warn('无效的音效对象:', sound);
+    }
+}
+
+// 创建五彩纸屑效果
+function createConfetti() {
+    const colors = [
+        '#ff0000', '#00ff00', '#0000ff', '#ffff00', '#ff00ff',
+        '#00ffff', '#ff4500', '#8a2be2', '#ff1493', '#32cd32',
+        '#ffa500', '#9370db', '#3cb371', '#ff6347', '#7fffd4',
+        '#f08080', '#ffd700', '#da70d6', '#20b2aa', '#87cefa'
+    ];
+
+    const shapes = ['confetti-rectangle', 'confetti-square', 'confetti-circle', 'confetti-star'];
+
+    // 清除之前的彩带
+    document.querySelectorAll('.confetti').forEach(el => el.remove());
+
+    const containerWidth = window.innerWidth;
+    const containerHeight = window.innerHeight;
+    const confettiCount = 250; // 适当调整数量
+
+    for (let i = 0; i < confettiCount; i++) {
+        const confetti = document.createElement('div');
+        confetti.className = 'confetti';
+
+        // 随机形状
+        const shape = shapes[Math.floor(Math.random() * shapes.length)];
+        confetti.classList.add(shape);
+
+        // 随机样式
+        const color = colors[Math.floor(Math.random() * colors.length)];
+        const scale = Math.random() * 0.8 + 0.5; // 0.5 - 1.3
+        const rotation = Math.random() * 360;
+
+        // 为星星形状设置边框颜色
+        if (shape === 'confetti-star') {
+            confetti.style.borderBottomColor = color;
+        } else {
+            confetti.style.backgroundColor = color;
+        }
+
+        // 设置初始样式
+        confetti.style.transform = `scale(${scale}) rotate(${rotation}deg)`;
+        confetti.style.opacity = '1'; // Start fully visible
+
+        // 初始位置 - 主要从左右两侧和顶部发射
+        const startDistribution = Math.random();
+        let startX, startY;
+        const launchPower = 5 + Math.random() * 15; // 初始向上/向内的速度
+        let initialVelocityX, initialVelocityY;
+
+        if (startDistribution < 0.4) {
+            // 从顶部发射 (左右40%区域)
+            startX = containerWidth * 0.3 + Math.random() * containerWidth * 0.4;
+            startY = -30;
+            initialVelocityX = Math.random() * 10 - 5; // Slight horizontal spread
+            initialVelocityY = launchPower * 0.5 + Math.random() * 5; // Upward boost
+        } else if (startDistribution < 0.7) {
+             // 从左侧发射 (上半部分)
+            startX = -30;
+            startY = Math.random() * containerHeight * 0.6;
+            initialVelocityX = launchPower + Math.random() * 10; // Strong inward push
+            initialVelocityY = Math.random() * 6 - 3; // Slight vertical drift
+        } else {
+            // 从右侧发射 (上半部分)
+            startX = containerWidth + 30;
+            startY = Math.random() * containerHeight * 0.6;
+            initialVelocityX = -launchPower - Math.random() * 10; // Strong inward push
+            initialVelocityY = Math.random() * 6 - 3; // Slight vertical drift
+        }
+
+        confetti.style.left = `${startX}px`;
+        confetti.style.top = `${startY}px`;
+
+        // 物理参数
+        const gravity = 0.08 + Math.random() * 0.06; // Slightly stronger gravity for falling feel
+        const drag = 0.96 + Math.random() * 0.03; // Air resistance
+        const rotationSpeed = (Math.random() - 0.5) * 15; // Random rotation speed and direction
+        const lifespan = 3.5 + Math.random() * 3; // 3.5 - 6.5 seconds lifespan
+        const delay = Math.random() * 0.8; // Increased delay for staggered effect
+
+        // 使用JS动画循环更新位置和旋转
+        let currentX = startX;
+        let currentY = startY;
+        let velX = initialVelocityX;
+        let velY = initialVelocityY;
+        let currentRotation = rotation;
+        let startTime = Date.now() + delay * 1000;
+        let elapsed = 0;
+
+        function animateConfetti() {
+            const now = Date.now();
+            if (now < startTime) { // Handle delay
+                requestAnimationFrame(animateConfetti);
+                return;
+            }
+            elapsed = (now - startTime) / 1000;
+
+            if (elapsed > lifespan) {
+                if (confetti.parentNode) confetti.remove();
+                return;
+            }
+
+            // Update velocity
+            velX *= drag;
+            velY = velY * drag + gravity * 10; // Apply gravity
+
+            // Update position
+            currentX += velX;
+            currentY += velY;
+
+            // Update rotation
+            currentRotation += rotationSpeed;
+
+            // Update opacity (fade out towards the end)
+            const opacity = Math.max(0, 1 - (elapsed / lifespan)); 
+
+            // Apply transform and opacity
+            confetti.style.transform = `translate(${currentX - startX}px, ${currentY - startY}px) scale(${scale}) rotate(${currentRotation}deg)`;
+            confetti.style.opacity = opacity;
+
+            requestAnimationFrame(animateConfetti);
+        }
+
+        document.body.appendChild(confetti);
+        // Start the animation after a delay
+        setTimeout(() => requestAnimationFrame(animateConfetti), delay * 1000);
+
+        // Safety removal after max time
+        setTimeout(() => {
+            if(confetti.parentNode) confetti.remove();
+        }, (lifespan + delay + 1) * 1000);
+    }
+}
+
+// 分页加载：先取第一页尽快显示，其余部分在后台按页补齐
+const FIRST_PAGE_SIZE = 200;
+const PAGE_SIZE = 2000;
+const MAX_PAGED_ATTEMPTS = 3;
+
+// 加载学生名单：已有版本号时只获取之后的变更，名单未变化时服务器返回 304。
+// 加载过程中再次调用不会并发请求，而是在当前加载完成后再同步一次。
+function loadStudents() {
+    if (rosterLoading) {
+        reloadRequested = true;
+        return rosterLoading;
+    }
+    rosterLoading = (async () => {
+        try {
+            do {
+                reloadRequested = false;
+                await syncStudents();
+            } while (reloadRequested);
+        } catch (error) {
+            console.error('加载学生名单失败:', error);
+        } finally {
+            rosterLoading = null;
+        }
+    })();
+    return rosterLoading;
+}
+
+async function syncStudents() {
+    if (rosterVersion === null) {
+        await loadAllStudents();
+        return;
+    }
+
+    const response = await fetch(`/api/students?since=${encodeURIComponent(rosterVersion)}`, {
+        headers: { 'If-None-Match': `"v${rosterVersion}"` }
+    });
+    if (response.status === 304) {
+        return;
+    }
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || '加载失败');
+    }
+    rosterVersion = String(data.version);
+    if (data.full) {
+        students = data.students;
+        rosterTotal = students.length;
+    } else if (data.changes.length === 0) {
+        return;
+    } else {
+        applyRosterChanges(data.changes);
+    }
+    updateStudentList();
+}
+
+async function fetchStudentPage(offset, limit) {
+    const response = await fetch(`/api/students?offset=${offset}&limit=${limit}`);
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || '加载失败');
+    }
+    return data;
+}
+
+// 首次加载：逐页获取完整名单；中途名单被修改（版本号变化）时从头重来，
+// 多次失败后退回一次性获取全量名单
+async function loadAllStudents() {
+    for (let attempt = 0; attempt < MAX_PAGED_ATTEMPTS; attempt++) {
+        const first = await fetchStudentPage(0, FIRST_PAGE_SIZE);
+        students = first.students;
+        rosterTotal = first.total;
+        updateStudentList();
+
+        let consistent = true;
+        while (students.length < rosterTotal) {
+            const page = await fetchStudentPage(students.length, PAGE_SIZE);
+            if (page.version !== first.version || page.students.length === 0) {
+                consistent = false;
+                break;
+            }
+            students.push(...page.students);
+            updateStudentList();
+        }
+        if (consistent) {
+            rosterVersion = String(first.version);
+            return;
+        }
+    }
+
+    const response = await fetch('/api/students');
+    students = await response.json();
+    rosterTotal = students.length;
+    rosterVersion = response.headers.get('X-Roster-Version');
+    updateStudentList();
+}
+
+// 把服务器返回的增量变更应用到本地名单
+function applyRosterChanges(changes) {
+    changes.forEach(change => {
+        if (change.op === 'add') {
+            if (!students.includes(change.name)) {
+                students.push(change.name);
+                enteringNames.add(change.name);
+            }
+        } else if (change.op === 'del') {
+            const index = students.indexOf(change.name);
+            if (index !== -1) {
+                students.splice(index, 1);
+            }
+        } else if (change.op === 'ren') {
+            const index = students.indexOf(change.name);
+            if (index !== -1) {
+                students[index] = change.new;
+                renameStudentRow(change.name, change.new);
+            }
+        }
+    });
+    rosterTotal = students.length;
+}
+
+const EVENTS_RETRY_DELAY = 30000;   // 事件流被拒绝后重新连接的间隔，与服务端的 Retry-After 一致
+
+// 连接实时事件通道：其他页面的名单修改和点名结果会推送过来
+function connectEvents() {
+    if (!window.EventSource) return;
+    const source = new EventSource('/api/events');
+
+    source.addEventListener('hello', event => {
+        clientId = JSON.parse(event.data).client_id;
+        // 断线重连后补齐期间错过的变更
+        if (rosterVersion !== null) {
+            loadStudents();
+        }
+    });
+    source.addEventListener('roster', event => applyRosterEvent(JSON.parse(event.data)));
+    source.addEventListener('resync', () => loadStudents());
+    source.addEventListener('pick', event => {
+        const data = JSON.parse(event.data);
+        if (data.origin && data.origin === clientId) return;
+        showRemotePick(data.names[0]);
+    });
+    source.addEventListener('error', () => {
+        // 连接数已满（503）等非正常响应时浏览器不再自动重连，稍后重新连接
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(connectEvents, EVENTS_RETRY_DELAY);
+        }
+    });
+}
+
+// 应用推送的名单变更；版本号不连续（漏掉了事件）时改为增量同步
+function applyRosterEvent(change) {
+    if (rosterVersion === null) {
+        // 首次加载尚未完成，加载完成后按版本号补齐
+        if (rosterLoading) reloadRequested = true;
+        return;
+    }
+    const current = Number(rosterVersion);
+    if (change.version <= current) return;
+    if (change.op === 'reset' || change.version !== current + 1) {
+        loadStudents();
+        return;
+    }
+    applyRosterChanges([change]);
+    rosterVersion = String(change.version);
+    updateStudentList();
+}
+
+// 显示其他页面的点名结果（本页正在点名时忽略）
+function showRemotePick(name) {
+    if (!name || randomBtn.disabled) return;
+    randomBtn.disabled = true;
+    finalizeSelection(name);
+}
+
+// 名单以虚拟列表显示：只为可见区域（加上少量缓冲）创建行，行绝对定位到各自的位置，
+// 按名字复用已有的行，名单变化时只增删移动受影响的行
+const ROW_GAP = 8;              // 行间距，px
+const LIST_VIEWPORT = 400;      // 与 .collapsible-content 的 max-height 一致，折叠时也按此渲染
+const OVERSCAN_ROWS = 5;        // 可见区域上下额外渲染的行数
+const rowsByKey = new Map();    // 名字（未加载的占位行为 "\0序号"）-> 行元素
+const enteringNames = new Set(); // 新增的学生，创建行时播放进入动画
+let rowStride = 0;              // 行高 + 行间距，首次渲染时测量
+let renderScheduled = false;
+let initialRender = true;
+let rowTemplate = null;
+
+function createStudentRow(name) {
+    if (!rowTemplate) {
+        rowTemplate = document.createElement('div');
+        rowTemplate.className = 'student-item';
+        const nameSpan = document.createElement('span');
+        nameSpan.className = 'student-name';
+        nameSpan.contentEditable = 'true';
+        const actions = document.createElement('div');
+        actions.className = 'student-actions';
+        [['save', '✓', '保存'], ['cancel', '✗', '取消'], ['delete', '🗑️', '删除']].forEach(([action, icon, title]) => {
+            const button = document.createElement('button');
+            button.className = 'btn btn-ghost btn-icon';
+            button.dataset.action = action;
+            button.title = title;
+            button.textContent = icon;
+            actions.appendChild(button);
+        });
+        rowTemplate.append(nameSpan, actions);
+    }
+    const row = rowTemplate.cloneNode(true);
+    setRowName(row, name);
+    return row;
+}
+
+function createPlaceholderRow() {
+    const row = document.createElement('div');
+    row.className = 'student-item placeholder';
+    const nameSpan = document.createElement('span');
+    nameSpan.className = 'student-name';
+    nameSpan.textContent = '加载中…';
+    row.appendChild(nameSpan);
+    return row;
+}
+
+function setRowName(row, name) {
+    const nameSpan = row.querySelector('.student-name');
+    row.dataset.name = name;
+    nameSpan.dataset.original = name;
+    // 正在编辑的名字不覆盖用户输入
+    if (!nameSpan.hasAttribute('data-editing')) {
+        nameSpan.textContent = name;
+    }
+}
+
+// 改名时保留原来的行，只更新文字
+function renameStudentRow(oldName, newName) {
+    const row = rowsByKey.get(oldName);
+    if (!row) return;
+    rowsByKey.delete(oldName);
+    rowsByKey.set(newName, row);
+    setRowName(row, newName);
+}
+
+function measureRowStride() {
+    if (!rowStride) {
+        const probe = createStudentRow('测量');
+        probe.style.visibility = 'hidden';
+        studentList.appendChild(probe);
+        const height = probe.offsetHeight;
+        probe.remove();
+        if (height) {
+            rowStride = height + ROW_GAP;
+        }
+    }
+    return rowStride || 48 + ROW_GAP;
+}
+
+function scheduleRender() {
+    if (renderScheduled) return;
+    renderScheduled = true;
+    requestAnimationFrame(updateStudentList);
+}
+
+// 更新学生名单显示
+function updateStudentList() {
+    renderScheduled = false;
+    const total = Math.max(rosterTotal, students.length);
+    const stride = measureRowStride();
+    studentList.style.height = total ? `${total * stride - ROW_GAP}px` : '';
+
+    const scrollTop = studentListContainer.scrollTop;
+    const viewport = Math.max(studentListContainer.clientHeight, LIST_VIEWPORT);
+    const first = Math.max(0, Math.floor(scrollTop / stride) - OVERSCAN_ROWS);
+    const last = Math.min(total, Math.ceil((scrollTop + viewport) / stride) + OVERSCAN_ROWS);
+
+    const visible = new Set();
+    for (let i = first; i < last; i++) {
+        const loaded = i < students.length;
+        const key = loaded ? students[i] : `\0${i}`;
+        visible.add(key);
+        let row = rowsByKey.get(key);
+        if (!row) {
+            row = loaded ? createStudentRow(key) : createPlaceholderRow();
+            if (initialRender) {
+                row.classList.add('entering');
+                row.style.animationDelay = `${Math.min(i - first, 10) * 50}ms`;
+            } else if (enteringNames.has(key)) {
+                row.classList.add('entering');
+            }
+            rowsByKey.set(key, row);
+            studentList.appendChild(row);
+        }
+        const top = `${i * stride}px`;
+        if (row.style.top !== top) {
+            row.style.top = top;
+        }
+    }
+
+    rowsByKey.forEach((row, key) => {
+        if (visible.has(key)) return;
+        // 正在编辑的行滚出可见区域时保留，直到编辑结束或学生被删除
+        if (row.contains(document.activeElement) && students.includes(key)) return;
+        row.remove();
+        rowsByKey.delete(key);
+    });
+
+    if (total) {
+        initialRender = false;
+    }
+    enteringNames.clear();
+}
+
+// 名单区域唯一的事件处理函数：按钮点击、名字编辑和动画结束都委托到这里
+function handleStudentListEvent(e) {
+    const row = e.target.closest('.student-item');
+    if (!row || row.classList.contains('placeholder')) return;
+    const nameSpan = row.querySelector('.student-name');
+
+    switch (e.type) {
+        case 'click': {
+            const button = e.target.closest('button[data-action]');
+            if (!button) return;
+            if (button.dataset.action === 'save') {
+                saveEditedName(row);
+            } else if (button.dataset.action === 'cancel') {
+                cancelEditName(row);
+            } else if (button.dataset.action === 'delete') {
+                deleteStudent(row.dataset.name);
+            }
+            break;
+        }
+        case 'focusin':
+            if (e.target === nameSpan) {
+                nameSpan.setAttribute('data-editing', 'true');
+            }
+            break;
+        case 'focusout': {
+            if (e.target !== nameSpan) return;
+            nameSpan.removeAttribute('data-editing');
+            // 焦点移到本行的保存或取消按钮时交给按钮处理
+            if (row.contains(e.relatedTarget) || row.querySelector('.student-actions:hover')) return;
+            // 自动保存
+            const originalName = row.dataset.name;
+            const newName = nameSpan.textContent.trim();
+            if (newName !== originalName && newName !== '') {
+                saveStudentName(originalName, newName);
+            } else {
+                nameSpan.textContent = originalName;
+            }
+            break;
+        }
+        case 'keydown':
+            if (e.target !== nameSpan) return;
+            if (e.key === 'Enter') {
+                e.preventDefault();
+                nameSpan.blur();
+            } else if (e.key === 'Escape') {
+                e.preventDefault();
+                nameSpan.textContent = row.dataset.name;
+                nameSpan.blur();
+            }
+            break;
+        case 'animationend':
+            row.classList.remove('entering');
+            row.style.animationDelay = '';
+            break;
+    }
+}
+
+// 保存编辑后的名字
+async function saveEditedName(row) {
+    const nameSpan = row.querySelector('.student-name');
+    const originalName = row.dataset.name;
+    const newName = nameSpan.textContent.trim();
+
+    if (newName === originalName || newName === '') {
+        nameSpan.textContent = originalName;
+        return;
+    }
+
+    await saveStudentName(originalName, newName);
+}
+
+// 取消编辑名字
+function cancelEditName(row) {
+    const nameSpan = row.querySelector('.student-name');
+    nameSpan.textContent = row.dataset.name;
+    nameSpan.blur();
+}
+
+// 保存学生名字
+async function saveStudentName(originalName, newName) {
+    if (!newName || students.includes(newName)) {
+        alert(newName ? '该名字已存在' : '名字不能为空');
+        return;
+    }
+
+    try {
+        playSound(clickSound);
+
+        // 原位改名，一次请求完成
+        const response = await fetch(`/api/students/${encodeURIComponent(originalName)}`, {
+            method: 'PATCH',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ name: newName })
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.error || '更新失败');
+        }
+
+        offerUndo(`已将 ${originalName} 改名为 ${newName}`, response);
+        // 增量同步：只获取改名产生的变更
+        await loadStudents();
+    } catch (error) {
+        console.error('更新学生名字失败:', error);
+        alert(error.message || '更新失败，请重试');
+    }
+}
+
+// 切换学生列表的显示和隐藏
+function toggleStudentList() {
+    const container = document.getElementById('studentListContainer');
+    const toggle = document.getElementById('studentListToggle');
+
+    container.classList.toggle('collapsed');
+    toggle.classList.toggle('collapsed');
+
+    // 播放音效
+    playSound(clickSound);
+}
+
+// 添加学生
+async function addStudent() {
+    const name = newStudent.value.trim();
+    if (name) {
+        try {
+            playSound(clickSound);
+            const response = await fetch('/api/students', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ name })
+            });
+
+            if (!response.ok) {
+                const error = await response.json();
+                throw new Error(error.error || '添加失败');
+            }
+
+            newStudent.value = '';
+            await loadStudents();
+        } catch (error) {
+            console.error('添加学生失败:', error);
+            alert(error.message || '添加失败，请重试');
+        }
+    }
+}
+
+// 删除学生
+async function deleteStudent(name) {
+    try {
+        playSound(clickSound);
+        const response = await fetch(`/api/students/${encodeURIComponent(name)}`, {
+            method: 'DELETE'
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.error || '删除失败');
+        }
+
+        offerUndo(`已删除 ${name}`, response);
+        await loadStudents();
+    } catch (error) {
+        console.error('删除学生失败:', error);
+        alert(error.message || '删除失败，请重试');
+    }
+}
+
+// 删除或改名后显示几秒撤销提示，撤销即把名单恢复到这次操作之前的版本
+const UNDO_TIMEOUT = 6000;
+const undoBar = document.getElementById('undoBar');
+const undoMessage = document.getElementById('undoMessage');
+let undoVersion = null;     // 撤销时恢复到的版本号
+let undoCurrent = null;     // 操作完成后的版本号，撤销时用作 If-Match：期间名单又被修改过则不会覆盖
+let undoTimer = null;
+
+function offerUndo(message, response) {
+    const version = Number(response.headers.get('X-Roster-Version'));
+    if (!version) return;
+    undoVersion = version - 1;
+    undoCurrent = version;
+    undoMessage.textContent = message;
+    undoBar.classList.add('visible');
+    clearTimeout(undoTimer);
+    undoTimer = setTimeout(hideUndo, UNDO_TIMEOUT);
+}
+
+function hideUndo() {
+    clearTimeout(undoTimer);
+    undoBar.classList.remove('visible');
+    undoVersion = null;
+}
+
+async function undoLastChange() {
+    if (undoVersion === null) return;
+    const version = undoVersion;
+    const current = undoCurrent;
+    hideUndo();
+    try {
+        playSound(clickSound);
+        const response = await fetch(`/api/students/restore?version=${version}`, {
+            method: 'POST',
+            headers: { 'If-Match': `"v${current}"` }
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.error || '撤销失败');
+        }
+
+        await loadStudents();
+    } catch (error) {
+        console.error('撤销失败:', error);
+        alert(error.message || '撤销失败，请重试');
+    }
+}
+
+// 随机点名初始化检查
+function prepareRandomSelect() {
+    // 首先检查是否有学生
+    if (students.length === 0) {
+        nameDisplay.textContent = '请先添加学生';
+        addFlipAnimation(resultCard);
+        return false;
+    }
+
+    // 预加载音效文件
+    [rollSound, selectSound, clickSound].forEach(sound => {
+        if (!sound.readyState) {
+            sound.load();
+        }
+    });
+
+    return true;
+}
+
+// 随机点名
+async function randomSelect() {
+    if (!prepareRandomSelect()) return;
+
+    randomBtn.disabled = true;
+
+    // 向服务器请求点名结果（按班级的点名策略，跳过缺席学生），与滚动动画并行进行
+    const serverPick = fetch('/api/random', {
+            headers: clientId ? { 'X-Client-Id': clientId } : {}
+        })
+        .then(response => response.ok ? response.json() : null)
+        .then(data => data && data.name)
+        .catch(error => {
+            console.warn('获取点名结果失败，使用本地结果:', error);
+            return null;
+        });
+
+    // 获取当前的卡片
+    const existingCards = Array.from(cardsContainer.querySelectorAll('.student-card'));
+    const finalCard = cardsContainer.querySelector('.student-card[data-final="true"]');
+
+    // 优雅地移出所有现有卡片
+    let exitAnimationPromises = [];
+    if (existingCards.length > 0) {
+        existingCards.forEach((card, index) => {
+            const isFinal = card.hasAttribute('data-final');
+            const animationPromise = new Promise(resolve => {
+                setTimeout(() => {
+                    if (isFinal) {
+                        // 应用最终卡片退出动画
+                        card.style.animation = 'finalCardExit 0.4s ease-out forwards';
+                    } else {
+                        // 普通卡片退出动画
+                        card.style.transition = 'all 0.3s ease';
+                        card.style.transform = `translateX(${index % 2 === 0 ? '-': ''}200%) scale(0.8)`; 
+                        card.style.opacity = '0';
+                    }
+                    // 动画结束后移除卡片
+                    setTimeout(() => {
+                        if(card.parentNode) card.remove();
+                        resolve(); // 表示动画完成
+                    }, isFinal ? 400 : 300);
+                }, isFinal ? 0 : index * 30); // 最终卡片优先开始动画
+            });
+            exitAnimationPromises.push(animationPromise);
+        });
+    }
+
+    // 隐藏初始名字显示
+    if (nameDisplay) {
+        nameDisplay.style.display = 'none';
+    }
+
+    // 播放滚动音效
+    playSound(rollSound);
+    rollSound.volume = 0.5;
+    rollSound.loop = true;
+
+    const duration = 3000; // 持续3秒
+    const startTime = Date.now();
+    let lastCardTime = 0;
+
+    // 洗牌学生名单，确保不重复
+    const totalStudents = students.length;
+    let shuffledStudents = [...students];
+    shuffledStudents.sort(() => Math.random() - 0.5);
+
+    // 确保至少有三张卡片可用
+    if (shuffledStudents.length < 3) {
+        const extraNeeded = 3 - shuffledStudents.length;
+        for (let i = 0; i < extraNeeded; i++) {
+            shuffledStudents.push(shuffledStudents[i % shuffledStudents.length]);
+        }
+    }
+
+    let activeCards = []; // 当前显示的卡片列表
+    let currentIndex = 0;
+    let lastDisplayedName = ''; // 新增：记录最后一个显示的名字
+
+    // 等待所有旧卡片退出动画结束后再开始显示新卡片
+    Promise.all(exitAnimationPromises).then(() => {
+        // 延迟一小段时间让旧卡片完全消失
+        setTimeout(() => {
+            // 先创建3张初始卡片但保持隐藏状态
+            for (let i = 0; i < 3; i++) {
+                const card = document.createElement('div');
+                card.className = 'student-card';
+                card.innerHTML = `<div class="name-display">${shuffledStudents[i]}</div>`;
+                card.style.top = `${i * 60}px`; // 错开位置
+                card.style.opacity = '0';
+                card.style.transform = 'translateX(200%) scale(0.9)';
+                cardsContainer.appendChild(card);
+                activeCards.push(card);
+                currentIndex++;
+            }
+
+            // 稍作延迟后再显示卡片
+            setTimeout(() => {
+                // 反向添加位置类，使下面的卡片先显示，营造层叠效果
+                for (let i = activeCards.length - 1; i >= 0; i--) {
+                    setTimeout(() => {
+                        if (activeCards[i]) {
+                            activeCards[i].classList.add(`position-${i+1}`);
+                        }
+                    }, (activeCards.length - 1 - i) * 100); // 错开时间
+                }
+
+                // 短暂延迟后开始动画，让初始卡片先显示
+                setTimeout(() => {
+                    animate();
+                }, 300);
+            }, 100);
+        }, 100); // 确保有足够时间移除
+    });
+
+    // 动画循环
+    const animate = () => {
+        const now = Date.now();
+        const elapsed = now - startTime;
+        const progress = Math.min(elapsed / duration, 1);
+
+        // 非线性减速效果 - 使用更强的 easeOutQuart 曲线 
+        const speedReductionFactor = Math.pow(progress, 2.6); // 从0快速增加到1
+
+        // 计算显示间隔，开始快，结束慢
+        const minInterval = 80;  // 最小间隔（毫秒）- 非常快
+        const maxInterval = 450; // 最大间隔（毫秒）- 非常慢
+        const currentInterval = minInterval + (speedReductionFactor * (maxInterval - minInterval));
+
+        // 更新卡片位置
+        if (now - lastCardTime > currentInterval) {
+            // 移除最后一张卡片
+            if (activeCards.length > 0) {
+                const lastCard = activeCards.pop();
+                if (lastCard) {
+                    lastCard.className = 'student-card position-exit';
+                    setTimeout(() => {
+                        if (lastCard.parentNode) {
+                            lastCard.remove();
+                        }
+                    }, 500);
+                }
+            }
+
+            // 更新现有卡片的位置
+            for (let i = 0; i < activeCards.length; i++) {
+                if (activeCards[i]) {
+                    activeCards[i].className = `student-card position-${i+2}`;
+                }
+            }
+
+            // 添加新卡片
+            if (currentIndex >= shuffledStudents.length) {
+                currentIndex = 0;
+                // 重新洗牌
+                shuffledStudents = [...students].sort(() => Math.random() - 0.5);
+            }
+
+            const newCard = document.createElement('div');
+            newCard.className = 'student-card';
+
+            // 为每张卡片设置随机颜色 - 不再使用动画
+            const cardColors = [
+                '#ffadad', '#ffd6a5', '#fdffb6', '#caffbf', 
+                '#9bf6ff', '#a0c4ff', '#b8e0f9', '#c8b6ff'
+            ];
+            // 选择一个随机颜色
+            const randomColor = cardColors[Math.floor(Math.random() * cardColors.length)];
+            // 创建渐变背景
+            const gradientAngle = Math.floor(Math.random() * 360);
+            const gradientColor1 = randomColor;
+            const gradientColor2 = '#ffffff';
+
+            // 应用渐变背景
+            newCard.style.background = `linear-gradient(${gradientAngle}deg, ${gradientColor1}, ${gradientColor2})`;
+
+            const currentStudentName = shuffledStudents[currentIndex]; // 获取当前名字
+            newCard.innerHTML = `<div class="name-display">${currentStudentName}</div>`;
+            cardsContainer.appendChild(newCard);
+
+            // 添加到卡片数组的开头
+            activeCards.unshift(newCard);
+            currentIndex++;
+
+            // 记录当前显示在最前面的名字
+            lastDisplayedName = currentStudentName;
+
+            // 延迟添加位置类以触发动画
+            setTimeout(() => {
+                newCard.classList.add('position-1');
+            }, 10);
+
+            lastCardTime = now;
+
+            // 降低音量 - 根据 progress 调整
+            if (!rollSound.paused) {
+                rollSound.volume = Math.max(0.1, 0.5 * (1 - progress));
+            }
+        }
+
+        // 继续动画或结束
+        if (progress < 1) {
+            requestAnimationFrame(animate);
+        } else {
+            // 延迟500ms执行下面的语句
+            setTimeout(() => {
+                // 动画结束，优先使用服务器的点名结果
+                serverPick.then(name => finalizeSelection(name || lastDisplayedName));
+            }, maxInterval);
+        }
+    };
+}
+
+// 完成选择
+async function finalizeSelection(selectedName) {
+    try {
+        console.log("最终选择的学生:", selectedName); // 添加日志
+
+        // 停止滚动音效
+        if (rollSound) {
+            rollSound.loop = false;
+            try {
+                rollSound.pause();
+            } catch (e) {
+                console.warn('停止滚动音效失败:', e);
+            }
+        }
+
+        // 播放选中音效
+        playSound(selectSound);
+
+        // 获取当前所有卡片
+        const allCards = Array.from(cardsContainer.querySelectorAll('.student-card'));
+
+        // 如果一开始就没有卡片，直接创建最终卡片
+        if (allCards.length === 0) {
+            const finalCard = document.createElement('div');
+            finalCard.className = 'student-card';
+            finalCard.style.opacity = '0';
+            finalCard.innerHTML = `<div class="name-display">${selectedName}</div>`;
+            cardsContainer.appendChild(finalCard);
+
+            setTimeout(() => {
+                finalCard.style.opacity = '1';
+                finalCard.style.transform = 'translateX(0) scale(1)';
+                finalCard.classList.add('final-card'); // 添加final-card类以应用样式
+                finalCard.setAttribute('data-final', 'true'); // 标记为最终卡片
+                resultCard.classList.add('shine');
+                createConfetti();
+            }, 100);
+
+            setTimeout(() => {
+                randomBtn.disabled = false;
+            }, 2000);
+            return;
+        }
+
+        // 找到第一个位置的卡片 (通常是最近添加的)
+        let mainCard = allCards.find(card => card.classList.contains('position-1'));
+
+        // 如果找不到position-1的卡片，就选择第一个显示的卡片
+        if (!mainCard && allCards.length > 0) {
+            mainCard = allCards[0];
+        }
+
+        // 如果仍然没有卡片，就直接创建最终卡片（作为备用）
+        if (!mainCard) {
+            const finalCard = document.createElement('div');
+            finalCard.className = 'student-card';
+            finalCard.style.opacity = '0';
+            finalCard.innerHTML = `<div class="name-display">${selectedName}</div>`;
+            cardsContainer.appendChild(finalCard);
+
+            setTimeout(() => {
+                finalCard.style.opacity = '1';
+                finalCard.style.transform = 'translateX(0) scale(1)';
+                finalCard.classList.add('final-card'); // 添加final-card类
+                finalCard.setAttribute('data-final', 'true'); // 标记
+                resultCard.classList.add('shine');
+                createConfetti();
+            }, 100);
+
+            setTimeout(() => {
+                randomBtn.disabled = false;
+            }, 2000);
+            return;
+        }
+
+        // 标记主卡片为最终卡片，并更新内容
+        mainCard.setAttribute('data-final', 'true');
+        const nameElement = mainCard.querySelector('.name-display');
+        nameElement.textContent = selectedName;
+        nameElement.classList.add('selected');
+
+        // 将其他卡片移出
+        allCards.forEach((card) => {
+            // 确保不移除主卡片
+            if (card !== mainCard) {
+                setTimeout(() => {
+                    card.style.transition = 'all 0.7s ease';
+                    card.style.transform = `translateX(${Math.random() > 0.5 ? '' : '-'}200%) scale(0.8)`;
+                    card.style.opacity = `0`;
+                    // 延迟删除 DOM 元素
+                    setTimeout(() => {
+                        if(card.parentNode) card.remove();
+                    }, 700);
+                }, Math.random() * 200); // 随机延迟移除
+            }
+        });
+
+        // 将主卡片设置为最终状态
+        setTimeout(() => {
+            // 移除位置类，应用最终样式
+            mainCard.classList.remove('position-1', 'position-2', 'position-3');
+            // 不再需要手动设置 transform, opacity, transition 等，交给 CSS 动画
+            mainCard.style.zIndex = '20';
+            mainCard.style.boxShadow = '0 10px 30px rgba(107, 33, 168, 0.4)';
+            mainCard.style.border = '3px solid #6b21a8';
+            mainCard.style.background = 'linear-gradient(145deg, #ffffff, #f3e7ff)';
+
+            // 添加 final-card 类来触发动画
+            mainCard.classList.add('final-card');
+
+            // 添加特效
+            resultCard.classList.add('shine');
+            createConfetti();
+
+            console.log("最终卡片已设置样式");
+        }, 200);
+
+        // 恢复按钮状态
+        setTimeout(() => {
+            randomBtn.disabled = false;
+            // 清理可能残留的非最终卡片（保险起见）
+            cardsContainer.querySelectorAll('.student-card:not([data-final="true"])').forEach(card => card.remove());
+        }, 2000);
+
+    } catch (error) {
+        console.error('最终选择处理失败:', error); // 修改错误提示
+        alert(error.message || '选择失败，请重试');
+        randomBtn.disabled = false;
+
+        // 确保出错时也停止音效
+        if (rollSound) {
+            rollSound.loop = false;
+            try {
+                rollSound.pause();
+            } catch (e) {}
+        }
+
+        // 恢复初始显示
+        cardsContainer.querySelectorAll('.student-card').forEach(card => card.remove());
+        if (nameDisplay) {
+            nameDisplay.style.display = '';
+            nameDisplay.textContent = '选择失败，请重试';
+        }
+    }
+}
+
+// 添加学生时的动画效果
+function animateAddStudent(element) {
+    element.style.animation = 'none';
+    element.offsetHeight; // 触发重排以重置动画
+    element.style.animation = 'slideIn 0.5s ease forwards';
+}
+
+// 3D翻转动画
+function addFlipAnimation(element) {
+    element.classList.add('flip-animation');
+    setTimeout(() => {
+        element.classList.remove('flip-animation');
+    }, 1000);
+}
+
+// 打字机效果
+function typewriterEffect(element, text, speed = 50) {
+    element.textContent = '';
+    let i = 0;
+
+    function type() {
+        if (i < text.length) {
+            element.textContent += text.charAt(i);
+            i++;
+            setTimeout(type, speed);
+        }
+    }
+
+    type();
+}
+
+// 事件监听
+randomBtn.addEventListener('click', function() {
+    // 先解锁音频，然后执行点名
+    unlockAudio().then(() => randomSelect());
+});
+
+addStudentBtn.addEventListener('click', function() {
+    // 先解锁音频，然后添加学生
+    unlockAudio().then(() => addStudent());
+});
+
+newStudent.addEventListener('keypress', (e) => {
+    if (e.key === 'Enter') {
+        unlockAudio().then(() => addStudent());
+    }
+});
+
+document.getElementById('undoBtn').addEventListener('click', function() {
+    unlockAudio().then(() => undoLastChange());
+});
+
+// 添加学生列表折叠展开事件
+document.getElementById('studentListToggle').addEventListener('click', function() {
+    unlockAudio().then(() => toggleStudentList());
+});
+
+// 名单区域的事件委托和虚拟滚动
+['click', 'keydown', 'focusin', 'focusout', 'animationend'].forEach(type => {
+    studentList.addEventListener(type, handleStudentListEvent);
+});
+studentListContainer.addEventListener('scroll', scheduleRender, { passive: true });
+window.addEventListener('resize', () => {
+    rowStride = 0;
+    scheduleRender();
+});
+
+// 添加全局点击事件来解锁音频
+document.addEventListener('click', function() {
+    if (!audioUnlocked) {
+        unlockAudio();
+    }
+}, { once: true });
+
+// 波纹效果
+document.querySelectorAll('.btn').forEach(button => {
+    button.addEventListener('click', function(e) {
+        const rect = button.getBoundingClientRect();
+        const x = e.clientX - rect.left;
+        const y = e.clientY - rect.top;
+
+        const ripples = document.createElement('span');
+        ripples.style.position = 'absolute';
+        ripples.style.width = '1px';
+        ripples.style.height = '1px';
+        ripples.style.borderRadius = '50%';
+        ripples.style.transform = 'scale(0)';
+        ripples.style.background = 'rgba(255, 255, 255, 0.5)';
+        ripples.style.left = x + 'px';
+        ripples.style.top = y + 'px';
+        ripples.style.animation = 'ripple 0.6s linear';
+
+        button.appendChild(ripples);
+
+        setTimeout(() => {
+            ripples.remove();
+        }, 600);
+    });
+});
+
+// 页面加载初始化
+window.addEventListener('DOMContentLoaded', function() {
+    // 立即预加载音频
+    preloadAudio();
+
+    // 加载学生名单
+    loadStudents();
+
+    // 订阅名单变更和点名结果
+    connectEvents();
+});
@@ -0,0 +1,1366 @@
+"""
+班级点名器 - 学生名单存储层
+
+提供可替换的名单存储后端，所有后端都支持以班级 ID 区分的多个班级：
+
+- JsonRosterStorage: 默认班级保存在 students.json，其他班级保存在 classes/<班级ID>.json，
+  可选使用追加日志（journal）模式写入。
+- SqliteRosterStorage: 单个 SQLite 数据库（WAL 模式），按 (班级, 名字) 建唯一索引，
+  增删查都是单行操作，不需要重写整个名单。
+
+每个班级都有一个单调递增的名单版本号，每次增删改名都会递增并记录一条变更，
+客户端可以据此做条件请求（ETag）、增量同步（只取某个版本之后的变更）
+和乐观并发控制（写操作带上期望的版本号，名单已被别人修改时返回 409）。
+
+多个进程可以共享同一份名单：JSON 后端的读-改-写都在跨进程文件锁内完成，
+版本号保存在锁文件中由各进程共享；SQLite 后端依靠数据库事务。
+
+每个班级的人数上限是独立的配置项（默认 DEFAULT_MAX_STUDENTS）。
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+
+from codec import loads
+from journal import FileLock, RosterJournal, OP_ADD, OP_DELETE, OP_RENAME, write_json_atomic
+
+DEFAULT_CLASS_ID = 'default'        # 兼容旧接口 /api/students 使用的班级
+DEFAULT_MAX_STUDENTS = 100          # 新班级的默认人数上限
+MAX_NAME_LENGTH = 50                # 名字长度限制
+CHANGELOG_LIMIT = 1000              # 每个班级保留的最近变更条数，更早的版本只能全量同步
+
+CHANGE_ADD = OP_ADD                 # 名单变更类型
+CHANGE_DELETE = OP_DELETE
+CHANGE_RENAME = OP_RENAME
+CHANGE_RESET = 'reset'              # 整体替换名单
+
+IO_LOAD = 'load'                    # 读写计时回调的操作类型：从磁盘加载名单
+IO_SAVE = 'save'                    # 写入名单
+
+# 名单变更通知，传给通过 add_listener 注册的回调；new_name 仅用于改名，
+# version 为这次变更之后的名单版本号
+RosterChange = namedtuple('RosterChange', ['class_id', 'op', 'name', 'new_name', 'version'],
+                          defaults=[None, None])
+
+_CLASS_ID_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+
+class StorageError(Exception):
+    """存储层错误，status_code 为对应的 HTTP 状态码"""
+    status_code = 500
+
+
+class InvalidRequestError(StorageError):
+    status_code = 400
+
+
+class StudentExistsError(StorageError):
+    status_code = 400
+
+    def __init__(self, message='该学生已存在'):
+        super().__init__(message)
+
+
+class StudentNotFoundError(StorageError):
+    status_code = 404
+
+    def __init__(self, message='学生不存在'):
+        super().__init__(message)
+
+
+class RosterFullError(StorageError):
+    status_code = 400
+
+    def __init__(self, max_students):
+        super().__init__(f'学生数量已达到上限 ({max_students})')
+        self.max_students = max_students
+
+
+class VersionConflictError(StorageError):
+    """写操作期望的名单版本号与当前版本不一致（名单已被其他人修改）"""
+    status_code = 409
+
+    def __init__(self, version):
+        super().__init__('名单已被其他人修改，请刷新后重试')
+        self.version = version
+
+
+def check_version(expected_version, version):
+    """expected_version 为 None 表示不检查"""
+    if expected_version is not None and expected_version != version:
+        raise VersionConflictError(version)
+
+
+def _partition_new_students(names, existing, count, max_students):
+    """
+    按顺序检查待添加的名字：与现有名单或本批次重复的、超出人数上限的被拒绝。
+
+    Args:
+        existing: 支持 in 运算的现有名单索引
+
+    Returns:
+        tuple: (added, rejected)，格式见 RosterStorage.add_students
+    """
+    added = []
+    rejected = []
+    seen = set()
+    for index, name in enumerate(names):
+        if name in seen or name in existing:
+            rejected.append((index, name, StudentExistsError()))
+        elif count + len(added) >= max_students:
+            rejected.append((index, name, RosterFullError(max_students)))
+        else:
+            added.append(name)
+            seen.add(name)
+    return added, rejected
+
+
+def _check_renames(renames, contains):
+    """
+    按顺序校验改名操作，返回实际需要执行的 (旧名字, 新名字) 列表（跳过名字未变的项）。
+
+    Args:
+        contains: 判断名字在改名前是否存在的函数
+    """
+    renamed_from = {}
+    renamed_to = {}
+
+    def exists(name):
+        if name in renamed_to:
+            return True
+        if name in renamed_from:
+            return False
+        return contains(name)
+
+    effective = []
+    for number, (old_name, new_name) in enumerate(renames, start=1):
+        prefix = f'第 {number} 项: ' if len(renames) > 1 else ''
+        if not exists(old_name):
+            raise StudentNotFoundError(f'{prefix}学生不存在')
+        if old_name == new_name:
+            continue
+        if exists(new_name):
+            raise StudentExistsError(f'{prefix}该学生已存在')
+        renamed_to.pop(old_name, None)
+        renamed_from[old_name] = True
+        renamed_from.pop(new_name, None)
+        renamed_to[new_name] = True
+        effective.append((old_name, new_name))
+    return effective
+
+
+def validate_class_id(class_id):
+    """检查班级 ID 是否合法（字母、数字、下划线、连字符，最长 64 个字符）"""
+    if not isinstance(class_id, str) or not _CLASS_ID_PATTERN.match(class_id):
+        raise InvalidRequestError('无效的班级 ID')
+    return class_id
+
+
+def normalize_name(name):
+    """
+    校验并规范化学生名字（去除首尾空白、限制长度）。
+
+    Raises:
+        InvalidRequestError: 名字为空、过长或不是字符串
+    """
+    if not isinstance(name, str):
+        raise InvalidRequestError('无效的请求数据，缺少 name 字段')
+    name = name.strip()
+    if not name:
+        raise InvalidRequestError('学生姓名不能为空')
+    if len(name) > MAX_NAME_LENGTH:
+        raise InvalidRequestError(f'学生姓名过长（最多{MAX_NAME_LENGTH}个字符）')
+    return name
+
+
+def _change_entry(version, op, name, new_name=None):
+    entry = {'version': version, 'op': op, 'name': name}
+    if new_name is not None:
+        entry['new'] = new_name
+    return entry
+
+
+class ChangeLog:
+    """
+    单个班级的名单版本号和最近变更（内存中，最多保留 limit 条）。
+
+    floor 之后的每个版本都有对应的变更记录；整体替换名单或检测到文件被外部修改时
+    调用 reset()，此时更早的版本都无法增量同步，只能全量获取。
+    """
+
+    def __init__(self, version=0, limit=CHANGELOG_LIMIT):
+        self.version = version
+        self.floor = version
+        self._entries = deque(maxlen=limit)
+
+    def record(self, op, name, new_name=None):
+        if len(self._entries) == self._entries.maxlen:
+            self.floor = self._entries[0]['version']
+        self.version += 1
+        self._entries.append(_change_entry(self.version, op, name, new_name))
+
+    def reset(self):
+        self.reset_to(self.version + 1)
+
+    def reset_to(self, version):
+        """从 version 重新开始版本历史（例如其他进程修改了名单）"""
+        self.version = version
+        self.floor = version
+        self._entries.clear()
+
+    def since(self, version):
+        """返回 version 之后的变更列表，无法增量同步时返回 None"""
+        if version < self.floor or version > self.version:
+            return None
+        # 记录的版本号从 floor + 1 起连续递增
+        return list(islice(self._entries, version - self.floor, None))
+
+
+class RosterStorage:
+    """名单存储后端的公共接口"""
+
+    backend_name = 'base'
+
+    def __init__(self):
+        self._listeners = []
+        self._io_observers = []
+
+    def add_listener(self, listener):
+        """
+        注册名单变更回调，每次成功增删或整体替换名单后以 RosterChange 调用。
+        回调在存储层的锁之外执行，可以安全地再次读取名单。
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, class_id, op, name=None, new_name=None, version=None):
+        change = RosterChange(class_id, op, name, new_name, version)
+        for listener in list(self._listeners):
+            try:
+                listener(change)
+            except Exception as e:
+                logging.error(f"名单变更回调执行失败: {str(e)}")
+
+    def add_io_observer(self, observer):
+        """
+        注册读写计时回调 observer(操作, 耗时秒数, 字节数)，操作为 IO_LOAD 或 IO_SAVE，
+        字节数未知时为 None。回调在 I/O 完成后调用，应当只做计数，不能阻塞。
+        """
+        self._io_observers.append(observer)
+
+    def _observe_io(self, op, started, nbytes=None):
+        """started 为 time.perf_counter() 的起始值"""
+        elapsed = time.perf_counter() - started
+        for observer in self._io_observers:
+            try:
+                observer(op, elapsed, nbytes)
+            except Exception as e:
+                logging.error(f"读写计时回调执行失败: {str(e)}")
+
+    def list_classes(self):
+        raise NotImplementedError
+
+    def list_students(self, class_id):
+        raise NotImplementedError
+
+    def count(self, class_id):
+        return len(self.list_students(class_id))
+
+    def contains(self, class_id, name):
+        return name in self.list_students(class_id)
+
+    def add_student(self, class_id, name, expected_version=None):
+        """
+        添加一名学生。
+
+        所有写操作都接受 expected_version：给出时只有名单当前版本号与之相同才会写入，
+        否则抛出 VersionConflictError（乐观并发控制）。
+
+        Returns:
+            int: 写入后的名单版本号
+
+        Raises:
+            StudentExistsError: 名字已存在
+            RosterFullError: 已达到班级人数上限
+            VersionConflictError: 名单版本号与 expected_version 不一致
+        """
+        raise NotImplementedError
+
+    def add_students(self, class_id, names, expected_version=None):
+        """
+        批量添加学生，所有通过检查的名字在一次写入（一个事务）中提交。
+
+        Args:
+            class_id (str): 班级 ID
+            names (list): 已规范化的名字列表
+
+        Returns:
+            tuple: (added, rejected)，added 为实际添加的名字列表，
+                rejected 为 (在 names 中的下标, 名字, StorageError) 列表
+        """
+        raise NotImplementedError
+
+    def iter_students(self, class_id):
+        """逐个产出班级学生（导出时使用，后端可以避免一次性构造完整列表）"""
+        return iter(self.list_students(class_id))
+
+    def delete_student(self, class_id, name, expected_version=None):
+        """
+        删除一名学生，返回写入后的名单版本号。
+
+        Raises:
+            StudentNotFoundError: 学生不存在
+        """
+        raise NotImplementedError
+
+    def rename_students(self, class_id, renames, expected_version=None):
+        """
+        原位改名（保持名单顺序），多项改名按顺序校验并在一次写入中提交，
+        任意一项失败则全部不生效。
+
+        Args:
+            class_id (str): 班级 ID
+            renames (list): (旧名字, 已规范化的新名字) 列表
+
+        Returns:
+            int: 写入后的名单版本号
+
+        Raises:
+            StudentNotFoundError / StudentExistsError: 消息中包含出错的项序号
+        """
+        raise NotImplementedError
+
+    def rename_student(self, class_id, old_name, new_name, expected_version=None):
+        return self.rename_students(class_id, [(old_name, new_name)], expected_version)
+
+    def replace_students(self, class_id, students, expected_version=None):
+        """用完整名单覆盖班级名单，返回写入后的名单版本号"""
+        raise NotImplementedError
+
+    def version(self, class_id):
+        """班级名单的当前版本号，每次变更后递增"""
+        raise NotImplementedError
+
+    def snapshot(self, class_id):
+        """
+        原子地读取名单及其版本号。
+
+        Returns:
+            tuple: (版本号, 学生名字列表)
+        """
+        return self.version(class_id), self.list_students(class_id)
+
+    def page(self, class_id, offset, limit):
+        """
+        原子地读取名单的一段（分页加载）。
+
+        Returns:
+            tuple: (版本号, 总人数, offset 开始的最多 limit 个名字)
+        """
+        version, students = self.snapshot(class_id)
+        return version, len(students), students[offset:offset + limit]
+
+    def changes_since(self, class_id, version):
+        """
+        读取某个版本之后的变更。
+
+        Returns:
+            tuple: (当前版本号, 变更列表)，变更为 {'version', 'op', 'name'[, 'new']}；
+                该版本已过期或未知时变更列表为 None，调用方应改为全量同步
+        """
+        return self.version(class_id), None
+
+    def get_max_students(self, class_id):
+        raise NotImplementedError
+
+    def set_max_students(self, class_id, max_students):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# JSON 文件后端
+# ---------------------------------------------------------------------------
+
+class RosterCache:
+    """
+    进程内学生名单缓存。
+
+    名单只在首次访问或文件被修改（mtime/大小/inode 变化，包括其他进程的写入）时
+    从磁盘读取，之后的请求直接读取内存，检查是否失效只需要 stat 几个文件。
+    内部使用保持插入顺序的 dict 作为有序集合，查重和删除都是 O(1) 的索引操作。
+
+    Args:
+        loader: 完整读取名单的函数
+        watch_paths: 缓存失效检测关注的文件
+        on_reload: 每次从磁盘读取（或增量刷新）之后以新的文件签名调用
+        file_lock: 跨进程锁，读取期间持有，避免读到其他进程写了一半的文件
+        refresh: 可选的增量刷新函数 refresh(index, 旧签名, 新签名)，
+            能够只应用新增的变更时就地更新 index 并返回 True，否则整体重新读取
+    """
+
+    def __init__(self, loader, watch_paths, on_reload=None, file_lock=None, refresh=None):
+        self.loader = loader
+        self.watch_paths = tuple(watch_paths)
+        self.on_reload = on_reload
+        self.file_lock = file_lock
+        self.refresh = refresh
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._index = None          # 有序集合: name -> None
+        self._signature = None      # 加载时各文件的 (mtime_ns, size, inode)
+
+    def _file_signature(self):
+        signature = []
+        for path in self.watch_paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                signature.append(None)
+                continue
+            # 原子替换（os.replace）会换掉 inode，即使 mtime 和大小碰巧相同也能发现
+            signature.append((st.st_mtime_ns, st.st_size, st.st_ino))
+        return tuple(signature)
+
+    def _ensure_loaded(self):
+        """缓存失效时重新从磁盘加载，调用方需持有 self.lock"""
+        if self._index is not None and self._file_signature() == self._signature:
+            self.hits += 1
+            return
+        with self.file_lock if self.file_lock is not None else nullcontext():
+            # 持有跨进程锁后重新取签名：此时没有其他进程在写，签名与读到的内容一致
+            signature = self._file_signature()
+            if self._index is not None and signature == self._signature:
+                self.hits += 1
+                return
+            if (self._index is not None and self.refresh is not None
+                    and self.refresh(self._index, self._signature, signature)):
+                self.refreshes += 1
+            else:
+                self.misses += 1
+                self._index = dict.fromkeys(self.loader())
+            self._signature = signature
+            if self.on_reload is not None:
+                self.on_reload(signature)
+
+    def get(self):
+        """返回学生名单的副本"""
+        with self.lock:
+            self._ensure_loaded()
+            return list(self._index)
+
+    def contains(self, name):
+        with self.lock:
+            self._ensure_loaded()
+            return name in self._index
+
+    def count(self):
+        with self.lock:
+            self._ensure_loaded()
+            return len(self._index)
+
+    def slice(self, offset, limit):
+        """返回从 offset 开始的最多 limit 个名字（不复制整个名单）"""
+        with self.lock:
+            self._ensure_loaded()
+            return list(islice(self._index, offset, offset + limit))
+
+    def store(self, students):
+        """
+        在本进程写盘成功后更新缓存，避免下次请求重新解析自己刚写的文件。
+
+        Returns:
+            tuple: 写入后的文件签名
+        """
+        with self.lock:
+            self._index = dict.fromkeys(students)
+            self._signature = self._file_signature()
+            return self._signature
+
+    def invalidate(self):
+        with self.lock:
+            self._index = None
+            self._signature = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'size': len(self._index) if self._index is not None else 0,
+            }
+
+
+def _quarantine_corrupt_file(path):
+    """把无法解析的名单文件另存一份，避免之后的写入覆盖掉可恢复的数据"""
+    backup_path = f"{path}.corrupt-{time.strftime('%Y%m%d%H%M%S')}"
+    try:
+        shutil.copy2(path, backup_path)
+        logging.error(f"名单文件已损坏，原文件已备份到: {backup_path}")
+    except OSError as e:
+        logging.error(f"备份损坏的名单文件失败: {str(e)}")
+
+
+def read_students_file(path):
+    """
+    直接从 JSON 文件读取学生列表（不经过缓存）。
+
+    Returns:
+        list: 学生名字列表，如果加载失败则返回空列表
+    """
+    try:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                students = loads(f.read())
+                return students if isinstance(students, list) else []
+    except json.JSONDecodeError as e:
+        logging.error(f"加载学生名单失败: {str(e)}")
+        _quarantine_corrupt_file(path)
+    except IOError as e:
+        logging.error(f"加载学生名单失败: {str(e)}")
+    return []
+
+
+def _signature_state(signature):
+    """文件签名转换为可以写入 JSON 的形式"""
+    return [list(entry) if entry is not None else None for entry in signature]
+
+
+class _JsonRoster:
+    """
+    单个班级的 JSON 名单文件（带缓存，可选追加日志）。
+
+    多个进程共享同一个名单文件时通过 `<名单文件>.lock` 协调：读-改-写和从磁盘读取名单
+    都持有这把跨进程锁；锁文件中保存各进程共享的版本号，以及最近一次写入后各文件的签名。
+    签名对不上说明文件在应用之外被修改过（例如手工编辑），此时版本号加一。
+    """
+
+    def __init__(self, path, journaled, observe_io):
+        self.path = path
+        self.observe_io = observe_io
+        self.lock = FileLock(f"{path}.lock")
+        # 版本号在首次读取名单时从锁文件同步
+        self.changelog = ChangeLog()
+        self._tail_changes = None   # 增量刷新时从日志读到的其他进程的变更
+        refresh = None
+        if journaled:
+            self.journal = RosterJournal(path, lock=self.lock, on_compacted=self._record_files)
+            self.watch_paths = self.journal.watch_paths
+            loader = self._load_journaled
+            refresh = self._refresh_journaled
+        else:
+            self.journal = None
+            self.watch_paths = (path,)
+            loader = lambda: read_students_file(path)
+        self.cache = RosterCache(lambda: self._timed_load(loader), self.watch_paths,
+                                 on_reload=self._sync_version, file_lock=self.lock, refresh=refresh)
+
+    # ---- 跨进程共享状态（调用方需持有 self.lock） ----
+
+    def _read_state(self):
+        try:
+            state = json.loads(self.lock.read().decode('utf-8') or '{}')
+        except ValueError:
+            state = {}
+        return state if isinstance(state, dict) else {}
+
+    def _write_state(self, version, signature):
+        state = {'version': version, 'files': _signature_state(signature)}
+        self.lock.write(json.dumps(state).encode('utf-8'))
+
+    def _sync_version(self, signature):
+        """从磁盘读取名单后，让本进程的版本号与锁文件中共享的版本号一致"""
+        tail_changes, self._tail_changes = self._tail_changes, None
+        state = self._read_state()
+        version = state.get('version')
+        if not isinstance(version, int):
+            # 第一次使用：以毫秒时间戳起步，重启前客户端持有的旧版本号都会落在 floor 之前
+            version = max(int(time.time() * 1000), self.changelog.version + 1)
+            self._write_state(version, signature)
+        elif state.get('files') != _signature_state(signature):
+            version += 1
+            self._write_state(version, signature)
+        if tail_changes is not None and version == self.changelog.version + len(tail_changes):
+            for change in tail_changes:
+                self.changelog.record(*change)
+        elif version != self.changelog.version:
+            self.changelog.reset_to(version)
+
+    def _record_files(self):
+        """后台压缩替换快照之后调用：内容没有变化，只更新记录的文件签名"""
+        state = self._read_state()
+        if isinstance(state.get('version'), int):
+            self._write_state(state['version'], self.cache._file_signature())
+
+    def _refresh_journaled(self, index, old_signature, new_signature):
+        """其他进程只向日志追加了记录时，只回放新增的部分，不重新解析快照"""
+        (old_snapshot, old_log, old_rotated), (new_snapshot, new_log, new_rotated) = old_signature, new_signature
+        if (old_snapshot != new_snapshot or old_rotated != new_rotated or old_log is None or new_log is None
+                or old_log[2] != new_log[2] or new_log[1] < old_log[1]):
+            return False
+        changes = self.journal.replay_tail(index, old_log[1], new_log[1])
+        if changes is None:
+            return False
+        self._tail_changes = changes
+        return True
+
+    @contextmanager
+    def writing(self, expected_version=None):
+        """
+        写操作的临界区：持有名单锁和跨进程文件锁，缓存已刷新到磁盘上的最新状态，
+        并检查乐观并发控制的期望版本号。
+        """
+        with self.cache.lock, self.lock:
+            self.cache.count()
+            check_version(expected_version, self.changelog.version)
+            yield
+
+    def _timed_load(self, loader):
+        started = time.perf_counter()
+        students = loader()
+        size = 0
+        for path in self.watch_paths:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        self.observe_io(IO_LOAD, started, size)
+        return students
+
+    def _load_journaled(self):
+        """回放 快照 + 日志 读取学生列表"""
+        try:
+            return self.journal.load()
+        except json.JSONDecodeError as e:
+            logging.error(f"加载学生名单快照失败: {str(e)}")
+            _quarantine_corrupt_file(self.path)
+        except IOError as e:
+            logging.error(f"加载学生名单失败: {str(e)}")
+        return []
+
+    def save(self, students, changes=None):
+        """
+        保存名单并更新缓存，调用方需在 writing() 临界区内调用。
+
+        journal 模式下如果给出了 changes（(操作, 名字) 列表），只向日志追加这些变更
+        （写入成本与名单大小无关），否则原子地重写整个快照文件（临时文件 + os.replace）。
+        成功后把 changes 记入变更记录；没有 changes 时视为整体替换，版本历史重新开始。
+        """
+        started = time.perf_counter()
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if self.journal is not None:
+                if changes is not None:
+                    written = self.journal.append_many(changes)
+                    self.journal.maybe_compact(students)
+                else:
+                    written = self.journal.replace_all(students)
+            else:
+                written = write_json_atomic(self.path, students)
+            signature = self.cache.store(students)
+        except (IOError, OSError) as e:
+            logging.error(f"保存学生名单失败: {str(e)}")
+            self.cache.invalidate()
+            raise StorageError('保存失败') from e
+        self.observe_io(IO_SAVE, started, written)
+        if changes is None:
+            self.changelog.reset()
+        else:
+            for change in changes:
+                self.changelog.record(*change)
+        self._write_state(self.changelog.version, signature)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+
+class JsonRosterStorage(RosterStorage):
+    """
+    基于 JSON 文件的名单存储。
+
+    Args:
+        students_file (str): 默认班级的名单文件
+        classes_dir (str): 其他班级名单文件所在目录
+        journaled (bool): 是否使用追加日志模式写入
+        default_max_students (int): 未单独配置的班级的人数上限
+    """
+
+    backend_name = 'json'
+
+    def __init__(self, students_file='students.json', classes_dir='classes',
+                 journaled=True, default_max_students=DEFAULT_MAX_STUDENTS):
+        super().__init__()
+        self.students_file = students_file
+        self.classes_dir = classes_dir
+        self.journaled = journaled
+        self.default_max_students = default_max_students
+        self.config_file = os.path.join(os.path.dirname(students_file), 'class_config.json')
+        self._rosters = {}
+        self._lock = threading.Lock()
+        self._config = None
+        self._config_signature_loaded = None
+        self._config_lock = FileLock(f"{self.config_file}.lock")
+
+    def _class_path(self, class_id):
+        if class_id == DEFAULT_CLASS_ID:
+            return self.students_file
+        return os.path.join(self.classes_dir, f"{class_id}.json")
+
+    def _roster(self, class_id):
+        roster = self._rosters.get(class_id)
+        if roster is None:
+            validate_class_id(class_id)
+            with self._lock:
+                roster = self._rosters.get(class_id)
+                if roster is None:
+                    roster = _JsonRoster(self._class_path(class_id), self.journaled, self._observe_io)
+                    self._rosters[class_id] = roster
+        return roster
+
+    def _config_signature(self):
+        try:
+            st = os.stat(self.config_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _load_config(self):
+        """读取班级配置，调用方需持有 self._lock；配置文件被其他进程修改后重新读取"""
+        signature = self._config_signature()
+        if self._config is None or signature != self._config_signature_loaded:
+            config = {}
+            if signature is not None:
+                try:
+                    with open(self.config_file, 'r', encoding='utf-8') as f:
+                        config = json.load(f)
+                except (json.JSONDecodeError, IOError) as e:
+                    logging.error(f"加载班级配置失败: {str(e)}")
+            self._config = config if isinstance(config, dict) else {}
+            self._config_signature_loaded = signature
+        return self._config
+
+    def list_classes(self):
+        classes = {DEFAULT_CLASS_ID}
+        if os.path.isdir(self.classes_dir):
+            for filename in os.listdir(self.classes_dir):
+                class_id, ext = os.path.splitext(filename)
+                if ext == '.json' and _CLASS_ID_PATTERN.match(class_id):
+                    classes.add(class_id)
+        with self._lock:
+            classes.update(self._rosters)
+            classes.update(self._load_config())
+        return sorted(classes)
+
+    def list_students(self, class_id):
+        return self._roster(class_id).cache.get()
+
+    def count(self, class_id):
+        return self._roster(class_id).cache.count()
+
+    def contains(self, class_id, name):
+        return self._roster(class_id).cache.contains(name)
+
+    def version(self, class_id):
+        roster = self._roster(class_id)
+        with roster.cache.lock:
+            # 确认缓存有效（不复制名单）：缓存重新加载时会重置版本历史
+            roster.cache.count()
+            return roster.changelog.version
+
+    def snapshot(self, class_id):
+        roster = self._roster(class_id)
+        with roster.cache.lock:
+            # 先读名单：缓存重新加载时会重置版本历史
+            students = roster.cache.get()
+            return roster.changelog.version, students
+
+    def page(self, class_id, offset, limit):
+        roster = self._roster(class_id)
+        with roster.cache.lock:
+            students = roster.cache.slice(offset, limit)
+            return roster.changelog.version, roster.cache.count(), students
+
+    def changes_since(self, class_id, version):
+        roster = self._roster(class_id)
+        with roster.cache.lock:
+            roster.cache.count()
+            return roster.changelog.version, roster.changelog.since(version)
+
+    def add_student(self, class_id, name, expected_version=None):
+        roster = self._roster(class_id)
+        max_students = self.get_max_students(class_id)
+        # 缓存按文件签名保持最新，已存在的名字不需要获取跨进程锁就能拒绝
+        if expected_version is None and roster.cache.contains(name):
+            raise StudentExistsError()
+        # 持有名单锁和跨进程文件锁完成 查重-修改-写盘，避免并发请求（包括其他进程）互相覆盖
+        with roster.writing(expected_version):
+            if roster.cache.contains(name):
+                raise StudentExistsError()
+            if roster.cache.count() >= max_students:
+                raise RosterFullError(max_students)
+            students = roster.cache.get()
+            students.append(name)
+            roster.save(students, changes=[(OP_ADD, name)])
+            version = roster.changelog.version
+        self._notify(class_id, CHANGE_ADD, name, version=version)
+        return version
+
+    def add_students(self, class_id, names, expected_version=None):
+        roster = self._roster(class_id)
+        max_students = self.get_max_students(class_id)
+        with roster.writing(expected_version):
+            students = roster.cache.get()
+            existing = set(students)
+            added, rejected = _partition_new_students(names, existing, len(students), max_students)
+            if added:
+                roster.save(students + added, changes=[(OP_ADD, name) for name in added])
+            first_version = roster.changelog.version - len(added) + 1
+        for i, name in enumerate(added):
+            self._notify(class_id, CHANGE_ADD, name, version=first_version + i)
+        return added, rejected
+
+    def delete_student(self, class_id, name, expected_version=None):
+        roster = self._roster(class_id)
+        with roster.writing(expected_version):
+            if not roster.cache.contains(name):
+                raise StudentNotFoundError()
+            students = [s for s in roster.cache.get() if s != name]
+            roster.save(students, changes=[(OP_DELETE, name)])
+            version = roster.changelog.version
+        self._notify(class_id, CHANGE_DELETE, name, version=version)
+        return version
+
+    def rename_students(self, class_id, renames, expected_version=None):
+        roster = self._roster(class_id)
+        with roster.writing(expected_version):
+            renames = _check_renames(renames, roster.cache.contains)
+            if not renames:
+                return roster.changelog.version
+            students = roster.cache.get()
+            positions = {name: i for i, name in enumerate(students)}
+            for old_name, new_name in renames:
+                position = positions.pop(old_name)
+                students[position] = new_name
+                positions[new_name] = position
+            roster.save(students, changes=[(OP_RENAME, old, new) for old, new in renames])
+            version = roster.changelog.version
+        for i, (old_name, new_name) in enumerate(renames):
+            self._notify(class_id, CHANGE_RENAME, old_name, new_name, version=version - len(renames) + 1 + i)
+        return version
+
+    def replace_students(self, class_id, students, expected_version=None):
+        roster = self._roster(class_id)
+        with roster.writing(expected_version):
+            roster.save(list(dict.fromkeys(students)))
+            version = roster.changelog.version
+        self._notify(class_id, CHANGE_RESET, version=version)
+        return version
+
+    def get_max_students(self, class_id):
+        with self._lock:
+            entry = self._load_config().get(class_id, {})
+        return int(entry.get('max_students', self.default_max_students))
+
+    def set_max_students(self, class_id, max_students):
+        validate_class_id(class_id)
+        # 持有跨进程锁读取最新配置后再修改，避免覆盖其他进程刚写入的配置
+        with self._lock, self._config_lock:
+            config = dict(self._load_config())
+            config[class_id] = dict(config.get(class_id, {}), max_students=int(max_students))
+            try:
+                write_json_atomic(self.config_file, config, indent=True)
+            except OSError as e:
+                logging.error(f"保存班级配置失败: {str(e)}")
+                raise StorageError('保存失败') from e
+            self._config = config
+            self._config_signature_loaded = self._config_signature()
+
+    def stats(self):
+        with self._lock:
+            rosters = dict(self._rosters)
+        classes = {class_id: roster.cache.stats() for class_id, roster in rosters.items()}
+        return {
+            'hits': sum(s['hits'] for s in classes.values()),
+            'misses': sum(s['misses'] for s in classes.values()),
+            'classes': classes,
+        }
+
+    def close(self):
+        with self._lock:
+            rosters = list(self._rosters.values())
+        for roster in rosters:
+            roster.close()
+
+
+# ---------------------------------------------------------------------------
+# SQLite 后端
+# ---------------------------------------------------------------------------
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS classes (
+    class_id      TEXT PRIMARY KEY,
+    max_students  INTEGER NOT NULL,
+    next_position INTEGER NOT NULL DEFAULT 0,
+    version       INTEGER NOT NULL DEFAULT 0,
+    history_floor INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS students (
+    id        INTEGER PRIMARY KEY,
+    class_id  TEXT NOT NULL REFERENCES classes(class_id) ON DELETE CASCADE,
+    name      TEXT NOT NULL,
+    position  INTEGER NOT NULL,
+    UNIQUE (class_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_students_class_position ON students (class_id, position);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    class_id  TEXT NOT NULL,
+    version   INTEGER NOT NULL,
+    op        TEXT NOT NULL,
+    name      TEXT NOT NULL,
+    new_name  TEXT,
+    PRIMARY KEY (class_id, version)
+) WITHOUT ROWID;
+"""
+
+# 旧版本数据库的 classes 表缺少的列
+_SQLITE_CLASS_COLUMNS = {
+    'version': 'INTEGER NOT NULL DEFAULT 0',
+    'history_floor': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+
+class SqliteRosterStorage(RosterStorage):
+    """
+    基于 SQLite（WAL 模式）的多班级名单存储。
+
+    每个线程使用独立的连接；写操作使用 BEGIN IMMEDIATE 事务，
+    查重依赖 (class_id, name) 唯一索引，名单顺序由 position 列维护。
+    名单版本号和最近的变更记录与名单在同一个事务中更新，多个进程共享同一份版本历史。
+    """
+
+    backend_name = 'sqlite'
+
+    def __init__(self, db_path='rollcall.db', default_max_students=DEFAULT_MAX_STUDENTS):
+        super().__init__()
+        self.db_path = db_path
+        self.default_max_students = default_max_students
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        conn = self._connect()
+        conn.executescript(_SQLITE_SCHEMA)
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(classes)')}
+        for column, definition in _SQLITE_CLASS_COLUMNS.items():
+            if column not in columns:
+                conn.execute(f'ALTER TABLE classes ADD COLUMN {column} {definition}')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _transaction(self):
+        return _SqliteTransaction(self._connect(), self._observe_io)
+
+    def _observe_load(self, started, students):
+        if self._io_observers:
+            self._observe_io(IO_LOAD, started, sum(len(name.encode('utf-8')) for name in students))
+
+    def _ensure_class(self, conn, class_id):
+        conn.execute(
+            'INSERT OR IGNORE INTO classes (class_id, max_students) VALUES (?, ?)',
+            (class_id, self.default_max_students),
+        )
+
+    def _record_changes(self, conn, class_id, changes):
+        """在当前事务中递增版本号并记录变更，同时清理超出 CHANGELOG_LIMIT 的旧记录"""
+        version, floor = conn.execute(
+            'SELECT version, history_floor FROM classes WHERE class_id = ?', (class_id,),
+        ).fetchone()
+        conn.executemany(
+            'INSERT INTO changes (class_id, version, op, name, new_name) VALUES (?, ?, ?, ?, ?)',
+            ((class_id, version + i, op, name, new_name)
+             for i, (op, name, new_name) in enumerate(changes, start=1)),
+        )
+        version += len(changes)
+        if version - floor > CHANGELOG_LIMIT:
+            floor = version - CHANGELOG_LIMIT
+            conn.execute('DELETE FROM changes WHERE class_id = ? AND version <= ?', (class_id, floor))
+        conn.execute('UPDATE classes SET version = ?, history_floor = ? WHERE class_id = ?',
+                     (version, floor, class_id))
+        return version
+
+    def _check_version(self, conn, class_id, expected_version):
+        """在当前写事务中检查乐观并发控制的期望版本号"""
+        if expected_version is None:
+            return
+        row = conn.execute('SELECT version FROM classes WHERE class_id = ?', (class_id,)).fetchone()
+        check_version(expected_version, row[0] if row else 0)
+
+    def _reset_changes(self, conn, class_id):
+        """整体替换名单后版本历史重新开始"""
+        conn.execute('DELETE FROM changes WHERE class_id = ?', (class_id,))
+        conn.execute('UPDATE classes SET version = version + 1, history_floor = version + 1 '
+                     'WHERE class_id = ?', (class_id,))
+        return conn.execute('SELECT version FROM classes WHERE class_id = ?', (class_id,)).fetchone()[0]
+
+    def list_classes(self):
+        rows = self._connect().execute('SELECT class_id FROM classes ORDER BY class_id').fetchall()
+        classes = {row[0] for row in rows}
+        classes.add(DEFAULT_CLASS_ID)
+        return sorted(classes)
+
+    def list_students(self, class_id):
+        validate_class_id(class_id)
+        started = time.perf_counter()
+        rows = self._connect().execute(
+            'SELECT name FROM students WHERE class_id = ? ORDER BY position', (class_id,),
+        ).fetchall()
+        students = [row[0] for row in rows]
+        self._observe_load(started, students)
+        return students
+
+    def count(self, class_id):
+        validate_class_id(class_id)
+        row = self._connect().execute(
+            'SELECT COUNT(*) FROM students WHERE class_id = ?', (class_id,),
+        ).fetchone()
+        return row[0]
+
+    def contains(self, class_id, name):
+        validate_class_id(class_id)
+        row = self._connect().execute(
+            'SELECT 1 FROM students WHERE class_id = ? AND name = ?', (class_id, name),
+        ).fetchone()
+        return row is not None
+
+    def add_student(self, class_id, name, expected_version=None):
+        validate_class_id(class_id)
+        with self._transaction() as conn:
+            self._ensure_class(conn, class_id)
+            self._check_version(conn, class_id, expected_version)
+            max_students, position = conn.execute(
+                'SELECT max_students, next_position FROM classes WHERE class_id = ?', (class_id,),
+            ).fetchone()
+            if conn.execute('SELECT 1 FROM students WHERE class_id = ? AND name = ?',
+                            (class_id, name)).fetchone():
+                raise StudentExistsError()
+            count = conn.execute('SELECT COUNT(*) FROM students WHERE class_id = ?',
+                                 (class_id,)).fetchone()[0]
+            if count >= max_students:
+                raise RosterFullError(max_students)
+            conn.execute('INSERT INTO students (class_id, name, position) VALUES (?, ?, ?)',
+                         (class_id, name, position))
+            conn.execute('UPDATE classes SET next_position = ? WHERE class_id = ?',
+                         (position + 1, class_id))
+            version = self._record_changes(conn, class_id, [(CHANGE_ADD, name, None)])
+        self._notify(class_id, CHANGE_ADD, name, version=version)
+        return version
+
+    def add_students(self, class_id, names, expected_version=None):
+        validate_class_id(class_id)
+        with self._transaction() as conn:
+            self._ensure_class(conn, class_id)
+            self._check_version(conn, class_id, expected_version)
+            max_students, position = conn.execute(
+                'SELECT max_students, next_position FROM classes WHERE class_id = ?', (class_id,),
+            ).fetchone()
+            count = conn.execute('SELECT COUNT(*) FROM students WHERE class_id = ?',
+                                 (class_id,)).fetchone()[0]
+            existing = _SqliteNameIndex(conn, class_id)
+            added, rejected = _partition_new_students(names, existing, count, max_students)
+            conn.executemany(
+                'INSERT INTO students (class_id, name, position) VALUES (?, ?, ?)',
+                ((class_id, name, position + i) for i, name in enumerate(added)),
+            )
+            conn.execute('UPDATE classes SET next_position = ? WHERE class_id = ?',
+                         (position + len(added), class_id))
+            if added:
+                version = self._record_changes(conn, class_id, [(CHANGE_ADD, name, None) for name in added])
+        for i, name in enumerate(added):
+            self._notify(class_id, CHANGE_ADD, name, version=version - len(added) + 1 + i)
+        return added, rejected
+
+    def iter_students(self, class_id, batch_size=1000):
+        validate_class_id(class_id)
+        cursor = self._connect().execute(
+            'SELECT name FROM students WHERE class_id = ? ORDER BY position', (class_id,),
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row[0]
+
+    def delete_student(self, class_id, name, expected_version=None):
+        validate_class_id(class_id)
+        with self._transaction() as conn:
+            self._check_version(conn, class_id, expected_version)
+            cursor = conn.execute('DELETE FROM students WHERE class_id = ? AND name = ?',
+                                  (class_id, name))
+            if cursor.rowcount == 0:
+                raise StudentNotFoundError()
+            version = self._record_changes(conn, class_id, [(CHANGE_DELETE, name, None)])
+        self._notify(class_id, CHANGE_DELETE, name, version=version)
+        return version
+
+    def rename_students(self, class_id, renames, expected_version=None):
+        validate_class_id(class_id)
+        with self._transaction() as conn:
+            self._check_version(conn, class_id, expected_version)
+            renames = _check_renames(renames, _SqliteNameIndex(conn, class_id).__contains__)
+            for old_name, new_name in renames:
+                conn.execute('UPDATE students SET name = ? WHERE class_id = ? AND name = ?',
+                             (new_name, class_id, old_name))
+            if renames:
+                version = self._record_changes(conn, class_id,
+                                               [(CHANGE_RENAME, old, new) for old, new in renames])
+            else:
+                row = conn.execute('SELECT version FROM classes WHERE class_id = ?', (class_id,)).fetchone()
+                version = row[0] if row else 0
+        for i, (old_name, new_name) in enumerate(renames):
+            self._notify(class_id, CHANGE_RENAME, old_name, new_name,
+                         version=version - len(renames) + 1 + i)
+        return version
+
+    def replace_students(self, class_id, students, expected_version=None):
+        validate_class_id(class_id)
+        students = list(dict.fromkeys(students))
+        with self._transaction() as conn:
+            self._ensure_class(conn, class_id)
+            self._check_version(conn, class_id, expected_version)
+            conn.execute('DELETE FROM students WHERE class_id = ?', (class_id,))
+            conn.executemany(
+                'INSERT INTO students (class_id, name, position) VALUES (?, ?, ?)',
+                ((class_id, name, position) for position, name in enumerate(students)),
+            )
+            conn.execute('UPDATE classes SET next_position = ? WHERE class_id = ?',
+                         (len(students), class_id))
+            version = self._reset_changes(conn, class_id)
+        self._notify(class_id, CHANGE_RESET, version=version)
+        return version
+
+    def version(self, class_id):
+        validate_class_id(class_id)
+        row = self._connect().execute(
+            'SELECT version FROM classes WHERE class_id = ?', (class_id,),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def snapshot(self, class_id):
+        validate_class_id(class_id)
+        conn = self._connect()
+        started = time.perf_counter()
+        # 在同一个读事务中读取版本号和名单，WAL 模式下不会阻塞写入
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute('SELECT version FROM classes WHERE class_id = ?', (class_id,)).fetchone()
+            students = [r[0] for r in conn.execute(
+                'SELECT name FROM students WHERE class_id = ? ORDER BY position', (class_id,))]
+        finally:
+            conn.execute('COMMIT')
+        self._observe_load(started, students)
+        return (row[0] if row else 0), students
+
+    def page(self, class_id, offset, limit):
+        validate_class_id(class_id)
+        conn = self._connect()
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute('SELECT version FROM classes WHERE class_id = ?', (class_id,)).fetchone()
+            total = conn.execute('SELECT COUNT(*) FROM students WHERE class_id = ?', (class_id,)).fetchone()[0]
+            students = [r[0] for r in conn.execute(
+                'SELECT name FROM students WHERE class_id = ? ORDER BY position LIMIT ? OFFSET ?',
+                (class_id, limit, offset))]
+        finally:
+            conn.execute('COMMIT')
+        return (row[0] if row else 0), total, students
+
+    def changes_since(self, class_id, version):
+        validate_class_id(class_id)
+        conn = self._connect()
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute('SELECT version, history_floor FROM classes WHERE class_id = ?',
+                               (class_id,)).fetchone()
+            current, floor = row if row else (0, 0)
+            if version < floor or version > current:
+                return current, None
+            rows = conn.execute(
+                'SELECT version, op, name, new_name FROM changes '
+                'WHERE class_id = ? AND version > ? ORDER BY version', (class_id, version),
+            ).fetchall()
+        finally:
+            conn.execute('COMMIT')
+        return current, [_change_entry(*r) for r in rows]
+
+    def get_max_students(self, class_id):
+        validate_class_id(class_id)
+        row = self._connect().execute(
+            'SELECT max_students FROM classes WHERE class_id = ?', (class_id,),
+        ).fetchone()
+        return row[0] if row else self.default_max_students
+
+    def set_max_students(self, class_id, max_students):
+        validate_class_id(class_id)
+        with self._transaction() as conn:
+            self._ensure_class(conn, class_id)
+            conn.execute('UPDATE classes SET max_students = ? WHERE class_id = ?',
+                         (int(max_students), class_id))
+
+    def get_meta(self, key):
+        row = self._connect().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def migrate_from(self, source):
+        """
+        把另一个存储后端（通常是 JsonRosterStorage）的全部班级一次性导入，
+        只执行一次：完成后在 meta 表中记录标记。
+
+        Returns:
+            int: 导入的学生总数，已迁移过则返回 0
+        """
+        if self.get_meta('migrated_from') is not None:
+            return 0
+        total = 0
+        with self._transaction() as conn:
+            for class_id in source.list_classes():
+                students = list(dict.fromkeys(source.list_students(class_id)))
+                if not students and class_id != DEFAULT_CLASS_ID:
+                    continue
+                # 不能用 INSERT OR REPLACE：删除旧行会级联删除学生，并把版本号重置为 0，
+                # 客户端持有的旧 ETag 可能与新名单的版本号重合
+                conn.execute(
+                    'INSERT INTO classes (class_id, max_students, next_position) VALUES (?, ?, ?) '
+                    'ON CONFLICT(class_id) DO UPDATE SET '
+                    'max_students = excluded.max_students, next_position = excluded.next_position',
+                    (class_id, max(source.get_max_students(class_id), len(students)), len(students)),
+                )
+                conn.execute('DELETE FROM students WHERE class_id = ?', (class_id,))
+                conn.executemany(
+                    'INSERT INTO students (class_id, name, position) VALUES (?, ?, ?)',
+                    ((class_id, name, position) for position, name in enumerate(students)),
+                )
+                self._reset_changes(conn, class_id)
+                total += len(students)
+            conn.execute('INSERT INTO meta (key, value) VALUES (?, ?)',
+                         ('migrated_from', source.backend_name))
+        logging.info(f"已从 {source.backend_name} 存储迁移 {total} 名学生到 SQLite")
+        return total
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # 连接属于其他线程，进程退出时由解释器回收
+                pass
+
+
+class _SqliteNameIndex:
+    """通过唯一索引逐个查询名字是否存在，避免把整个班级读入内存"""
+
+    def __init__(self, conn, class_id):
+        self.conn = conn
+        self.class_id = class_id
+
+    def __contains__(self, name):
+        return self.conn.execute(
+            'SELECT 1 FROM students WHERE class_id = ? AND name = ?', (self.class_id, name),
+        ).fetchone() is not None
+
+
+class _SqliteTransaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK 上下文管理器，提交后报告写入耗时（字节数未知）"""
+
+    def __init__(self, conn, observe_io):
+        self.conn = conn
+        self.observe_io = observe_io
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            try:
+                self.conn.execute('COMMIT')
+            except sqlite3.Error as e:
+                # 提交失败（例如磁盘已满或数据库被锁定）时事务可能仍未结束
+                self._rollback()
+                logging.error(f"SQLite 提交失败: {str(e)}")
+                raise StorageError('保存失败') from e
+            self.observe_io(IO_SAVE, self.started)
+        else:
+            self._rollback()
+            if isinstance(exc, sqlite3.Error):
+                logging.error(f"SQLite 操作失败: {str(exc)}")
+                raise StorageError('保存失败') from exc
+        return False
+
+    def _rollback(self):
+        # 部分错误发生时 SQLite 已经自动回滚
+        if self.conn.in_transaction:
+            self.conn.execute('ROLLBACK')
+
+
+def create_storage(backend, students_file='students.json', classes_dir='classes',
+                   db_path='rollcall.db', journaled=True,
+                   default_max_students=DEFAULT_MAX_STUDENTS):
+    """
+    根据配置创建存储后端。
+
+    Args:
+        backend (str): 'json' 或 'sqlite'
+        其余参数见各后端说明
+
+    Returns:
+        RosterStorage: 存储后端实例
+    """
+    backend = (backend or 'json').lower()
+    json_storage = JsonRosterStorage(students_file, classes_dir, journaled=journaled,
+                                     default_max_students=default_max_students)
+    if backend == 'json':
+        return json_storage
+    if backend == 'sqlite':
+        storage = SqliteRosterStorage(db_path, default_max_students=default_max_students)
+        # 首次使用 SQLite 时，把现有 JSON 名单一次性迁移过来
+        storage.migrate_from(json_storage)
+        json_storage.close()
+        return storage
+    raise ValueError(f"未知的存储后端: {backend}")
@@ -0,0 +1,92 @@
+import pytest
+
+from main import create_app, load_config
+
+
+def _config(tmp_path, **overrides):
+    return load_config(dict({
+        'STUDENTS_FILE': str(tmp_path / 'students.json'),
+        'CLASSES_DIR': str(tmp_path / 'classes'),
+        'PICK_STATE_FILE': str(tmp_path / 'pick_state.json'),
+        'PICK_HISTORY_FILE': str(tmp_path / 'pick_history.bin'),
+        'ROSTER_HISTORY_DIR': str(tmp_path / 'roster_history'),
+        'ASSET_BUNDLE': '',
+    }, **overrides))
+
+
+@pytest.fixture
+def client(tmp_path):
+    config = _config(tmp_path, COMPRESS_MIN_SIZE=64)
+    app = create_app(config)
+    with app.test_client() as client:
+        for i in range(20):
+            assert client.post('/api/students', json={'name': f'学生{i:02d}'}).status_code == 200
+        yield client
+
+
+def test_compressed_roster_etag_has_encoding_suffix(client):
+    identity = client.get('/api/students', headers={'Accept-Encoding': 'identity'})
+    gzipped = client.get('/api/students', headers={'Accept-Encoding': 'gzip'})
+    version = identity.headers['X-Roster-Version']
+    assert identity.headers['ETag'] == f'"v{version}"'
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzipped.headers['ETag'] == f'"v{version}-gzip"'
+
+    # 分页响应由 after_request 钩子压缩，同样带编码后缀
+    paged = client.get('/api/students?limit=20', headers={'Accept-Encoding': 'deflate'})
+    assert paged.headers['Content-Encoding'] == 'deflate'
+    assert paged.headers['ETag'] == f'"v{version}-deflate"'
+
+
+def test_suffixed_etags_match_the_roster_version(client):
+    gzipped = client.get('/api/students', headers={'Accept-Encoding': 'gzip'})
+    etag = gzipped.headers['ETag']
+
+    cached = client.get('/api/students', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+
+    added = client.post('/api/students', json={'name': '新同学'}, headers={'If-Match': etag})
+    assert added.status_code == 200
+
+
+def test_not_modified_until_roster_changes(client):
+    etag = client.get('/api/students').headers['ETag']
+    assert client.get('/api/students', headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.delete('/api/students/学生00').status_code == 200
+    changed = client.get('/api/students', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_stale_if_match_is_rejected(client):
+    stale = client.get('/api/students').headers['ETag']
+    assert client.post('/api/students', json={'name': '甲'}, headers={'If-Match': stale}).status_code == 200
+
+    conflict = client.post('/api/students', json={'name': '乙'}, headers={'If-Match': stale})
+    assert conflict.status_code == 409
+    current = int(conflict.headers['X-Roster-Version'])
+    assert conflict.get_json()['version'] == current
+    assert '乙' not in client.get('/api/students?limit=100').get_json()['students']
+
+    invalid = client.post('/api/students', json={'name': '乙'}, headers={'If-Match': '"abc"'})
+    assert invalid.status_code == 400
+
+
+def test_event_stream_limit_returns_503(tmp_path):
+    app = create_app(_config(tmp_path, MAX_EVENT_CLIENTS=0))
+    response = app.test_client().get('/api/events')
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+
+def test_batch_pick_and_groups(client):
+    names = client.get('/api/random?count=20').get_json()['names']
+    assert len(set(names)) == 20
+    assert client.get('/api/random?count=21').status_code == 400
+
+    seeded = client.get('/api/groups?n=3&seed=5').get_json()
+    assert client.get('/api/groups?n=3&seed=5').get_json() == seeded
+    assert sorted(len(group) for group in seeded['groups']) == [6, 7, 7]
+    assert client.get('/api/groups?n=3&size=4').status_code == 400
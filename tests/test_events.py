@@ -0,0 +1,36 @@
+import pytest
+
+from events import EVENT_ROSTER, EventBroker, SubscriberLimitError
+from server import event_stream_limit
+
+
+def test_subscriber_limit():
+    broker = EventBroker(max_clients=2)
+    first = broker.subscribe('default')
+    broker.subscribe('other')
+    with pytest.raises(SubscriberLimitError):
+        broker.subscribe('default')
+    assert broker.stats()['rejected'] == 1
+
+    broker.unsubscribe(first)
+    broker.unsubscribe(first)
+    broker.subscribe('default')
+    assert broker.stats()['clients'] == 2
+
+
+def test_stream_releases_its_slot_when_closed():
+    broker = EventBroker(max_clients=1)
+    subscription = broker.subscribe('default')
+    stream = broker.stream(subscription, heartbeat=0.01)
+    next(stream)
+    next(stream)
+    broker.publish('default', EVENT_ROSTER, {'version': 1})
+    assert 'event: roster' in next(stream)
+    stream.close()
+    broker.subscribe('default')
+
+
+def test_stream_limit_leaves_threads_for_requests():
+    assert event_stream_limit(32) == 24
+    assert event_stream_limit(4) == 2
+    assert event_stream_limit(1) == 0
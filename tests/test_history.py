@@ -0,0 +1,75 @@
+import json
+
+from history import PickHistory, RECORD
+from storage import CHANGE_RENAME, RosterChange
+
+
+def test_reload_after_torn_names_line(tmp_path):
+    path = str(tmp_path / 'pick_history.bin')
+    history = PickHistory(path)
+    history.record('default', ['张三', '李四'], timestamp=1000)
+    history.close()
+    # 模拟写入中断：名字表末尾留下半行
+    with open(f"{path}.names", 'ab') as f:
+        f.write('{"student":"王'.encode('utf-8'))
+
+    history = PickHistory(path)
+    history.record('default', ['王五'], timestamp=1001)
+    history.close()
+
+    with open(f"{path}.names", encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    assert [e.get('student') for e in entries] == [None, '张三', '李四', '王五']
+
+    history = PickHistory(path)
+    counts = {s['name']: s['count'] for s in history.student_stats('default')}
+    assert counts == {'张三': 1, '李四': 1, '王五': 1}
+    picks, _ = history.recent('default')
+    assert [p['name'] for p in picks] == ['王五', '李四', '张三']
+    history.close()
+
+
+def test_reload_after_torn_record(tmp_path):
+    path = str(tmp_path / 'pick_history.bin')
+    history = PickHistory(path)
+    history.record('default', ['张三'], timestamp=1000)
+    history.close()
+    with open(path, 'ab') as f:
+        f.write(RECORD.pack(2000, 0, 0)[:7])
+
+    history = PickHistory(path)
+    history.record('default', ['张三'], timestamp=1500)
+    history.close()
+
+    history = PickHistory(path)
+    assert history.stats()['records'] == 2
+    assert history.student_stats('default')[0]['count'] == 2
+    history.close()
+
+
+def test_rename_pointing_at_missing_student_is_ignored(tmp_path):
+    path = str(tmp_path / 'pick_history.bin')
+    history = PickHistory(path)
+    history.record('default', ['张三'], timestamp=1000)
+    history.close()
+    with open(f"{path}.names", 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'rename': 5, 'n': '赵六'}, ensure_ascii=False) + '\n')
+
+    history = PickHistory(path)
+    assert [s['name'] for s in history.student_stats('default')] == ['张三']
+    history.close()
+
+
+def test_processes_share_student_indices(tmp_path):
+    path = str(tmp_path / 'pick_history.bin')
+    first = PickHistory(path)
+    second = PickHistory(path)
+    first.record('default', ['张三'], timestamp=1000)
+    second.record('default', ['李四'], timestamp=1001)
+    second.on_roster_change(RosterChange('default', CHANGE_RENAME, '张三', '张三丰', None))
+    first.record('default', ['李四'], timestamp=1002)
+
+    counts = {s['name']: s['count'] for s in first.student_stats('default')}
+    assert counts == {'张三丰': 1, '李四': 2}
+    first.close()
+    second.close()
@@ -0,0 +1,105 @@
+import json
+import os
+import time
+
+from journal import OP_ADD, OP_DELETE, OP_RENAME, RosterJournal
+
+
+def _journal(tmp_path, **kwargs):
+    return RosterJournal(str(tmp_path / 'students.json'), fsync_interval=0, **kwargs)
+
+
+def _read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_snapshot_and_log_replay_after_restart(tmp_path):
+    journal = _journal(tmp_path)
+    journal.replace_all(['张三', '李四', '王五'])
+    journal.append(OP_ADD, '赵六')
+    journal.append(OP_DELETE, '张三')
+    journal.append_many([(OP_RENAME, '李四', '李思'), (OP_ADD, '孙七')])
+    journal.close()
+
+    assert _read_json(tmp_path / 'students.json') == ['张三', '李四', '王五']
+    assert _journal(tmp_path).load() == ['李思', '王五', '赵六', '孙七']
+
+
+def test_torn_last_line_is_truncated(tmp_path):
+    journal = _journal(tmp_path)
+    journal.replace_all(['张三'])
+    journal.append(OP_ADD, '李四')
+    journal.close()
+    log_path = tmp_path / 'students.json.log'
+    size = os.path.getsize(log_path)
+    with open(log_path, 'ab') as f:
+        f.write('{"op":"add","name":"王'.encode('utf-8'))
+
+    journal = _journal(tmp_path)
+    assert journal.load() == ['张三', '李四']
+    assert os.path.getsize(log_path) == size
+    journal.append(OP_ADD, '王五')
+    journal.close()
+    assert _journal(tmp_path).load() == ['张三', '李四', '王五']
+
+
+def test_recovers_from_rotated_log_left_by_a_crash(tmp_path):
+    journal = _journal(tmp_path)
+    journal.replace_all(['张三', '李四'])
+    journal.close()
+    # 压缩中途崩溃：日志已轮换为 .log.1，快照还没有替换，之后又有新的写入
+    with open(tmp_path / 'students.json.log.1', 'wb') as f:
+        f.write('{"op":"add","name":"王五"}\n{"op":"del","name":"张三"}\n'.encode('utf-8'))
+    with open(tmp_path / 'students.json.log', 'wb') as f:
+        f.write('{"op":"ren","name":"李四","new":"李思"}\n'.encode('utf-8'))
+
+    journal = _journal(tmp_path)
+    assert journal.load() == ['李思', '王五']
+    assert not os.path.exists(tmp_path / 'students.json.log.1')
+    assert _read_json(tmp_path / 'students.json') == ['李思', '王五']
+    assert _journal(tmp_path).load() == ['李思', '王五']
+
+
+def _start_compaction(journal, students):
+    """触发压缩但不在后台执行，返回 _compact 的参数"""
+    captured = []
+    journal._compact = lambda *args: captured.append(args)
+    assert journal.maybe_compact(students)
+    while not captured:
+        time.sleep(0.001)
+    del journal._compact
+    return captured[0]
+
+
+def test_compaction_keeps_appends_made_while_it_runs(tmp_path):
+    journal = _journal(tmp_path, compact_min_entries=2)
+    journal.replace_all([])
+    journal.append(OP_ADD, '张三')
+    journal.append(OP_ADD, '李四')
+    args = _start_compaction(journal, ['张三', '李四'])
+    journal.append(OP_ADD, '王五')
+    assert journal._still_current(*args[1:])
+
+    journal._compact(*args)
+    assert _read_json(tmp_path / 'students.json') == ['张三', '李四']
+    assert not os.path.exists(tmp_path / 'students.json.log.1')
+    journal.close()
+    assert _journal(tmp_path).load() == ['张三', '李四', '王五']
+
+
+def test_stale_compaction_is_discarded(tmp_path):
+    journal = _journal(tmp_path, compact_min_entries=2)
+    journal.replace_all([])
+    journal.append(OP_ADD, '张三')
+    journal.append(OP_ADD, '李四')
+    args = _start_compaction(journal, ['张三', '李四'])
+    # 压缩期间名单被整体替换：压缩结果已过期，不能覆盖新快照
+    journal.replace_all(['赵六'])
+    assert not journal._still_current(*args[1:])
+
+    journal._compact(*args)
+    assert _read_json(tmp_path / 'students.json') == ['赵六']
+    assert not any(name.endswith('.tmp') for name in os.listdir(tmp_path))
+    journal.close()
+    assert _journal(tmp_path).load() == ['赵六']
@@ -0,0 +1,158 @@
+import random
+
+import pytest
+
+from picker import PickEngine
+from storage import InvalidRequestError, create_storage
+
+
+def _json_storage(tmp_path):
+    return create_storage('json', students_file=str(tmp_path / 'students.json'),
+                          classes_dir=str(tmp_path / 'classes'))
+
+
+def test_picks_follow_changes_from_another_process(tmp_path):
+    storage = _json_storage(tmp_path)
+    storage.replace_students('default', ['张三', '李四', '王五'])
+    engine = PickEngine(storage, str(tmp_path / 'pick_state.json'), rng=random.Random(1))
+    engine.pick('default')
+
+    # 另一个进程改名、删除再添加：人数不变，本进程收不到变更通知
+    other = _json_storage(tmp_path)
+    other.rename_student('default', '张三', '张珊')
+    other.delete_student('default', '李四')
+    other.add_student('default', '赵六')
+
+    picked = {engine.pick('default') for _ in range(50)}
+    assert picked == {'张珊', '王五', '赵六'}
+    engine.close()
+    storage.close()
+    other.close()
+
+
+def _engine(tmp_path, names, seed=1):
+    storage = _json_storage(tmp_path)
+    storage.replace_students('default', names)
+    return storage, PickEngine(storage, str(tmp_path / 'pick_state.json'), rng=random.Random(seed))
+
+
+def _assert_tree_consistent(state):
+    weights = [0 if name is None else state.weight(name) for name in state.names]
+    tree = state.tree
+    assert [tree.weight(i) for i in range(len(tree))] == weights
+    for i in range(len(weights) + 1):
+        assert tree._prefix(i) == sum(weights[:i])
+    for target in range(0, tree.total, max(1, tree.total // 97)):
+        slot = tree.find(target)
+        assert tree._prefix(slot) <= target < tree._prefix(slot + 1)
+
+
+def test_shuffle_bag_picks_everyone_once_per_cycle(tmp_path):
+    names = [f'学生{i}' for i in range(7)]
+    storage, engine = _engine(tmp_path, names)
+    engine.set_strategy('default', 'shuffle_bag')
+    picks = [engine.pick('default') for _ in range(len(names) * 4)]
+    for cycle in range(4):
+        assert sorted(picks[cycle * 7:(cycle + 1) * 7]) == sorted(names)
+    # 轮与轮交界处不会连续点到同一人
+    assert all(a != b for a, b in zip(picks, picks[1:]))
+    engine.close()
+    storage.close()
+
+
+def test_weights_stay_consistent_after_roster_changes(tmp_path):
+    storage, engine = _engine(tmp_path, [f'学生{i}' for i in range(20)])
+    engine.set_strategy('default', 'weighted')
+    engine.pick_many('default', 5)
+    before = engine.get_status('default')['counts']
+    storage.delete_student('default', '学生3')
+    storage.add_student('default', '新同学')
+    storage.rename_student('default', '学生7', '学生七')
+    storage.delete_student('default', '学生11')
+    engine.pick_many('default', 5)
+
+    state = engine._states['default']
+    _assert_tree_consistent(state)
+    assert sorted(name for name in state.names if name is not None) == sorted(storage.list_students('default'))
+    counts = engine.get_status('default')['counts']
+    assert sum(counts.values()) == 10 - before.get('学生3', 0) - before.get('学生11', 0)
+    assert counts.get('学生七', 0) >= before.get('学生7', 0) and '学生7' not in counts
+
+    # 次数多的学生权重更低，被点到的频率也更低
+    engine.reset('default')
+    state.counts['学生0'] = 9
+    state.refresh('学生0')
+    _assert_tree_consistent(state)
+    picks = [engine.pick('default') for _ in range(400)]
+    assert picks.count('学生0') < 400 / 20
+    engine.close()
+    storage.close()
+
+
+def test_exclusions_expire_on_a_new_day(tmp_path):
+    storage, engine = _engine(tmp_path, ['张三', '李四', '王五'])
+    engine.set_absent('default', ['张三', '李四'])
+    assert {engine.pick('default') for _ in range(10)} == {'王五'}
+
+    engine._states['default'].excluded_date = '2000-01-01'
+    assert engine.get_status('default')['absent'] == []
+    assert {engine.pick('default') for _ in range(50)} == {'张三', '李四', '王五'}
+    engine.close()
+    storage.close()
+
+
+def test_pick_state_round_trips(tmp_path):
+    storage, engine = _engine(tmp_path, [f'学生{i}' for i in range(6)])
+    engine.set_strategy('default', 'shuffle_bag')
+    engine.pick_many('default', 4)
+    engine.set_absent('default', ['学生5'])
+    status = engine.get_status('default')
+    engine.close()
+
+    reloaded = PickEngine(storage, str(tmp_path / 'pick_state.json'))
+    assert reloaded.get_status('default') == status
+    # 洗牌袋中剩下的学生在下一轮开始前都会被点到
+    remaining = set(reloaded._states['default'].bag) - {'学生5'}
+    assert set(reloaded.pick_many('default', len(remaining))) == remaining
+    reloaded.close()
+    storage.close()
+
+
+def test_seeded_groups_are_reproducible_and_balanced(tmp_path):
+    names = [f'学生{i}' for i in range(23)]
+    storage, engine = _engine(tmp_path, names)
+    groups, seed = engine.make_groups('default', groups=5)
+    assert engine.make_groups('default', groups=5, seed=seed) == (groups, seed)
+    assert sorted(name for group in groups for name in group) == sorted(names)
+    sizes = [len(group) for group in groups]
+    assert max(sizes) - min(sizes) <= 1
+
+    groups, _ = engine.make_groups('default', size=4, seed=7)
+    assert len(groups) == 6 and max(len(group) for group in groups) <= 4
+    assert max(len(g) for g in groups) - min(len(g) for g in groups) <= 1
+    engine.close()
+    storage.close()
+
+
+def test_groups_reject_both_count_and_size(tmp_path):
+    storage, engine = _engine(tmp_path, ['张三', '李四', '王五'])
+    with pytest.raises(InvalidRequestError):
+        engine.make_groups('default', groups=3, size=4)
+    with pytest.raises(InvalidRequestError):
+        engine.make_groups('default')
+    engine.close()
+    storage.close()
+
+
+def test_batch_pick_without_replacement(tmp_path):
+    names = [f'学生{i}' for i in range(10)]
+    storage, engine = _engine(tmp_path, names)
+    engine.set_absent('default', ['学生0'])
+    chosen = engine.pick_many('default', 9)
+    assert sorted(chosen) == sorted(names[1:])
+    # random 策略下点名状态不影响抽取，相同种子得到相同结果
+    assert engine.pick_many('default', 4, seed=42) == engine.pick_many('default', 4, seed=42)
+    with pytest.raises(InvalidRequestError):
+        engine.pick_many('default', 10)
+    engine.close()
+    storage.close()
@@ -0,0 +1,72 @@
+import pytest
+
+from revisions import OP_RESET, RevisionNotFoundError, RosterRevisions
+from storage import SqliteRosterStorage
+
+
+def _tracked(tmp_path, db_name):
+    storage = SqliteRosterStorage(str(tmp_path / db_name))
+    revisions = RosterRevisions(storage, str(tmp_path / 'roster_history'), checkpoint_interval=3)
+    storage.add_listener(revisions.on_roster_change)
+    revisions.track('default')
+    return storage, revisions
+
+
+def _edit(storage, snapshots, edits):
+    for edit in edits:
+        edit()
+        version, names = storage.snapshot('default')
+        snapshots[version] = names
+
+
+def test_rebuild_and_restore_across_segments(tmp_path):
+    storage, revisions = _tracked(tmp_path, 'rollcall.db')
+    snapshots = {}
+    _edit(storage, snapshots, [
+        lambda: storage.add_student('default', '张三'),
+        lambda: storage.add_student('default', '李四'),
+        lambda: storage.add_student('default', '王五'),
+        lambda: storage.rename_student('default', '李四', '李思'),
+        lambda: storage.delete_student('default', '张三'),
+        lambda: storage.add_student('default', '赵六'),
+        lambda: storage.add_student('default', '孙七'),
+        lambda: storage.rename_student('default', '王五', '王武'),
+    ])
+    assert len(revisions._segments('default')) > 2
+    for version, names in snapshots.items():
+        assert revisions.rebuild('default', version) == names
+
+    first = min(snapshots)
+    restored = revisions.restore('default', first)
+    assert storage.list_students('default') == snapshots[first]
+    latest, _ = revisions.history('default', limit=1)
+    assert latest[0]['version'] == restored
+    assert latest[0]['op'] == OP_RESET and latest[0]['from'] == first
+    # 恢复前的版本仍然可以重建
+    assert revisions.rebuild('default', max(snapshots)) == snapshots[max(snapshots)]
+    storage.close()
+
+
+def test_history_restarts_after_version_rollback(tmp_path):
+    storage, _ = _tracked(tmp_path, 'rollcall.db')
+    for name in ('张三', '李四', '王五', '赵六', '孙七'):
+        storage.add_student('default', name)
+    old_version = storage.version('default')
+    storage.close()
+
+    # 换成一个新的数据库：版本号回退，旧历史被移走
+    storage, revisions = _tracked(tmp_path, 'replaced.db')
+    snapshots = {storage.version('default'): storage.list_students('default')}
+    _edit(storage, snapshots, [
+        lambda: storage.add_student('default', '周八'),
+        lambda: storage.add_student('default', '吴九'),
+    ])
+    assert storage.version('default') < old_version
+    for version, names in snapshots.items():
+        assert revisions.rebuild('default', version) == names
+    with pytest.raises(RevisionNotFoundError):
+        revisions.rebuild('default', old_version)
+
+    revisions.restore('default', min(snapshots))
+    assert storage.list_students('default') == snapshots[min(snapshots)]
+    storage.close()
@@ -0,0 +1,29 @@
+import pytest
+
+from search import StudentSearch, pinyin_available
+from storage import SqliteRosterStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SqliteRosterStorage(str(tmp_path / 'rollcall.db'))
+    storage.add_students('default', ['林雨烽', '林小雨', '张三'])
+    yield storage
+    storage.close()
+
+
+def test_search_follows_roster_changes(storage):
+    search = StudentSearch(storage)
+    assert sorted(search.search('default', '林')) == sorted(['林雨烽', '林小雨'])
+    assert search.search('default', '雨烽') == ['林雨烽']
+
+    storage.rename_student('default', '林雨烽', '林雨枫')
+    assert sorted(search.search('default', '雨')) == sorted(['林雨枫', '林小雨'])
+    assert search.stats()['rebuilds'] == 1
+
+
+@pytest.mark.skipif(not pinyin_available(), reason='需要 pypinyin')
+def test_search_by_pinyin(storage):
+    search = StudentSearch(storage)
+    assert search.search('default', 'linyu') == ['林雨烽']
+    assert search.search('default', 'lxy') == ['林小雨']
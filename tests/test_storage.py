@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from storage import SqliteRosterStorage, StorageError, create_storage
+
+
+class _FailingCommit:
+    """把 COMMIT 换成磁盘错误的连接代理"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql, *args):
+        if sql == 'COMMIT':
+            raise sqlite3.OperationalError('disk I/O error')
+        return self._conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def test_sqlite_commit_failure_rolls_back(tmp_path, monkeypatch):
+    storage = SqliteRosterStorage(str(tmp_path / 'rollcall.db'))
+    storage.add_student('default', '张三')
+    version = storage.version('default')
+    conn = storage._connect()
+
+    monkeypatch.setattr(storage, '_connect', lambda: _FailingCommit(conn))
+    with pytest.raises(StorageError) as info:
+        storage.add_student('default', '李四')
+    assert info.value.status_code == 500
+    assert not conn.in_transaction
+
+    monkeypatch.undo()
+    assert storage.list_students('default') == ['张三']
+    assert storage.version('default') == version
+    storage.add_student('default', '王五')
+    assert storage.list_students('default') == ['张三', '王五']
+    storage.close()
+
+
+def test_migration_keeps_class_versions_increasing(tmp_path):
+    source = create_storage('json', students_file=str(tmp_path / 'students.json'),
+                            classes_dir=str(tmp_path / 'classes'))
+    source.replace_students('default', ['张三', '李四'])
+    storage = SqliteRosterStorage(str(tmp_path / 'rollcall.db'))
+    for name in ('王五', '赵六', '孙七'):
+        storage.add_student('default', name)
+    version = storage.version('default')
+
+    assert storage.migrate_from(source) == 2
+    assert storage.list_students('default') == ['张三', '李四']
+    assert storage.version('default') > version
+    # 变更记录从迁移后的版本重新开始，旧版本不能再增量同步
+    assert storage.changes_since('default', version) == (storage.version('default'), None)
+    storage.add_student('default', '周八')
+    assert storage.list_students('default') == ['张三', '李四', '周八']
+    storage.close()
+    source.close()